@@ -0,0 +1 @@
+"""Offline benchmarks for the dice bot. Run modules with python -m."""
@@ -0,0 +1,58 @@
+"""Benchmark runner.
+
+  python -m benchmarks run [-o results.json] [--sizes 1000 10000 100000]
+                           [--filter roll_dice] [--baseline base.json]
+  python -m benchmarks compare base.json results.json [--threshold 0.15]
+
+compare (and run --baseline) exits with status 1 when any benchmark's
+median time grew by more than the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from benchmarks.suite import compare, load_results, run, save_results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    run_p = sub.add_parser("run", help="run the benchmarks")
+    run_p.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    run_p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                       help="player counts for the storage benchmarks")
+    run_p.add_argument("--repeats", type=int, default=5)
+    run_p.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    run_p.add_argument("--baseline", help="compare against this results file afterwards")
+    run_p.add_argument("--threshold", type=float, default=0.15)
+
+    cmp_p = sub.add_parser("compare", help="compare two result files")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=0.15,
+                       help="allowed slowdown as a fraction (0.15 = 15%%)")
+
+    args = parser.parse_args(argv)
+
+    if args.mode == "run":
+        doc = run(args.sizes, repeats=args.repeats, name_filter=args.filter)
+        save_results(doc, args.output)
+        if not args.baseline:
+            return 0
+        baseline, current = load_results(args.baseline), doc
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} 项基准变慢超过 {args.threshold:.0%}: "
+              + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Check that batch and scalar rolls follow the same distributions.
+
+For each case, n scalar rolls (roll_d100 / CompiledDice.evaluate) and n
+batch rolls (roll_d100_batch / roll_dice_batch) are tallied, and two
+chi-square tests are run: batch against scalar (homogeneity), and each
+of them against the exact distribution from dice.probability. The batch
+side runs on the NumPy path and on the pure-Python fallback. Seeds are
+fixed, so a failure reproduces.
+
+Usage: python -m benchmarks.batch_equivalence [--trials 200000] [--alpha 0.001]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+from collections import Counter
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from dice import rng, roller
+from dice.probability import d100_distribution, distribution
+from dice.rng import SeededStream
+from dice.roller import compile_dice, roll_d100, roll_d100_batch, roll_dice_batch
+from models.history import chi_square_sf
+
+SEED = 20240601
+EXPRESSION = "2d6+1-1d4"
+D100_CASES = ((0, 0), (1, 0), (2, 0), (0, 1), (0, 2), (3, 1))
+# Bins expected to hold fewer outcomes than this are pooled with a neighbour
+MIN_EXPECTED = 5
+
+
+@contextlib.contextmanager
+def pure_python():
+    """Make roller behave as if NumPy were not installed.
+
+    The fallback draws from this thread's default provider, which is
+    swapped for a seeded stream meanwhile so the run replays.
+    """
+    saved = roller._numpy, getattr(rng._local, "provider", None)
+    roller._numpy = False
+    rng._local.provider = SeededStream(SEED + 1)
+    try:
+        yield
+    finally:
+        roller._numpy, rng._local.provider = saved
+
+
+def _bins(probs: Dict[int, float], n: int) -> List[List[int]]:
+    """Outcomes grouped so that each group expects at least MIN_EXPECTED."""
+    groups, current, mass = [], [], 0.0
+    for value in sorted(probs):
+        current.append(value)
+        mass += probs[value]
+        if mass * n >= MIN_EXPECTED:
+            groups.append(current)
+            current, mass = [], 0.0
+    if current:
+        if groups:
+            groups[-1].extend(current)
+        else:
+            groups.append(current)
+    return groups
+
+
+def _tally(counts: Counter, groups: List[List[int]]) -> List[int]:
+    return [sum(counts[v] for v in group) for group in groups]
+
+
+def goodness_of_fit(counts: Counter, probs: Dict[int, float], n: int) -> float:
+    groups = _bins(probs, n)
+    observed = _tally(counts, groups)
+    expected = [n * sum(probs[v] for v in group) for group in groups]
+    chi2 = sum((o - e) ** 2 / e for o, e in zip(observed, expected))
+    return chi_square_sf(chi2, len(groups) - 1)
+
+
+def homogeneity(a: Counter, b: Counter, probs: Dict[int, float], n: int) -> float:
+    """p-value that two equal-sized samples come from one distribution."""
+    groups = _bins(probs, n)
+    chi2 = sum((x - y) ** 2 / (x + y)
+               for x, y in zip(_tally(a, groups), _tally(b, groups)) if x + y)
+    return chi_square_sf(chi2, len(groups) - 1)
+
+
+def _counter(values: Sequence) -> Counter:
+    return Counter(int(v) for v in values)
+
+
+def _scalar_dice(n: int) -> List[int]:
+    expr, stream = compile_dice(EXPRESSION), SeededStream(SEED)
+    return [expr.evaluate(stream) for _ in range(n)]
+
+
+def _scalar_d100(n: int, bonus: int, penalty: int) -> List[int]:
+    stream = SeededStream(SEED)
+    return [roll_d100(bonus, penalty, stream).total for _ in range(n)]
+
+
+def _generator():
+    np = roller.numpy_module()
+    return np.random.default_rng(SEED + 1) if np is not None else None
+
+
+def cases(n: int) -> List[Tuple[str, Callable[[], Sequence], Callable[[], Sequence],
+                                Dict[int, float]]]:
+    """(name, scalar sampler, batch sampler, exact distribution)."""
+    out = [(
+        EXPRESSION,
+        lambda: _scalar_dice(n),
+        lambda: roll_dice_batch(EXPRESSION, n, generator=_generator()),
+        distribution(EXPRESSION),
+    )]
+    for bonus, penalty in D100_CASES:
+        out.append((
+            f"d100 b{bonus} p{penalty}",
+            lambda b=bonus, p=penalty: _scalar_d100(n, b, p),
+            lambda b=bonus, p=penalty: roll_d100_batch(
+                n, b, p, generator=_generator()).totals,
+            {v: p for v, p in enumerate(d100_distribution(bonus, penalty)) if p},
+        ))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.batch_equivalence")
+    parser.add_argument("--trials", type=int, default=200000)
+    parser.add_argument("--alpha", type=float, default=0.001)
+    args = parser.parse_args(argv)
+
+    paths = [("python", pure_python)]
+    if roller.numpy_module() is not None:
+        paths.insert(0, ("numpy", contextlib.nullcontext))
+    else:
+        print("NumPy not installed: checking the pure-Python path only")
+
+    failures = 0
+    print(f"{'case':<16}{'path':<8}{'p batch~scalar':>16}{'p scalar~exact':>16}"
+          f"{'p batch~exact':>15}")
+    for path, context in paths:
+        with context():
+            for name, scalar, batch, probs in cases(args.trials):
+                s = _counter(scalar())
+                b = _counter(batch())
+                ps = (homogeneity(b, s, probs, args.trials),
+                      goodness_of_fit(s, probs, args.trials),
+                      goodness_of_fit(b, probs, args.trials))
+                bad = min(ps) < args.alpha
+                failures += bad
+                print(f"{name:<16}{path:<8}{ps[0]:>16.4f}{ps[1]:>16.4f}{ps[2]:>15.4f}"
+                      + ("  FAIL" if bad else ""))
+    print("OK" if not failures else f"{failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+"""Fuzz .r notation and check that no message exceeds its time budget.
+
+Random expressions mix large counts, keep (kh/kl), exploding dice and
+N# repeats, weighted towards the limits. Each is rolled and rendered the
+way .r replies to it; any roll slower than the budget, any exception
+other than a rejected expression, and any total outside the range the
+expression can reach is reported.
+
+Usage: python -m benchmarks.dice_fuzz [cases] [--budget-ms 50] [--seed N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from dice.rng import SeededStream
+from dice.roller import (
+    DiceResult, MAX_DICE, MAX_REPEATS, MAX_SIDES, RepeatedRoll, compile_dice,
+    roll_expression,
+)
+
+
+def _count(rng: random.Random) -> str:
+    return str(rng.choice([
+        rng.randint(1, 10), rng.randint(1, 200), rng.randint(1, 100000),
+        rng.randint(MAX_DICE // 2, MAX_DICE + 10), 10 ** rng.randint(0, 12),
+    ]))
+
+
+def _sides(rng: random.Random) -> str:
+    return str(rng.choice([
+        rng.choice([1, 2, 4, 6, 8, 10, 12, 20, 100]), rng.randint(1, MAX_SIDES + 10),
+    ]))
+
+
+def _term(rng: random.Random) -> str:
+    if rng.random() < 0.2:
+        return str(rng.randint(0, 1000))
+    text = f"{_count(rng)}d{_sides(rng)}"
+    if rng.random() < 0.3:
+        text += "!"
+    if rng.random() < 0.3:
+        text += rng.choice(["kh", "kl", "k"]) + str(rng.randint(0, 1000))
+    return text
+
+
+def notation(rng: random.Random) -> str:
+    text = _term(rng)
+    for _ in range(rng.randint(0, 3)):
+        text += rng.choice("+-") + _term(rng)
+    if rng.random() < 0.3:
+        text = f"{rng.randint(0, MAX_REPEATS + 2)}#{text}"
+    return text
+
+
+def _bounds(text: str):
+    """Lowest and highest total of one repetition, ignoring explosions."""
+    expr = compile_dice(text.partition("#")[2] or text)
+    low = high = expr.constant
+    for sign, count, sides, keep, explode in expr.dice:
+        dice = min(count, abs(keep)) if keep else count
+        top = dice * sides * (11 if explode else 1)
+        low, high = (low + dice, high + top) if sign > 0 else (low - top, high - dice)
+    return low, high
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.dice_fuzz")
+    parser.add_argument("cases", type=int, nargs="?", default=2000)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=20240601)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    dice_rng = SeededStream(args.seed)
+    failures = rejected = 0
+    slowest = (0.0, "")
+    for _ in range(args.cases):
+        text = notation(rng)
+        start = time.perf_counter()
+        try:
+            result = roll_expression(text, dice_rng)
+            results = result.results if isinstance(result, RepeatedRoll) else (result,)
+            for r in results:
+                r.details
+        except Exception as e:  # anything but a rejected expression is a bug
+            print(f"FAIL {text!r}: {type(e).__name__}: {e}")
+            failures += 1
+            continue
+        elapsed = time.perf_counter() - start
+        slowest = max(slowest, (elapsed, text))
+        if isinstance(result, DiceResult) and result._expr is None:
+            rejected += 1
+            continue
+        if elapsed * 1000 > args.budget_ms:
+            print(f"SLOW {text!r}: {elapsed * 1000:.1f} ms")
+            failures += 1
+        low, high = _bounds(text)
+        for r in results:
+            if not low <= r.total <= high:
+                print(f"RANGE {text!r}: {r.total} not in [{low}, {high}]")
+                failures += 1
+
+    print(f"{args.cases} cases, {rejected} rejected, "
+          f"slowest {slowest[0] * 1000:.1f} ms ({slowest[1]!r})")
+    print("OK" if not failures else f"{failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
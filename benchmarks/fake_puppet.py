@@ -0,0 +1,137 @@
+"""In-process stand-ins for the Wechaty Message, Room and Contact objects.
+
+They implement only what CoCDiceBot.on_message touches. Each puppet call
+sleeps for a configurable latency (plus random jitter) and is counted, so
+the load generator sees the awaits a real puppet service would add.
+``say`` can also be made to fail, transiently or for good, to exercise
+the outbox's retries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from typing import Callable, NamedTuple, Optional
+
+from config import BOT_NAME
+
+# WeChat separates an @mention from the rest of the text with U+2005
+MENTION_SEPARATOR = "\u2005"
+
+
+class Latency(NamedTuple):
+    """Seconds spent in each puppet call; jitter is a fraction of the value."""
+    ready: float = 0.0
+    alias: float = 0.0
+    mention: float = 0.0
+    say: float = 0.0
+    jitter: float = 0.0
+
+
+class Failures(NamedTuple):
+    """Chance that a say raises, and the share of those that are permanent."""
+    say: float = 0.0
+    permanent: float = 0.0
+
+
+class FakeSendError(RuntimeError):
+    """A failure that retrying does not fix, like an unknown room."""
+
+
+class FakePuppet:
+    """Shared latency settings and reply sink for fake rooms and messages."""
+
+    def __init__(self, latency: Latency = Latency(), seed: Optional[int] = None,
+                 on_say: Optional[Callable[[str, str], None]] = None,
+                 failures: Failures = Failures()):
+        self.latency = latency
+        self.on_say = on_say  # called with (room_id, text) after each say
+        self.failures = failures
+        self.calls = 0
+        self.failed_says = 0
+        self._random = random.Random(seed)
+
+    async def delay(self, seconds: float):
+        self.calls += 1
+        if seconds <= 0:
+            return
+        jitter = self.latency.jitter
+        if jitter:
+            seconds *= 1 + self._random.uniform(-jitter, jitter)
+        await asyncio.sleep(seconds)
+
+    def maybe_fail(self, rate: float):
+        """Raise, with probability ``rate``, a transient or permanent error."""
+        if rate <= 0 or self._random.random() >= rate:
+            return
+        self.failed_says += 1
+        if self._random.random() < self.failures.permanent:
+            raise FakeSendError("fake puppet: room not found")
+        raise ConnectionError("fake puppet: connection reset")
+
+
+class FakeContact:
+    __slots__ = ("contact_id", "name")
+
+    def __init__(self, contact_id: str, name: str):
+        self.contact_id = contact_id
+        self.name = name
+
+
+class FakeRoom:
+    __slots__ = ("room_id", "puppet", "aliases")
+
+    def __init__(self, room_id: str, puppet: FakePuppet):
+        self.room_id = room_id
+        self.puppet = puppet
+        self.aliases = {}  # contact_id -> alias in this room
+
+    async def ready(self):
+        await self.puppet.delay(self.puppet.latency.ready)
+
+    async def alias(self, contact: FakeContact) -> Optional[str]:
+        await self.puppet.delay(self.puppet.latency.alias)
+        return self.aliases.get(contact.contact_id)
+
+    async def say(self, text: str):
+        await self.puppet.delay(self.puppet.latency.say)
+        self.puppet.maybe_fail(self.puppet.failures.say)
+        if self.puppet.on_say is not None:
+            self.puppet.on_say(self.room_id, text)
+
+
+class FakeMessage:
+    """A room message; ``mentioned`` says whether it @-mentions the bot."""
+
+    __slots__ = ("_talker", "_room", "_text", "mentioned", "puppet")
+
+    def __init__(self, talker: FakeContact, room: Optional[FakeRoom], text: str,
+                 mentioned: bool, puppet: FakePuppet):
+        self._talker = talker
+        self._room = room
+        self._text = text
+        self.mentioned = mentioned
+        self.puppet = puppet
+
+    def is_self(self) -> bool:
+        return False
+
+    def room(self) -> Optional[FakeRoom]:
+        return self._room
+
+    def talker(self) -> FakeContact:
+        return self._talker
+
+    def text(self) -> str:
+        if self.mentioned:
+            return f"@{BOT_NAME}{MENTION_SEPARATOR}{self._text}"
+        return self._text
+
+    async def mention_self(self) -> bool:
+        await self.puppet.delay(self.puppet.latency.mention)
+        return self.mentioned
+
+    async def mention_text(self) -> str:
+        await self.puppet.delay(self.puppet.latency.mention)
+        return self._text
+
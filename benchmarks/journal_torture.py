@@ -0,0 +1,83 @@
+"""Crash-recovery torture test for JournalStore.
+
+A child process keeps updating players and saving, printing each value
+once save() has returned. The parent SIGKILLs it at a random moment,
+reopens the store and checks that it loads, that every acknowledged
+value survived and that nothing newer than the last write appears.
+
+Usage: python -m benchmarks.journal_torture [rounds]
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+PLAYERS = 8
+
+
+def writer(snapshot: str, journal: str, start: int):
+    from storage.journal_store import JournalStore
+
+    # Small journal limit so that kills also land during compaction
+    store = JournalStore(snapshot, journal, max_journal_bytes=2048,
+                         flush_interval=3600)
+    value = start
+    while True:
+        value += 1
+        player = store.get_player(f"wxid_{value % PLAYERS}", "room", "玩家")
+        player.luck = value
+        store.update_player(player)
+        store.save()
+        print(value, flush=True)
+
+
+def run_round(tmp: str, start: int) -> int:
+    snapshot = os.path.join(tmp, "players.snapshot.json")
+    journal = os.path.join(tmp, "players.journal")
+    child = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.journal_torture", "--writer",
+         snapshot, journal, str(start)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    time.sleep(random.uniform(0.05, 0.5))
+    child.send_signal(signal.SIGKILL)
+    out, _ = child.communicate()
+    acked = [int(v) for v in out.split()]
+
+    from storage.journal_store import JournalStore
+    store = JournalStore(snapshot, journal, flush_interval=3600)
+    try:
+        recovered = {p.key: p.luck for p in store.players_in_room("room")}
+        highest = max(recovered.values(), default=start)
+        for value in acked[-PLAYERS:]:
+            key = (f"wxid_{value % PLAYERS}", "room")
+            assert recovered.get(key, 0) >= value, (
+                f"已确认的值 {value} 丢失: {key}={recovered.get(key)}")
+        # At most the one in-flight write can be newer than the last ack
+        assert highest <= (acked[-1] if acked else start) + 1, highest
+    finally:
+        store.close()
+    return highest
+
+
+def main(rounds: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        value = 0
+        for i in range(rounds):
+            value = run_round(tmp, value)
+            size = os.path.getsize(os.path.join(tmp, "players.journal"))
+            print(f"round {i + 1}: recovered up to {value} (journal {size} bytes)")
+    print("OK")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--writer"]:
+        writer(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
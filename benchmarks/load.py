@@ -0,0 +1,236 @@
+"""End-to-end load generator for CoCDiceBot.on_message over a fake puppet.
+
+Synthetic players in many rooms send a mix of chatter and @-mentioned
+commands at a Poisson arrival rate. Every reply is matched back to the
+command that caused it, so latency covers the whole path: puppet calls,
+room pipeline, handler, store and outbox (including its rate limits).
+
+Usage: python -m benchmarks.load [--rooms 2000] [--players 8] [--rate 200]
+                                 [--duration 30] [--chatter 0.7]
+                                 [--say-latency 0.05] [--global-rate 10]
+                                 [--say-failures 0.05] [--permanent 0.2]
+
+Needs the wechaty package importable (main.py subclasses Wechaty), but
+never connects to a puppet service; players are written to a temp store.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import random
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Tuple
+
+from benchmarks.fake_puppet import (
+    Failures, FakeContact, FakeMessage, FakePuppet, FakeRoom, Latency,
+)
+from config import BOT_NAME, SEND_GLOBAL_RATE, SEND_ROOM_RATE
+from handlers import message_handler
+from handlers.flood import FloodGuard
+from handlers.outbox import MERGE_SEPARATOR, Outbox
+from handlers.pipeline import RoomPipeline
+from handlers.prefilter import MessageFilter
+from main import CoCDiceBot
+from storage.json_store import JsonStore
+
+# Weighted command mix, roughly what a running CoC session sends
+COMMAND_MIX = [
+    (".rc 侦查 60", 30),
+    (".rc 聆听 45 b", 8),
+    (".rc 图书馆使用 70 p", 5),
+    (".r 1d100", 12),
+    (".rd", 6),
+    (".r 3d6+2", 6),
+    (".san 55 1d3/1d10", 8),
+    (".dmg 1d3+1d4", 6),
+    (".fight 50", 4),
+    (".dodge 40", 3),
+    (".rop 力量 60 vs 力量 45", 3),
+    (".luck", 3),
+    (".coc 5", 2),
+    (".prob 2d6+1d4", 1),
+    (".help", 1),
+]
+CHATTER = ["好的", "哈哈哈", "等一下", "KP 我先去看看门", "？", "这个怎么算", "收到"]
+
+NAME_PREFIX = "调查员"
+BOT_CONTACT = FakeContact("wxid_bot", BOT_NAME)
+REPLY_HEAD = re.compile(rf"(?:^|{MERGE_SEPARATOR})@({NAME_PREFIX}\d+)\n")
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LoadGenerator:
+    def __init__(self, bot: CoCDiceBot, rooms: int, players: int,
+                 chatter: float, puppet_latency: Latency, seed: int,
+                 failures: Failures = Failures()):
+        self.bot = bot
+        self.chatter = chatter
+        self.random = random.Random(seed)
+        self.puppet = FakePuppet(puppet_latency, seed, on_say=self._on_say,
+                                 failures=failures)
+        self.rooms = [FakeRoom(f"room_{r}@chatroom", self.puppet) for r in range(rooms)]
+        self.players = [
+            [FakeContact(f"wxid_{r}_{p}", f"{NAME_PREFIX}{r * players + p}")
+             for p in range(players)]
+            for r in range(rooms)
+        ]
+        texts, weights = zip(*COMMAND_MIX)
+        self.texts, self.weights = texts, weights
+        # Send times of commands still waiting for a reply, per (room, player name)
+        self.pending: Dict[Tuple[str, str], Deque[float]] = defaultdict(deque)
+        self.latencies: List[float] = []
+        self.messages = 0
+        self.commands = 0
+        self.replies = 0
+        self.sends = 0
+
+    def _on_say(self, room_id: str, text: str):
+        now = time.perf_counter()
+        self.sends += 1
+        for name in REPLY_HEAD.findall(text):
+            sent = self.pending.get((room_id, name))
+            if sent:
+                self.latencies.append(now - sent.popleft())
+                self.replies += 1
+
+    def _message(self) -> FakeMessage:
+        r = self.random.randrange(len(self.rooms))
+        room = self.rooms[r]
+        talker = self.random.choice(self.players[r])
+        if self.random.random() < self.chatter:
+            return FakeMessage(talker, room, self.random.choice(CHATTER), False, self.puppet)
+        text = self.random.choices(self.texts, self.weights)[0]
+        self.pending[(room.room_id, talker.name)].append(time.perf_counter())
+        self.commands += 1
+        return FakeMessage(talker, room, text, True, self.puppet)
+
+    async def run(self, rate: float, duration: float, drain: float) -> float:
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        start = loop.time()
+        next_at = start
+        while next_at - start < duration:
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = loop.create_task(self.bot.on_message(self._message()))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            self.messages += 1
+            next_at += self.random.expovariate(rate)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        deadline = loop.time() + drain
+        while self.replies < self.commands and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        return loop.time() - start
+
+
+def _percentile(values: List[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[p - 1]
+
+
+async def _main(args) -> dict:
+    tmp = tempfile.TemporaryDirectory()
+    message_handler.close_store()
+    message_handler.store = JsonStore(f"{tmp.name}/players.json")
+
+    # Skip Wechaty.__init__: the fake puppet replaces the whole service
+    bot = CoCDiceBot.__new__(CoCDiceBot)
+    bot.pipeline = RoomPipeline()
+    bot.outbox = Outbox(room_rate=args.room_rate, global_rate=args.global_rate)
+    bot.prefilter = MessageFilter()
+    bot.flood = FloodGuard()
+    bot.user_self = lambda: BOT_CONTACT
+    latency = Latency(ready=args.ready_latency, alias=args.ready_latency,
+                      mention=args.mention_latency,
+                      say=args.say_latency, jitter=args.jitter)
+    failures = Failures(say=args.say_failures, permanent=args.permanent)
+    gen = LoadGenerator(bot, args.rooms, args.players, args.chatter, latency, args.seed,
+                        failures)
+
+    gc.collect()
+    rss_before, blocks_before = _rss_mb(), sys.getallocatedblocks()
+    elapsed = await gen.run(args.rate, args.duration, args.drain)
+    gc.collect()
+    rss_after, blocks_after = _rss_mb(), sys.getallocatedblocks()
+
+    await bot.pipeline.close()
+    await bot.outbox.close(timeout=0)
+    message_handler.close_store()
+    tmp.cleanup()
+
+    lat = sorted(gen.latencies)
+    return {
+        "messages": gen.messages,
+        "commands": gen.commands,
+        "replies": gen.replies,
+        "sends": gen.sends,
+        "elapsed_s": elapsed,
+        "throughput_per_s": gen.replies / elapsed if elapsed else 0.0,
+        "latency_p50_ms": _percentile(lat, 50) * 1000,
+        "latency_p99_ms": _percentile(lat, 99) * 1000,
+        "latency_max_ms": (lat[-1] if lat else 0.0) * 1000,
+        "pipeline_dropped": bot.pipeline.metrics["dropped"],
+        "outbox_dropped": bot.outbox.metrics["dropped"],
+        "outbox_merged": bot.outbox.metrics["merged"],
+        "say_failures": gen.puppet.failed_says,
+        "outbox_retries": bot.outbox.metrics["retries"],
+        "outbox_failed": bot.outbox.metrics["failed"],
+        "outbox_failed_permanent": bot.outbox.metrics["failed_permanent"],
+        "flood_rejected": sum(v for k, v in bot.flood.metrics.items()
+                              if k.startswith("rejected")),
+        "puppet_calls": gen.puppet.calls - gen.sends - gen.puppet.failed_says,
+        "puppet_calls_avoided": bot.prefilter.calls_avoided,
+        "avoided_per_message": bot.prefilter.calls_avoided / max(gen.messages, 1),
+        "peak_rss_growth_mb": rss_after - rss_before,
+        "allocated_blocks_growth": blocks_after - blocks_before,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=8, help="players per room")
+    parser.add_argument("--rate", type=float, default=200, help="messages per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--drain", type=float, default=30,
+                        help="seconds to wait for outstanding replies")
+    parser.add_argument("--chatter", type=float, default=0.7,
+                        help="fraction of messages that do not @ the bot")
+    parser.add_argument("--ready-latency", type=float, default=0.0)
+    parser.add_argument("--mention-latency", type=float, default=0.0)
+    parser.add_argument("--say-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--say-failures", type=float, default=0.0,
+                        help="chance that a send raises")
+    parser.add_argument("--permanent", type=float, default=0.2,
+                        help="share of send failures that are not worth retrying")
+    parser.add_argument("--room-rate", type=float, default=SEND_ROOM_RATE)
+    parser.add_argument("--global-rate", type=float, default=SEND_GLOBAL_RATE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_main(args))
+    for key, value in report.items():
+        print(f"{key:<26}{value:>14,.2f}" if isinstance(value, float)
+              else f"{key:<26}{value:>14,}")
+
+
+if __name__ == "__main__":
+    main()
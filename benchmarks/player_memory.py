@@ -0,0 +1,117 @@
+"""Bytes per player and key/serialization cost, before and after slotting.
+
+"before" is the original Player: a plain dataclass keyed by a
+"contact_id:room_id" string built on every ``key`` access, with
+``asdict`` serialization. "after" is models.player.Player. Both rosters
+are built from freshly decoded JSON, the way a store loads them, and
+held in a dict by key the way the stores hold them.
+
+Usage: python -m benchmarks.player_memory [--players 200000] [--rooms 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional
+
+from models.player import Player
+
+SEED = 20240601
+ROOMS_PER_CONTACT = 4
+
+
+@dataclass
+class LegacyPlayer:
+    contact_id: str
+    room_id: str
+    name: str = ""
+    luck: int = 0
+    san: int = 0
+    last_roll: Optional[int] = None
+    last_skill_name: str = ""
+    last_skill_value: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.contact_id}:{self.room_id}"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LegacyPlayer":
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+
+def _records_json(players: int, rooms: int) -> str:
+    # Each contact plays in ROOMS_PER_CONTACT rooms, as in real group chats
+    rng = random.Random(SEED)
+    records = []
+    for c in range(-(-players // ROOMS_PER_CONTACT)):
+        for r in rng.sample(range(rooms), ROOMS_PER_CONTACT):
+            records.append({
+                "contact_id": f"wxid_{c:08d}", "room_id": f"{r:010d}@chatroom",
+                "name": f"调查员{c}", "luck": 50, "san": 60, "last_roll": 42,
+                "last_skill_name": "侦查", "last_skill_value": 60,
+            })
+    return json.dumps(records[:players], ensure_ascii=False)
+
+
+def _roster_bytes(cls, text: str) -> int:
+    """Memory still held once the decoded records are dropped."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    roster: Dict = {}
+    for data in json.loads(text):
+        player = cls.from_dict(data)
+        roster[player.key] = player
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del roster
+    return size
+
+
+def _per_call(fn: Callable[[], object], n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def measure(cls, text: str, players: int) -> dict:
+    player = cls.from_dict(json.loads(text)[0])
+    data = player.to_dict()
+    calls = 100000
+    return {
+        "bytes_per_player": _roster_bytes(cls, text) / players,
+        "key_ns": _per_call(lambda: player.key, calls) * 1e9,
+        "to_dict_ns": _per_call(player.to_dict, calls) * 1e9,
+        "from_dict_ns": _per_call(lambda: cls.from_dict(data), calls) * 1e9,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.player_memory")
+    parser.add_argument("--players", type=int, default=200000)
+    parser.add_argument("--rooms", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"{args.players:,} players in {args.rooms:,} rooms")
+    print(f"{'':<8}{'bytes/player':>14}{'key ns':>10}{'to_dict ns':>12}{'from_dict ns':>14}")
+    text = _records_json(args.players, args.rooms)
+    for label, cls in (("before", LegacyPlayer), ("after", Player)):
+        r = measure(cls, text, args.players)
+        print(f"{label:<8}{r['bytes_per_player']:>14,.0f}{r['key_ns']:>10.0f}"
+              f"{r['to_dict_ns']:>12.0f}{r['from_dict_ns']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Rolls per second of the RNG providers against plain random.randint.
+
+Usage: python -m benchmarks.rng [rolls]
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from dice.rng import SeededStream, fast_random, secure_random
+from dice.roller import compile_dice
+
+
+def _rate(fn, n: int) -> float:
+    start = time.perf_counter()
+    fn(n)
+    return n / (time.perf_counter() - start)
+
+
+def main(n: int):
+    randint = random.randint
+
+    def baseline_d10(count):
+        # What dice.roller.roll did before the provider layer
+        for _ in range(count):
+            randint(1, 10)
+
+    def provider_d10(provider):
+        draw = provider.roll
+
+        def run(count):
+            for _ in range(count):
+                draw(10)
+        return run
+
+    expr = compile_dice("3d6")
+
+    def baseline_3d6(count):
+        for _ in range(count):
+            randint(1, 6) + randint(1, 6) + randint(1, 6)
+
+    def provider_3d6(provider):
+        def run(count):
+            for _ in range(count):
+                expr.evaluate(provider)
+        return run
+
+    cases = [
+        ("d10 random.randint", baseline_d10),
+        ("d10 fast", provider_d10(fast_random())),
+        ("d10 seeded stream", provider_d10(SeededStream(1234))),
+        ("d10 secure", provider_d10(secure_random())),
+        ("3d6 random.randint", baseline_3d6),
+        ("3d6 fast", provider_3d6(fast_random())),
+        ("3d6 secure", provider_3d6(secure_random())),
+    ]
+    for name, fn in cases:
+        print(f"{name:<22}{_rate(fn, n):>14,.0f} /s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
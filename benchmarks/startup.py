@@ -0,0 +1,110 @@
+"""Cold-start report: import time per module and time to the first reply.
+
+Each measurement runs in a fresh interpreter so nothing is already
+imported. The import report comes from ``python -X importtime``; the
+first-reply timeline imports the handler, opens a store of ``--players``
+players and answers one ``.rc`` command.
+
+Usage: python -m benchmarks.startup [--module handlers.message_handler]
+                                    [--players 100000] [--top 15] [--target 1.0]
+
+Exits with status 1 when the first reply takes longer than ``--target``
+seconds, so it can gate CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from storage.json_store import JsonStore
+
+ROOMS = 500
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints the timeline as JSON
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+from handlers import message_handler
+imported = time.perf_counter()
+from storage.json_store import JsonStore
+message_handler.store = JsonStore(sys.argv[1], flush_interval=3600)
+opened = time.perf_counter()
+reply = message_handler.handle_command(".rc 侦查 60", "wxid_0", "room_0", "调查员0")
+replied = time.perf_counter()
+assert reply, "no reply"
+message_handler.store._closed = True  # nothing to write back
+print(json.dumps({"import_s": imported - t0, "store_open_s": opened - imported,
+                  "first_command_s": replied - opened, "first_reply_s": replied - t0,
+                  "built_players": message_handler.store.metrics["built_players"]}))
+"""
+
+
+def import_times(module: str) -> List[Tuple[str, float, float]]:
+    """(module, self seconds, cumulative seconds) for every import, in load order."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return rows
+
+
+def first_reply(players: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "players.json")
+        store = JsonStore(path, flush_interval=3600)
+        for i in range(players):
+            store.update_player(store.get_player(f"wxid_{i}", f"room_{i % ROOMS}", f"调查员{i}"))
+        store.close()
+
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", CHILD, path],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        report = json.loads(out)
+        report["process_s"] = time.perf_counter() - start
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--module", default="handlers.message_handler",
+                        help="module whose import is profiled (main needs wechaty)")
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--target", type=float, default=None,
+                        help="fail if the first reply takes longer (seconds)")
+    args = parser.parse_args(argv)
+
+    rows = import_times(args.module)
+    total = next((cum for name, _, cum in rows if name.strip() == args.module), 0.0)
+    print(f"import {args.module}: {total * 1000:.1f} ms, {len(rows)} modules")
+    print(f"{'module':<44}{'self ms':>10}{'cumulative ms':>15}")
+    for name, own, cumulative in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{name:<44}{own * 1000:>10.1f}{cumulative * 1000:>15.1f}")
+
+    report = first_reply(args.players)
+    print()
+    print(f"first reply with {args.players:,} stored players")
+    for key, value in report.items():
+        print(f"{key:<26}{value:>14,.3f}" if isinstance(value, float)
+              else f"{key:<26}{value:>14,}")
+
+    if args.target is not None and report["first_reply_s"] > args.target:
+        print(f"首次回复耗时 {report['first_reply_s']:.2f}s，超过目标 {args.target:.2f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
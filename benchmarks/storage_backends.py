@@ -0,0 +1,88 @@
+"""Compare the JSON and SQLite player stores at different roster sizes.
+
+Usage: python -m benchmarks.storage_backends [sizes ...]  (default: 1000 10000 100000)
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from storage.json_store import JsonStore
+from storage.sqlite_store import SqliteStore
+
+ROOMS = 200
+UPDATES = 200
+
+
+def _populate(store, n: int):
+    for i in range(n):
+        player = store.get_player(f"wxid_{i}", f"room_{i % ROOMS}", f"玩家{i}")
+        player.luck = random.randint(15, 90)
+        store.update_player(player)
+    store.save()
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_backend(name: str, factory, n: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "players")
+        store = factory(path)
+        populate = _timed(lambda: _populate(store, n))
+
+        def update_and_save():
+            for _ in range(UPDATES):
+                i = random.randrange(n)
+                player = store.get_player(f"wxid_{i}", f"room_{i % ROOMS}")
+                player.san = random.randint(0, 99)
+                store.update_player(player)
+                store.save()
+
+        per_update = _timed(update_and_save) / UPDATES
+        store.close()
+
+        reopened = []
+        load = _timed(lambda: reopened.append(factory(path)))
+        first_get = _timed(lambda: reopened[0].get_player("wxid_0", "room_0"))
+        reopened[0].close()
+
+    return {
+        "backend": name,
+        "players": n,
+        "populate_s": populate,
+        "update_save_ms": per_update * 1000,
+        "open_s": load,
+        "first_get_ms": first_get * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.storage_backends")
+    parser.add_argument("sizes", type=int, nargs="*", default=[1000, 10000, 100000],
+                        help="player counts to compare the stores at")
+    args = parser.parse_args(argv)
+
+    backends = [
+        ("json", lambda path: JsonStore(path + ".json", flush_interval=3600)),
+        ("sqlite", lambda path: SqliteStore(path + ".db", flush_interval=3600)),
+    ]
+    print(f"{'backend':<8}{'players':>9}{'populate s':>12}{'update+save ms':>16}"
+          f"{'open s':>9}{'first get ms':>14}")
+    for n in args.sizes:
+        for name, factory in backends:
+            r = bench_backend(name, factory, n)
+            print(f"{r['backend']:<8}{r['players']:>9}{r['populate_s']:>12.3f}"
+                  f"{r['update_save_ms']:>16.3f}{r['open_s']:>9.3f}"
+                  f"{r['first_get_ms']:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
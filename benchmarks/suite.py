@@ -0,0 +1,202 @@
+"""Micro- and macro-benchmarks for the dice, handler and storage layers.
+
+Every benchmark is a zero-argument callable timed in batches; the
+result records the median and best time per call over several repeats.
+Inputs come from fixed seeds so runs are comparable across commits.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from dice.char_gen import generate_characters
+from dice.rng import SeededStream
+from dice.roller import roll_d100, roll_dice
+from dice.skill_check import determine_success
+from handlers.commands import COMMANDS
+from handlers.message_handler import _dispatch, parse_command
+from models.player import Player
+from storage.json_store import JsonStore
+
+SEED = 20240601
+
+# Example arguments per command, used for the parse + dispatch benchmarks
+COMMAND_SAMPLES = {
+    ".r": "3d6+2",
+    ".rd": "",
+    ".roll": "1d100",
+    ".rc": "侦查 60 b",
+    ".san": "55 1d3/1d10",
+    ".rop": "力量 60 vs 力量 45",
+    ".rcg": "聆听 A:60 B:45 C:70 D:55 E:40",
+    ".ropn": "潜行 A:60 B:45 C:70",
+    ".fight": "50",
+    ".fire": "45 p",
+    ".dodge": "40",
+    ".dmg": "1d3+1d4",
+    ".coc": "3",
+    ".luck": "set 50",
+    ".help": "rc",
+    ".prob": "2d6+1d4+2",
+    ".sim": "fight 50 40 1d3+1d4 12 vs 45 20 1d6 10 1000",
+}
+# Calls per batch for commands much slower than the rest (default 500)
+COMMAND_BATCH = {".coc": 50, ".prob": 50, ".sim": 5}
+
+Bench = Tuple[str, Callable[[], object], int]  # (name, fn, calls per batch)
+
+
+def dice_benchmarks() -> Iterator[Bench]:
+    rng = SeededStream(SEED)
+    yield "roll_dice/1d100", lambda: roll_dice("1d100", rng), 2000
+    yield "roll_dice/3d6", lambda: roll_dice("3d6", rng), 2000
+    yield "roll_dice/multi_term", lambda: roll_dice("1d3+1d4+2d6-1", rng), 1000
+    yield "roll_dice/details", lambda: roll_dice("4d6+2", rng).details, 1000
+    for extra in range(4):
+        yield (f"roll_d100/bonus{extra}",
+               lambda extra=extra: roll_d100(bonus=extra, rng=rng), 2000)
+        if extra:
+            yield (f"roll_d100/penalty{extra}",
+                   lambda extra=extra: roll_d100(penalty=extra, rng=rng), 2000)
+
+    pairs = random.Random(SEED).choices(
+        [(r, s) for r in range(1, 101) for s in range(0, 100, 5)], k=1000,
+    )
+
+    def all_pairs():
+        for r, s in pairs:
+            determine_success(r, s)
+    yield "determine_success/x1000", all_pairs, 10
+    yield "generate_characters/10", lambda: generate_characters(10, rng), 50
+
+
+def handler_benchmarks() -> Iterator[Bench]:
+    player = Player(contact_id="bench", room_id="bench-room", name="bench",
+                    luck=50, last_roll=40)
+    rng = SeededStream(SEED)
+    for cmd in sorted(COMMANDS):
+        text = f"{cmd} {COMMAND_SAMPLES.get(cmd, '')}".strip()
+
+        def run(text=text):
+            name, args = parse_command(text)
+            return _dispatch(name, args, player, rng)
+        yield f"dispatch/{cmd}", run, COMMAND_BATCH.get(cmd, 500)
+
+
+def _populated_store(path: str, n: int) -> JsonStore:
+    gen = random.Random(SEED)
+    store = JsonStore(path, flush_interval=3600, max_dirty=n + 1)
+    for i in range(n):
+        player = store.get_player(f"wxid_{i}", f"room_{i % 500}", f"玩家{i}")
+        player.luck = gen.randint(15, 90)
+        player.san = gen.randint(0, 99)
+        store.update_player(player)
+    store.save()
+    return store
+
+
+def storage_benchmarks(sizes: List[int], tmp: str) -> Iterator[Bench]:
+    for n in sizes:
+        path = os.path.join(tmp, f"players_{n}.json")
+        store = _populated_store(path, n)
+        gen = random.Random(SEED)
+
+        def save_one(store=store, n=n):
+            i = gen.randrange(n)
+            store.update_player(store.get_player(f"wxid_{i}", f"room_{i % 500}"))
+            store.save()
+
+        def save_all(store=store, n=n):
+            for i in range(n):
+                store.update_player(store.get_player(f"wxid_{i}", f"room_{i % 500}"))
+            store.save()
+
+        def load(path=path):
+            JsonStore(path, flush_interval=3600).close()
+
+        batch = max(1, 2000 // n)
+        yield f"json_store/save_one/{n}", save_one, batch
+        yield f"json_store/save_all/{n}", save_all, batch
+        yield f"json_store/load/{n}", load, batch
+
+
+def _time(fn: Callable[[], object], number: int, repeats: int) -> List[float]:
+    per_call = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number)
+    return per_call
+
+
+def run(sizes: List[int], repeats: int = 5, name_filter: str = "") -> dict:
+    """Run all benchmarks and return the machine-readable result document."""
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        groups = [dice_benchmarks(), handler_benchmarks(), storage_benchmarks(sizes, tmp)]
+        for group in groups:
+            for name, fn, number in group:
+                if name_filter and name_filter not in name:
+                    continue
+                fn()  # warm caches
+                times = _time(fn, number, repeats)
+                results[name] = {
+                    "median_us": statistics.median(times) * 1e6,
+                    "best_us": min(times) * 1e6,
+                    "stdev_us": statistics.pstdev(times) * 1e6,
+                    "calls": number * repeats,
+                }
+                print(f"{name:<36}{results[name]['median_us']:>14.2f} µs", file=sys.stderr)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": SEED,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.15) -> List[str]:
+    """Names of benchmarks whose median slowed down by more than threshold."""
+    regressions = []
+    print(f"{'benchmark':<36}{'baseline µs':>14}{'current µs':>14}{'change':>10}")
+    for name, cur in sorted(current["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<36}{'-':>14}{cur['median_us']:>14.2f}{'new':>10}")
+            continue
+        change = cur["median_us"] / base["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  ← 变慢"
+        print(f"{name:<36}{base['median_us']:>14.2f}{cur['median_us']:>14.2f}"
+              f"{change:>+10.1%}{flag}")
+    return regressions
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(doc: dict, path: Optional[str]):
+    text = json.dumps(doc, ensure_ascii=False, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
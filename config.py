@@ -14,3 +14,82 @@ COMMAND_PREFIX = "."
 # Data persistence
 DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 PLAYER_DATA_FILE = os.path.join(DATA_DIR, "players.json")
+
+# Write-behind flushing of the player store
+STORE_FLUSH_INTERVAL = float(os.environ.get("STORE_FLUSH_INTERVAL", "2.0"))  # seconds
+STORE_MAX_DIRTY = int(os.environ.get("STORE_MAX_DIRTY", "200"))  # flush early past this
+
+# Player store backend: "json" (players.json), "sqlite" (players.db)
+# or "journal" (snapshot + append-only journal)
+STORE_BACKEND = os.environ.get("STORE_BACKEND", "json")
+SQLITE_DATA_FILE = os.path.join(DATA_DIR, "players.db")
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "players.snapshot.json")
+JOURNAL_FILE = os.path.join(DATA_DIR, "players.journal")
+JOURNAL_MAX_BYTES = int(os.environ.get("JOURNAL_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Per-room command pipeline
+ROOM_QUEUE_SIZE = int(os.environ.get("ROOM_QUEUE_SIZE", "32"))  # pending commands per room
+ROOM_IDLE_SECONDS = float(os.environ.get("ROOM_IDLE_SECONDS", "300"))  # reap idle workers
+PIPELINE_THREADS = int(os.environ.get("PIPELINE_THREADS", "4"))  # pool for heavy commands
+
+# Outbound replies: token buckets per room and for the whole bot
+SEND_ROOM_RATE = float(os.environ.get("SEND_ROOM_RATE", "1.0"))  # messages/second
+SEND_ROOM_BURST = float(os.environ.get("SEND_ROOM_BURST", "3"))
+SEND_GLOBAL_RATE = float(os.environ.get("SEND_GLOBAL_RATE", "10.0"))
+SEND_GLOBAL_BURST = float(os.environ.get("SEND_GLOBAL_BURST", "20"))
+SEND_MAX_CHARS = int(os.environ.get("SEND_MAX_CHARS", "1500"))  # merged message size
+SEND_MAX_PENDING = int(os.environ.get("SEND_MAX_PENDING", "50"))  # per room
+SEND_MAX_RETRIES = int(os.environ.get("SEND_MAX_RETRIES", "3"))
+SEND_RETRY_BACKOFF = float(os.environ.get("SEND_RETRY_BACKOFF", "0.5"))  # seconds, doubles
+
+# Dice RNG: "fast" (buffered Mersenne Twister) or "secure" (OS CSPRNG)
+RNG_MODE = os.environ.get("RNG_MODE", "fast")
+# Per-room seeded streams whose seed/offset are logged for replay (fast mode only)
+RNG_ROOM_STREAMS = os.environ.get("RNG_ROOM_STREAMS", "1") == "1"
+RNG_BUFFER_BYTES = int(os.environ.get("RNG_BUFFER_BYTES", "4096"))
+# Room streams kept (LRU); an evicted room gets a freshly seeded, logged stream
+RNG_MAX_ROOM_STREAMS = int(os.environ.get("RNG_MAX_ROOM_STREAMS", "4096"))
+
+# Prometheus /metrics endpoint (off by default; instrumentation is skipped when off)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108"))
+# Rooms with their own dice_room_commands_total series; the rest share "other"
+METRICS_MAX_ROOMS = int(os.environ.get("METRICS_MAX_ROOMS", "100"))
+
+# Rooms whose readiness and bot alias are cached by the message pre-filter
+ROOM_CACHE_SIZE = int(os.environ.get("ROOM_CACHE_SIZE", "4096"))
+
+# Monte Carlo simulator (.sim); the chat command is capped and time-boxed
+SIM_DEFAULT_TRIALS = int(os.environ.get("SIM_DEFAULT_TRIALS", "10000"))
+SIM_MAX_TRIALS = int(os.environ.get("SIM_MAX_TRIALS", "100000"))  # per chat command
+SIM_TIME_BUDGET = float(os.environ.get("SIM_TIME_BUDGET", "2.0"))  # seconds per chat command
+SIM_CHUNK = int(os.environ.get("SIM_CHUNK", "2000"))  # trials per seeded chunk
+
+# Roll history kept per player (.log / .stats); rolls beyond this are
+# dropped from the log but still counted in the statistics
+HISTORY_SIZE = int(os.environ.get("HISTORY_SIZE", "20"))
+
+# Messages holding several commands (one per line or separated by ";"):
+# at most this many commands, and this much dice work in total (in plain
+# die rolls, the unit of dice.roller.MAX_ROLL_COST)
+MESSAGE_MAX_COMMANDS = int(os.environ.get("MESSAGE_MAX_COMMANDS", "5"))
+MESSAGE_MAX_DICE_COST = int(os.environ.get("MESSAGE_MAX_DICE_COST", "20000"))
+
+# Group checks (.rcg) and multi-party opposed rolls (.ropn)
+GROUP_MAX_PARTIES = int(os.environ.get("GROUP_MAX_PARTIES", "20"))
+
+# Flood protection: token buckets per contact and per room, with separate
+# buckets for heavy commands (.coc, .prob, .sim). Rates are tokens/second;
+# a command takes 1 token plus 1 per FLOOD_DICE_PER_TOKEN dice it rolls.
+FLOOD_CONTACT_RATE = float(os.environ.get("FLOOD_CONTACT_RATE", "0.5"))
+FLOOD_CONTACT_BURST = float(os.environ.get("FLOOD_CONTACT_BURST", "8"))
+FLOOD_ROOM_RATE = float(os.environ.get("FLOOD_ROOM_RATE", "2.0"))
+FLOOD_ROOM_BURST = float(os.environ.get("FLOOD_ROOM_BURST", "30"))
+FLOOD_HEAVY_CONTACT_RATE = float(os.environ.get("FLOOD_HEAVY_CONTACT_RATE", "0.1"))
+FLOOD_HEAVY_CONTACT_BURST = float(os.environ.get("FLOOD_HEAVY_CONTACT_BURST", "3"))
+FLOOD_HEAVY_ROOM_RATE = float(os.environ.get("FLOOD_HEAVY_ROOM_RATE", "0.2"))
+FLOOD_HEAVY_ROOM_BURST = float(os.environ.get("FLOOD_HEAVY_ROOM_BURST", "6"))
+FLOOD_DICE_PER_TOKEN = int(os.environ.get("FLOOD_DICE_PER_TOKEN", "1000"))
+FLOOD_MAX_KEYS = int(os.environ.get("FLOOD_MAX_KEYS", "100000"))  # buckets kept (LRU)
+FLOOD_WARN_INTERVAL = float(os.environ.get("FLOOD_WARN_INTERVAL", "60"))  # per contact
@@ -2,9 +2,13 @@
 
 from __future__ import annotations
 
-from typing import Optional
+import re
+from fractions import Fraction
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
 
-from dice.roller import roll_dice
+from dice.rng import BufferedRandom, default_provider
+from dice.roller import compile_dice, numpy_module
 
 
 # CoC 7.0 characteristic generation rules:
@@ -20,23 +24,37 @@ STAT_NAMES = {
     "POW": "意志", "EDU": "教育", "LUCK": "幸运",
 }
 STAT_ORDER = ["STR", "CON", "SIZ", "DEX", "APP", "INT", "POW", "EDU", "LUCK"]
+# Stats that count towards the total shown by format_stats
+TOTAL_STATS = [s for s in STAT_ORDER if s != "LUCK"]
 
+MAX_CHARACTERS = 10  # per .coc command
+# Dice rolled for one investigator without constraints (3d6 stats and luck, 2d6 stats)
+DICE_PER_CHARACTER = 3 * (len(STATS_3D6) + 1) + 2 * len(STATS_2D6_PLUS_6)
+
+_3D6 = compile_dice("3d6")
+_2D6_PLUS_6 = compile_dice("2d6+6")
+
+
+def generate_one(rng: Optional[BufferedRandom] = None,
+                 constraints: Optional[Constraints] = None) -> dict:
+    """Generate one set of CoC 7.0 characteristics.
+
+    With constraints the set is drawn directly from the exact conditional
+    distribution. Raises ValueError if the constraints cannot be met.
+    """
+    if constraints is not None:
+        return _sample(_plan_for(constraints), rng)
 
-def generate_one() -> dict:
-    """Generate one set of CoC 7.0 characteristics."""
     stats = {}
 
     for stat in STATS_3D6:
-        r = roll_dice("3d6")
-        stats[stat] = r.total * 5
+        stats[stat] = _3D6.evaluate(rng) * 5
 
     for stat in STATS_2D6_PLUS_6:
-        r = roll_dice("2d6+6")
-        stats[stat] = r.total * 5
+        stats[stat] = _2D6_PLUS_6.evaluate(rng) * 5
 
     # Luck
-    r = roll_dice("3d6")
-    stats["LUCK"] = r.total * 5
+    stats["LUCK"] = _3D6.evaluate(rng) * 5
 
     return stats
 
@@ -54,13 +72,251 @@ def format_stats(stats: dict, index: Optional[int] = None) -> str:
     return "\n".join(lines)
 
 
-def generate_characters(count: int = 1) -> str:
-    """Generate one or more character stat sets."""
-    count = max(1, min(count, 10))  # cap at 10
+def generate_characters(count: int = 1,
+                        rng: Optional[BufferedRandom] = None,
+                        constraints: Optional[Constraints] = None) -> str:
+    """Generate one or more character stat sets.
+
+    Raises ValueError if the constraints cannot be met.
+    """
+    count = max(1, min(count, MAX_CHARACTERS))
     results = []
+    if constraints is not None:
+        _plan_for(constraints)
+        results.append(f"🎯 条件: {constraints.text}\n"
+                       f"满足条件的概率: {_describe(constraint_probability(constraints))}")
     for i in range(count):
-        stats = generate_one()
+        stats = generate_one(rng, constraints)
         idx = (i + 1) if count > 1 else None
         results.append(format_stats(stats, idx))
 
     return "\n\n".join(results)
+
+
+# ---------------------------------------------------------------------------
+# Constrained generation
+# ---------------------------------------------------------------------------
+
+class Constraints(NamedTuple):
+    """Inclusive bounds in dice-sum units (stat value / 5)."""
+    bounds: Tuple[Tuple[int, int], ...]  # per stat, in STAT_ORDER
+    total: Tuple[int, int]               # sum of TOTAL_STATS
+    text: str                            # as the user wrote it
+
+
+def _sum_counts(count: int, sides: int) -> Tuple[int, ...]:
+    """Number of ways to roll each total of `count` dice, from `count` up."""
+    ways = [1]
+    for _ in range(count):
+        out = [0] * (len(ways) + sides - 1)
+        for i, w in enumerate(ways):
+            for face in range(sides):
+                out[i + face] += w
+        ways = out
+    return tuple(ways)
+
+
+# (lowest dice sum, ways to roll each sum from there)
+_DIST_3D6 = (3, _sum_counts(3, 6))
+_DIST_2D6_PLUS_6 = (8, _sum_counts(2, 6))
+STAT_DIST = {stat: _DIST_3D6 if stat in STATS_3D6 or stat == "LUCK" else _DIST_2D6_PLUS_6
+             for stat in STAT_ORDER}
+_OUTCOMES = 1
+for _stat in STAT_ORDER:
+    _OUTCOMES *= sum(STAT_DIST[_stat][1])
+
+_NO_TOTAL = (0, 10 ** 9)
+_TOTAL_NAMES = {"TOTAL", "SUM", "总计", "总和"}
+_CHINESE_NAMES = {name: key for key, name in STAT_NAMES.items()}
+CONSTRAINT_PATTERN = re.compile(r'(\w+)\s*(>=|<=|==|=|>|<|≥|≤)\s*(\d+)$')
+
+
+def _stat_key(name: str) -> Optional[str]:
+    key = _CHINESE_NAMES.get(name, name.upper())
+    if key in _TOTAL_NAMES:
+        return "TOTAL"
+    return key if key in STAT_DIST else None
+
+
+def _bounds(op: str, value: int) -> Tuple[int, int]:
+    """Dice-sum bounds for ``stat <op> value`` where stat = 5 * sum."""
+    if op in (">=", "≥"):
+        return -(-value // 5), _NO_TOTAL[1]
+    if op == ">":
+        return value // 5 + 1, _NO_TOTAL[1]
+    if op in ("<=", "≤"):
+        return _NO_TOTAL[0], value // 5
+    if op == "<":
+        return _NO_TOTAL[0], -(-value // 5) - 1
+    # Equality can only hold for multiples of 5
+    return (value // 5, value // 5) if value % 5 == 0 else (1, 0)
+
+
+def parse_constraints(text: str) -> Constraints:
+    """Parse conditions like ``total>=500 EDU>=70 幸运>=50``.
+
+    Stats use the displayed values (multiples of 5); ``total`` is the sum
+    shown by format_stats (without luck). Raises ValueError on bad input.
+    """
+    bounds = {stat: (low, low + len(ways) - 1) for stat, (low, ways) in STAT_DIST.items()}
+    total = _NO_TOTAL
+    tokens = text.split()
+    for token in tokens:
+        m = CONSTRAINT_PATTERN.match(token)
+        key = _stat_key(m.group(1)) if m else None
+        if key is None:
+            raise ValueError(f"无法识别的条件: {token}")
+        lo, hi = _bounds(m.group(2), int(m.group(3)))
+        if key == "TOTAL":
+            total = (max(total[0], lo), min(total[1], hi))
+        else:
+            bounds[key] = (max(bounds[key][0], lo), min(bounds[key][1], hi))
+    return Constraints(tuple(bounds[s] for s in STAT_ORDER), total, " ".join(tokens))
+
+
+class _Plan(NamedTuple):
+    # Per TOTAL_STATS entry: (stat, lowest value, lowest partial sum, table) where
+    # table[partial - lowest partial][value - lowest value] is the number of
+    # outcomes with that value that can still bring the total within range
+    stats: Tuple[Tuple[str, int, int, Tuple[Tuple[int, ...], ...]], ...]
+    luck: Tuple[int, Tuple[int, ...]]
+    ways: int  # outcomes meeting all constraints
+
+
+def _truncate(stat: str, lo: int, hi: int) -> Tuple[int, Tuple[int, ...]]:
+    low, ways = STAT_DIST[stat]
+    lo, hi = max(lo, low), min(hi, low + len(ways) - 1)
+    return lo, ways[lo - low:hi - low + 1] if lo <= hi else ()
+
+
+def _range_ways(suffix: Tuple[int, Tuple[int, ...]], lo: int, hi: int) -> int:
+    low, cumulative = suffix
+    last = len(cumulative) - 1
+    a = min(max(lo - low, 0), last)
+    b = min(max(hi - low + 1, 0), last)
+    return cumulative[b] - cumulative[a] if b > a else 0
+
+
+@lru_cache(maxsize=128)
+def _plan(constraints: Constraints) -> _Plan:
+    truncated = {s: _truncate(s, lo, hi) for s, (lo, hi) in zip(STAT_ORDER, constraints.bounds)}
+    stats = [(s, *truncated[s]) for s in TOTAL_STATS]
+
+    # suffix[i]: (lowest sum, prefix sums of the ways) over stats[i:]
+    suffix = [(0, (0, 1))]
+    dist: Tuple[int, Tuple[int, ...]] = (0, (1,))
+    for _, low, ways in reversed(stats):
+        out = [0] * (len(dist[1]) + len(ways) - 1)
+        for i, a in enumerate(ways):
+            for j, b in enumerate(dist[1]):
+                out[i + j] += a * b
+        dist = (low + dist[0], tuple(out))
+        cumulative = [0]
+        for w in out:
+            cumulative.append(cumulative[-1] + w)
+        suffix.append((dist[0], tuple(cumulative)))
+    suffix.reverse()
+
+    lo, hi = constraints.total
+    entries = []
+    partial_low = partial_high = 0
+    for i, (stat, low, ways) in enumerate(stats):
+        rest = suffix[i + 1]
+        table = tuple(
+            tuple(w * _range_ways(rest, lo - p - v, hi - p - v) for v, w in enumerate(ways, low))
+            for p in range(partial_low, partial_high + 1)
+        )
+        entries.append((stat, low, partial_low, table))
+        partial_low += low
+        partial_high += low + len(ways) - 1
+
+    luck = truncated["LUCK"]
+    ways = _range_ways(suffix[0], lo, hi) * sum(luck[1])
+    return _Plan(tuple(entries), luck, ways)
+
+
+def constraint_probability(constraints: Constraints) -> Fraction:
+    """Exact chance that a freshly rolled character meets the constraints."""
+    return Fraction(_plan(constraints).ways, _OUTCOMES)
+
+
+def _describe(p: Fraction) -> str:
+    if p == 1:
+        return "100%"
+    text = f"{float(p):.2%}" if p >= Fraction(1, 100) else f"{float(p):.2e}"
+    return f"{text} (约每 {round(1 / p):,} 组出现 1 组)"
+
+
+def _plan_for(constraints: Optional[Constraints]) -> _Plan:
+    plan = _plan(constraints or parse_constraints(""))
+    if not plan.ways:
+        raise ValueError("条件不可能满足")
+    return plan
+
+
+def _pick(weights: Sequence[int], draw) -> int:
+    r = draw(sum(weights)) - 1
+    for i, w in enumerate(weights):
+        r -= w
+        if r < 0:
+            return i
+    raise AssertionError("unreachable")
+
+
+def _sample(plan: _Plan, rng: Optional[BufferedRandom]) -> dict:
+    """One set from the exact conditional distribution; no rejection."""
+    draw = (rng or default_provider()).roll
+    stats = {}
+    partial = 0
+    for stat, low, partial_low, table in plan.stats:
+        value = low + _pick(table[partial - partial_low], draw)
+        stats[stat] = value * 5
+        partial += value
+    luck_low, luck_ways = plan.luck
+    stats["LUCK"] = (luck_low + _pick(luck_ways, draw)) * 5
+    return {stat: stats[stat] for stat in STAT_ORDER}
+
+
+@lru_cache(maxsize=32)
+def _np_tables(plan: _Plan):
+    """Each plan table as row-normalised float probabilities."""
+    np = numpy_module()
+    tables = []
+    for stat, low, partial_low, table in plan.stats:
+        probs = np.array([[float(w) for w in row] for row in table], dtype=np.float64)
+        totals = probs.sum(axis=1, keepdims=True)
+        tables.append((stat, low, partial_low, probs / np.where(totals > 0, totals, 1)))
+    return tables
+
+
+def generate_batch(n: int, constraints: Optional[Constraints] = None,
+                   generator=None) -> Dict[str, Sequence[int]]:
+    """Generate n stat sets as one array of values per stat.
+
+    Returns NumPy int64 arrays (drawn from ``generator``, an optional
+    numpy.random.Generator) when NumPy is installed, lists otherwise.
+    Raises ValueError if the constraints cannot be met.
+    """
+    plan = _plan_for(constraints)
+    np = numpy_module()
+    if np is None:
+        sets = [_sample(plan, None) for _ in range(n)]
+        return {stat: [s[stat] for s in sets] for stat in STAT_ORDER}
+
+    gen = generator or np.random.default_rng()
+    out = {}
+    partial = np.zeros(n, dtype=np.int64)
+    for stat, low, partial_low, probs in _np_tables(plan):
+        out[stat] = low + _pick_np(probs[partial - partial_low], gen)
+        partial += out[stat]
+    luck_low, luck_ways = plan.luck
+    luck = np.array(luck_ways, dtype=np.float64)
+    out["LUCK"] = luck_low + _pick_np(np.broadcast_to(luck / luck.sum(), (n, len(luck))), gen)
+    return {stat: out[stat] * 5 for stat in STAT_ORDER}
+
+
+def _pick_np(probs, gen):
+    np = numpy_module()
+    cdf = np.cumsum(probs, axis=1)
+    u = gen.random(len(cdf)) * cdf[:, -1]
+    return (cdf <= u[:, None]).sum(axis=1)
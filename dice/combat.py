@@ -1,29 +1,38 @@
 """CoC 7.0 combat roll helpers."""
 
-from dice.skill_check import skill_check
-from dice.roller import roll_dice
+from typing import NamedTuple, Optional
 
+from dice.rng import BufferedRandom
+from dice.skill_check import SkillResult, skill_check
+from dice.roller import DiceResult, roll_dice
 
-def fighting_check(skill_value: int, bonus: int = 0, penalty: int = 0) -> dict:
+
+class DamageResult(NamedTuple):
+    dice: DiceResult
+
+    @property
+    def damage(self) -> int:
+        return self.dice.total
+
+
+def fighting_check(skill_value: int, bonus: int = 0, penalty: int = 0,
+                   rng: Optional[BufferedRandom] = None) -> SkillResult:
     """Perform a Fighting (Brawl) check."""
-    return skill_check("格斗", skill_value, bonus=bonus, penalty=penalty)
+    return skill_check("格斗", skill_value, bonus=bonus, penalty=penalty, rng=rng)
 
 
-def firearms_check(skill_value: int, bonus: int = 0, penalty: int = 0) -> dict:
+def firearms_check(skill_value: int, bonus: int = 0, penalty: int = 0,
+                   rng: Optional[BufferedRandom] = None) -> SkillResult:
     """Perform a Firearms check."""
-    return skill_check("射击", skill_value, bonus=bonus, penalty=penalty)
+    return skill_check("射击", skill_value, bonus=bonus, penalty=penalty, rng=rng)
 
 
-def dodge_check(skill_value: int, bonus: int = 0, penalty: int = 0) -> dict:
+def dodge_check(skill_value: int, bonus: int = 0, penalty: int = 0,
+                rng: Optional[BufferedRandom] = None) -> SkillResult:
     """Perform a Dodge check."""
-    return skill_check("闪避", skill_value, bonus=bonus, penalty=penalty)
+    return skill_check("闪避", skill_value, bonus=bonus, penalty=penalty, rng=rng)
 
 
-def damage_roll(expression: str) -> dict:
+def damage_roll(expression: str, rng: Optional[BufferedRandom] = None) -> DamageResult:
     """Roll damage dice (e.g. '1d3+1d4', '2d6+2')."""
-    result = roll_dice(expression)
-    details = f"💥 伤害骰: {result.details}"
-    return {
-        "damage": result.total,
-        "details": details,
-    }
+    return DamageResult(roll_dice(expression, rng))
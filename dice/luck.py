@@ -1,27 +1,33 @@
 """CoC 7.0 luck spending mechanic."""
 
+from typing import NamedTuple
+
+
+class LuckResult(NamedTuple):
+    skill_name: str
+    original_roll: int
+    new_roll: int
+    spent: int
+    new_luck: int
+    level_code: int
+
 
 def spend_luck(current_luck: int, spend_amount: int,
                skill_name: str, original_roll: int,
-               skill_value: int) -> dict:
+               skill_value: int) -> LuckResult:
     """Spend luck points to improve a skill check result.
 
     The player can spend luck to reduce their roll value, potentially
     achieving a better success level.
 
-    Returns dict with: new_roll, new_luck, details
+    Raises ValueError when the amount is not positive or exceeds the
+    current luck.
     """
     if spend_amount <= 0:
-        return {
-            "success": False,
-            "details": "❌ 花费幸运值必须大于0",
-        }
+        raise ValueError("花费幸运值必须大于0")
 
     if spend_amount > current_luck:
-        return {
-            "success": False,
-            "details": f"❌ 幸运值不足！当前幸运: {current_luck}，需要: {spend_amount}",
-        }
+        raise ValueError(f"幸运值不足！当前幸运: {current_luck}，需要: {spend_amount}")
 
     new_roll = original_roll - spend_amount
     new_luck = current_luck - spend_amount
@@ -29,22 +35,6 @@ def spend_luck(current_luck: int, spend_amount: int,
     if new_roll < 1:
         new_roll = 1
 
-    from dice.skill_check import determine_success
-    new_level = determine_success(new_roll, skill_value)
-
-    details = (
-        f"🍀 幸运消耗\n"
-        f"{skill_name} 检定\n"
-        f"原始骰值: {original_roll} → 新骰值: {new_roll}\n"
-        f"消耗幸运: {spend_amount}\n"
-        f"剩余幸运: {new_luck}\n"
-        f"新结果: 【{new_level}】"
-    )
-
-    return {
-        "success": True,
-        "new_roll": new_roll,
-        "new_luck": new_luck,
-        "new_level": new_level,
-        "details": details,
-    }
+    from dice.skill_check import level_code
+    return LuckResult(skill_name, original_roll, new_roll, spend_amount, new_luck,
+                      level_code(new_roll, skill_value))
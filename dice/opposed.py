@@ -1,55 +1,83 @@
 """CoC 7.0 opposed roll logic."""
 
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+from dice.rng import BufferedRandom
 from dice.roller import roll_d100
-from dice.skill_check import SuccessLevel, determine_success
+from dice.skill_check import (
+    GroupEntry, LevelCode, level_code, level_code_chances, roll_group,
+)
+
+
+class OpposedResult(NamedTuple):
+    name1: str
+    skill1: int
+    roll1: int
+    level_code1: int
+    name2: str
+    skill2: int
+    roll2: int
+    level_code2: int
+    winner: int  # 1 or 2, or 0 when neither side succeeded
 
 
-def opposed_roll(name1: str, skill1: int, name2: str, skill2: int) -> dict:
+def opposed_roll(name1: str, skill1: int, name2: str, skill2: int,
+                 rng: Optional[BufferedRandom] = None) -> OpposedResult:
     """Perform an opposed roll between two parties.
 
     Higher success level wins. On tie, higher skill value wins.
     """
-    r1 = roll_d100()
-    r2 = roll_d100()
+    r1 = roll_d100(rng=rng).total
+    r2 = roll_d100(rng=rng).total
 
-    level1 = determine_success(r1.total, skill1)
-    level2 = determine_success(r2.total, skill2)
+    code1 = level_code(r1, skill1)
+    code2 = level_code(r2, skill2)
 
-    rank1 = SuccessLevel.rank(level1)
-    rank2 = SuccessLevel.rank(level2)
-
-    if rank1 > rank2:
-        winner = name1
-    elif rank2 > rank1:
-        winner = name2
-    elif skill1 >= skill2:
-        winner = name1
-    else:
-        winner = name2
-
-    # Both fumble = nobody wins
-    if level1 == SuccessLevel.FUMBLE and level2 == SuccessLevel.FUMBLE:
-        winner = "双方"
-        outcome = "双方大失败，均未成功！"
-    # Both fail
-    elif rank1 <= 1 and rank2 <= 1:
-        winner = "无"
-        outcome = "双方均未成功"
+    if code1 <= LevelCode.FAILURE and code2 <= LevelCode.FAILURE:
+        winner = 0
+    elif code1 > code2 or (code1 == code2 and skill1 >= skill2):
+        winner = 1
     else:
-        outcome = f"🏆 {winner} 胜出！"
-
-    details = (
-        f"⚔️ 对抗检定\n"
-        f"{name1} ({skill1}): d100 = {r1.total} 【{level1}】\n"
-        f"{name2} ({skill2}): d100 = {r2.total} 【{level2}】\n"
-        f"{outcome}"
-    )
-
-    return {
-        "roll1": r1.total,
-        "roll2": r2.total,
-        "level1": level1,
-        "level2": level2,
-        "winner": winner,
-        "details": details,
-    }
+        winner = 2
+    return OpposedResult(name1, skill1, r1, code1, name2, skill2, r2, code2, winner)
+
+
+class GroupOpposedResult(NamedTuple):
+    label: str
+    entries: Tuple[GroupEntry, ...]  # ranked best first
+    winner: Optional[GroupEntry]     # None when nobody succeeded
+
+
+def opposed_group(parties: Sequence[Tuple[str, int]], label: str = "",
+                  rng: Optional[BufferedRandom] = None) -> GroupOpposedResult:
+    """An opposed roll among any number of parties, ranked best first.
+
+    Same rules as opposed_roll: the best success level wins, ties go to
+    the higher skill and then to whoever is listed first, and nobody wins
+    if nobody succeeds.
+    """
+    entries = tuple(roll_group(parties, rng=rng))
+    winner = entries[0] if entries and entries[0].level_code >= LevelCode.REGULAR else None
+    return GroupOpposedResult(label, entries, winner)
+
+
+def win_probability(skill1: int, skill2: int) -> dict:
+    """Exact chances of an opposed roll: first wins, second wins, or neither.
+
+    Uses the same rules as opposed_roll, including the skill tie-break.
+    """
+    chances1 = level_code_chances(skill1)
+    chances2 = level_code_chances(skill2)
+
+    win1 = win2 = neither = 0.0
+    for code1, p1 in enumerate(chances1):
+        for code2, p2 in enumerate(chances2):
+            p = p1 * p2
+            if code1 <= LevelCode.FAILURE and code2 <= LevelCode.FAILURE:
+                neither += p
+            elif code1 > code2 or (code1 == code2 and skill1 >= skill2):
+                win1 += p
+            else:
+                win2 += p
+
+    return {"win1": win1, "win2": win2, "neither": neither}
@@ -0,0 +1,193 @@
+"""Exact outcome distributions for dice expressions and d100 checks."""
+
+from __future__ import annotations
+
+import math
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from dice.roller import compile_dice, Term
+
+# A PMF is (lowest value, probabilities of lowest, lowest+1, ...)
+Pmf = Tuple[int, Tuple[float, ...]]
+
+# Rough upper bound on float operations spent on one distribution
+MAX_WORK = 2_000_000
+# Float operations that take about as long as rolling one die (~0.3 µs)
+WORK_PER_DIE = 300
+
+
+class DistributionReport(NamedTuple):
+    """Reply of .prob for a dice expression."""
+    notation: str
+    dist: Dict[int, float]
+
+
+class CheckChances(NamedTuple):
+    """Reply of .prob rc."""
+    skill_value: int
+    bonus: int
+    penalty: int
+    chances: Tuple[float, ...]  # indexed by success level code
+
+
+class SanChances(NamedTuple):
+    """Reply of .prob san."""
+    san_value: int
+    success: float
+    expected_loss: float
+
+
+class OpposedChances(NamedTuple):
+    """Reply of .prob rop."""
+    skill1: int
+    skill2: int
+    win1: float
+    win2: float
+    neither: float
+
+
+def _convolve(a: Pmf, b: Pmf) -> Pmf:
+    offset_a, pa = a
+    offset_b, pb = b
+    out = [0.0] * (len(pa) + len(pb) - 1)
+    for i, x in enumerate(pa):
+        if x:
+            for j, y in enumerate(pb):
+                out[i + j] += x * y
+    return offset_a + offset_b, tuple(out)
+
+
+@lru_cache(maxsize=256)
+def _dice_pmf(count: int, sides: int) -> Pmf:
+    """PMF of the sum of `count` dice with `sides` faces each."""
+    probs = [1.0]
+    face = 1.0 / sides
+    for _ in range(count):
+        # Sliding-window sum: adding one die costs O(len(probs) + sides)
+        out = [0.0] * (len(probs) + sides - 1)
+        window = 0.0
+        for k in range(len(out)):
+            if k < len(probs):
+                window += probs[k]
+            if k >= sides:
+                window -= probs[k - sides]
+            out[k] = window * face
+        probs = out
+    return count, tuple(probs)
+
+
+def _term_pmf(term: Term) -> Pmf:
+    sign, count, sides, keep, explode = term
+    if keep or explode:
+        raise ValueError("保留骰与爆炸骰暂不支持精确计算概率")
+    if not sides:
+        return sign * count, (1.0,)
+    offset, probs = _dice_pmf(count, sides)
+    if sign < 0:
+        return -(offset + len(probs) - 1), probs[::-1]
+    return offset, probs
+
+
+def _estimate_work(terms: Tuple[Term, ...]) -> int:
+    work = 0
+    size = 1
+    for _, count, sides, _, _ in terms:
+        if sides:
+            term_size = count * (sides - 1) + 1
+            work += count * (term_size + sides)
+            work += size * term_size
+            size += term_size - 1
+    return work
+
+
+@lru_cache(maxsize=256)
+def _expression_pmf(terms: Tuple[Term, ...]) -> Pmf:
+    if _estimate_work(terms) > MAX_WORK:
+        raise ValueError("骰子表达式过大，无法精确计算概率")
+    pmf: Pmf = (0, (1.0,))
+    for term in terms:
+        pmf = _convolve(pmf, _term_pmf(term))
+    return pmf
+
+
+def distribution_cost(notation: str) -> int:
+    """Work of distribution(notation), in plain die rolls, for flood limits.
+
+    Capped at MAX_WORK, beyond which distribution refuses; invalid
+    notation costs 0 like in expression_cost.
+    """
+    try:
+        terms = compile_dice(notation).terms
+    except ValueError:
+        return 0
+    return min(_estimate_work(terms), MAX_WORK) // WORK_PER_DIE
+
+
+def distribution_cache_info():
+    """Hit/miss counters of the expression distribution cache."""
+    return _expression_pmf.cache_info()
+
+
+def distribution(notation: str) -> Dict[int, float]:
+    """Exact probability of every total of a dice expression.
+
+    Accepts any notation roll_dice does. Raises DiceSyntaxError for
+    invalid notation and ValueError if the distribution is too large or
+    the expression keeps (kh/kl) or explodes (!) dice.
+    """
+    offset, probs = _expression_pmf(compile_dice(notation).terms)
+    return {offset + i: p for i, p in enumerate(probs) if p}
+
+
+def summarize(dist: Dict[int, float]) -> dict:
+    """Return min, max, mean and standard deviation of a distribution."""
+    mean = sum(v * p for v, p in dist.items())
+    variance = sum((v - mean) ** 2 * p for v, p in dist.items())
+    return {
+        "min": min(dist),
+        "max": max(dist),
+        "mean": mean,
+        "stdev": math.sqrt(variance),
+    }
+
+
+def percentile(dist: Dict[int, float], q: float) -> int:
+    """Smallest total whose cumulative probability reaches q (0-1)."""
+    cumulative = 0.0
+    for value in sorted(dist):
+        cumulative += dist[value]
+        if cumulative >= q - 1e-12:
+            return value
+    return max(dist)
+
+
+def expected_value(notation: str, floor: Optional[int] = None) -> float:
+    """Expected total of a dice expression, optionally clamped below at floor."""
+    dist = distribution(notation)
+    if floor is None:
+        return sum(v * p for v, p in dist.items())
+    return sum(max(floor, v) * p for v, p in dist.items())
+
+
+@lru_cache(maxsize=64)
+def d100_distribution(bonus: int = 0, penalty: int = 0) -> Tuple[float, ...]:
+    """Probability of each d100 result with bonus/penalty dice.
+
+    Returns a tuple indexed by the result (index 0 is unused).
+    """
+    net = bonus - penalty
+    n = 1 + abs(net)
+    is_bonus = net > 0
+
+    probs = [0.0] * 101
+    for tens in range(10):
+        # Chance that the chosen tens digit (min or max of n dice) equals tens
+        if is_bonus:
+            p_tens = ((10 - tens) ** n - (9 - tens) ** n) / 10 ** n
+        else:
+            p_tens = ((tens + 1) ** n - tens ** n) / 10 ** n
+        for units in range(10):
+            value = tens * 10 + units or 100
+            probs[value] += p_tens / 10
+    return tuple(probs)
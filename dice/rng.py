@@ -0,0 +1,173 @@
+"""Random number providers for dice rolls.
+
+Every provider hands out unbiased die faces from a pool of random bytes
+drawn in bulk. ``SeededStream`` additionally records its seed and how
+many bytes it has consumed, so that any roll can be replayed exactly.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from config import RNG_BUFFER_BYTES, RNG_MAX_ROOM_STREAMS, RNG_MODE, RNG_ROOM_STREAMS
+
+log = logging.getLogger("dice.rng")
+
+# Largest byte value (exclusive) that maps evenly onto 1..sides, per die size
+_BYTE_LIMITS = [0] + [256 - 256 % sides for sides in range(1, 257)]
+
+
+class BufferedRandom:
+    """Draws random bytes in bulk and turns them into die faces.
+
+    Values are made unbiased by rejection: bytes that would favour the
+    low faces are skipped. Not thread-safe; use one per thread.
+    """
+
+    __slots__ = ("_source", "_chunk", "_buf", "_pos", "_consumed")
+
+    def __init__(self, source: Callable[[int], bytes],
+                 chunk: int = RNG_BUFFER_BYTES):
+        self._source = source
+        self._chunk = chunk
+        self._buf = b""
+        self._pos = 0
+        self._consumed = 0  # bytes in buffers already used up
+
+    @property
+    def offset(self) -> int:
+        """Total number of random bytes consumed so far."""
+        return self._consumed + self._pos
+
+    def _refill(self):
+        self._consumed += len(self._buf)
+        self._buf = self._source(self._chunk)
+        self._pos = 0
+
+    def _next_bytes(self, n: int) -> int:
+        if self._pos + n > len(self._buf):
+            # Drop the tail so chunk boundaries stay the same on replay
+            self._pos = len(self._buf)
+            self._refill()
+        value = int.from_bytes(self._buf[self._pos:self._pos + n], "little")
+        self._pos += n
+        return value
+
+    def roll(self, sides: int) -> int:
+        """One die with faces 1..sides."""
+        if sides <= 256:
+            limit = _BYTE_LIMITS[sides]
+            buf = self._buf
+            pos = self._pos
+            while True:
+                if pos >= len(buf):
+                    self._pos = pos
+                    self._refill()
+                    buf = self._buf
+                    pos = 0
+                b = buf[pos]
+                pos += 1
+                if b < limit:
+                    self._pos = pos
+                    return b % sides + 1
+
+        nbytes = ((sides - 1).bit_length() + 7) // 8
+        span = 1 << (8 * nbytes)
+        limit = span - span % sides
+        while True:
+            value = self._next_bytes(nbytes)
+            if value < limit:
+                return value % sides + 1
+
+    def skip(self, nbytes: int):
+        """Discard bytes, e.g. to fast-forward a replayed stream."""
+        while nbytes > 0:
+            if self._pos >= len(self._buf):
+                self._refill()
+            step = min(nbytes, len(self._buf) - self._pos)
+            self._pos += step
+            nbytes -= step
+
+
+class SeededStream(BufferedRandom):
+    """A reproducible stream: same seed and offset give the same rolls."""
+
+    __slots__ = ("seed",)
+
+    def __init__(self, seed: int, chunk: int = RNG_BUFFER_BYTES):
+        super().__init__(random.Random(seed).randbytes, chunk)
+        self.seed = seed
+
+    @classmethod
+    def replay(cls, seed: int, offset: int,
+               chunk: int = RNG_BUFFER_BYTES) -> "SeededStream":
+        """A stream positioned where the original was at ``offset``."""
+        stream = cls(seed, chunk)
+        stream.skip(offset)
+        return stream
+
+
+def secure_random() -> BufferedRandom:
+    """A provider backed by the OS CSPRNG."""
+    return BufferedRandom(os.urandom)
+
+
+def fast_random() -> BufferedRandom:
+    """A provider backed by a Mersenne Twister seeded from the OS."""
+    return BufferedRandom(random.Random(secrets.randbits(64)).randbytes)
+
+
+_local = threading.local()
+
+
+def default_provider() -> BufferedRandom:
+    """This thread's shared provider, created on first use."""
+    provider = getattr(_local, "provider", None)
+    if provider is None:
+        provider = secure_random() if RNG_MODE == "secure" else fast_random()
+        _local.provider = provider
+    return provider
+
+
+class RoomStreams:
+    """One seeded stream per room, with the seed logged when it is created.
+
+    At most ``max_rooms`` streams are kept, least recently used first out.
+    A room whose stream was dropped gets a new seed, logged like the
+    first, so every roll stays replayable.
+    """
+
+    def __init__(self, max_rooms: int = RNG_MAX_ROOM_STREAMS):
+        self.max_rooms = max_rooms
+        self._streams: "OrderedDict[str, SeededStream]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, room_id: str) -> SeededStream:
+        with self._lock:
+            stream = self._streams.get(room_id)
+            if stream is not None:
+                self._streams.move_to_end(room_id)
+                return stream
+            seed = secrets.randbits(64)
+            stream = SeededStream(seed)
+            self._streams[room_id] = stream
+            if len(self._streams) > self.max_rooms:
+                self._streams.popitem(last=False)
+        log.info("room=%s seed=%d", room_id, seed)
+        return stream
+
+
+room_streams = RoomStreams()
+
+
+def provider_for_room(room_id: str) -> Optional[BufferedRandom]:
+    """The provider rolls in a room should use (None means the default)."""
+    if RNG_ROOM_STREAMS and RNG_MODE != "secure":
+        return room_streams.get(room_id)
+    return None
@@ -0,0 +1,89 @@
+"""Exact samplers for rolling many dice at once.
+
+Rolling ``count`` dice one by one costs O(count). The face counts of
+those dice follow a multinomial distribution, which is sampled here as a
+chain of binomials in O(sides) no matter how many dice are rolled. All
+randomness comes from a provider's ``roll``, so seeded streams replay.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Callable, List
+
+Draw = Callable[[int], int]  # provider.roll: a die with faces 1..sides
+
+_FLOAT_STEPS = 1 << 53
+# Below this mean the binomial is sampled by inversion, above it by BTRS
+_INVERSION_MEAN = 10.0
+
+
+def uniform(draw: Draw) -> float:
+    """A float uniform on [0, 1), from 53 random bits."""
+    return (draw(_FLOAT_STEPS) - 1) / _FLOAT_STEPS
+
+
+def _binomial_inversion(n: int, p: float, draw: Draw) -> int:
+    # Walk the CDF from 0; expected steps are about n * p
+    q = 1.0 - p
+    ratio = p / q
+    prob = q ** n
+    u = uniform(draw)
+    k = 0
+    while u > prob and k < n:
+        u -= prob
+        k += 1
+        prob *= ratio * (n - k + 1) / k
+    return k
+
+
+def _binomial_btrs(n: int, p: float, draw: Draw) -> int:
+    # Transformed rejection with squeeze (Hormann 1993), for n * p >= 10
+    spq = math.sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    v_r = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = math.log(p / (1.0 - p))
+    m = math.floor((n + 1) * p)
+    h = math.lgamma(m + 1) + math.lgamma(n - m + 1)
+    while True:
+        u = uniform(draw) - 0.5
+        v = uniform(draw)
+        us = 0.5 - abs(u)
+        k = math.floor((2 * a / us + b) * u + c) if us > 0 else -1
+        if k < 0 or k > n:
+            continue
+        if us >= 0.07 and v <= v_r:
+            return k
+        v = math.log(v * alpha / (a / (us * us) + b)) if v > 0 else -math.inf
+        if v <= h - math.lgamma(k + 1) - math.lgamma(n - k + 1) + (k - m) * lpq:
+            return k
+
+
+def binomial(n: int, p: float, draw: Draw) -> int:
+    """Successes in n trials with success chance p, in O(1) expected draws."""
+    if n <= 0 or p <= 0.0:
+        return 0
+    if p >= 1.0:
+        return n
+    if p > 0.5:
+        return n - binomial(n, 1.0 - p, draw)
+    if n * p < _INVERSION_MEAN:
+        return _binomial_inversion(n, p, draw)
+    return _binomial_btrs(n, p, draw)
+
+
+def face_counts(count: int, sides: int, draw: Draw) -> List[int]:
+    """How many of ``count`` fair dice show each face (index 0 is face 1)."""
+    counts = [0] * sides
+    remaining = count
+    for face in range(sides - 1):
+        if not remaining:
+            break
+        k = binomial(remaining, 1.0 / (sides - face), draw)
+        counts[face] = k
+        remaining -= k
+    counts[sides - 1] += remaining
+    return counts
@@ -0,0 +1,460 @@
+"""Monte Carlo simulation of scripted encounters.
+
+Three scenarios: a melee fight (fighting vs dodge each round, then
+damage), a sequence of SAN checks, and a chase decided by opposed rolls.
+Trials run in seeded chunks. With NumPy a chunk is resolved round by
+round as arrays; without it, trial by trial through the same check
+functions the chat commands use. Chunks can be spread over a process
+pool and stop early once a time budget runs out.
+
+Usage: python -m dice.simulate fight 50 40 1d3+1d4 12 vs 45 20 1d6 10 [-n 100000] [-j 4]
+       python -m dice.simulate san 60 1/1d6 1d3/1d10 0/1d4 [-n 100000]
+       python -m dice.simulate chase 60 vs 50 [领先距离] [-n 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import os
+import random
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, NamedTuple, Optional, Tuple, Union
+
+from config import SIM_CHUNK, SIM_DEFAULT_TRIALS
+from dice.combat import damage_roll, dodge_check, fighting_check
+from dice.opposed import opposed_roll
+from dice.rng import SeededStream
+from dice.roller import compile_dice, numpy_module, roll_d100_batch, roll_dice_batch
+from dice.san_check import san_check
+from dice.skill_check import LevelCode, SkillResult, skill_check_batch
+
+# This module is itself imported on first use of .sim, so load NumPy now
+np = numpy_module()
+
+
+class Combatant(NamedTuple):
+    fighting: int
+    dodge: int
+    damage: str
+    hp: int
+
+
+class FightScenario(NamedTuple):
+    """Investigator and foe trade blows, investigator first, until one drops."""
+    investigator: Combatant
+    foe: Combatant
+    max_rounds: int = 20
+
+
+class SanScenario(NamedTuple):
+    """SAN checks in order; losses are (on success, on failure) expressions."""
+    san: int
+    losses: Tuple[Tuple[str, str], ...]
+
+
+class ChaseScenario(NamedTuple):
+    """Opposed rolls each round; winning widens the gap by one, losing narrows it."""
+    skill: int
+    foe_skill: int
+    lead: int = 2
+    escape: int = 5
+    max_rounds: int = 30
+
+
+Scenario = Union[FightScenario, SanScenario, ChaseScenario]
+
+# Work of one trial on the NumPy path, in plain die rolls (as .r counts
+# them): a fight or chase trial takes about 2.5 µs, a SAN trial under 0.3 µs
+TRIAL_COST: Dict[type, int] = {FightScenario: 8, SanScenario: 1, ChaseScenario: 8}
+
+
+def scenario_cost(scenario: Scenario, trials: int) -> int:
+    """Work of simulating ``trials`` trials, in plain die rolls, for flood limits."""
+    return TRIAL_COST[type(scenario)] * trials
+
+
+class ChunkResult(NamedTuple):
+    outcomes: Dict[int, int]  # outcome code -> trials
+    rounds: Dict[int, int]    # rounds taken -> trials
+    loss: Dict[int, int]      # HP or SAN lost -> trials
+
+
+class SimReport(NamedTuple):
+    scenario: Scenario
+    requested: int
+    trials: int               # fewer than requested if the budget ran out
+    outcomes: Counter
+    rounds: Counter
+    loss: Counter
+    elapsed: float
+
+
+FIGHT_WIN, FIGHT_LOSE, FIGHT_DRAW = 0, 1, 2
+SAN_SANE, SAN_TEMPORARY, SAN_INDEFINITE, SAN_PERMANENT = 0, 1, 2, 3
+CHASE_ESCAPED, CHASE_CAUGHT, CHASE_ONGOING = 0, 1, 2
+
+OUTCOME_NAMES = {
+    FightScenario: ("胜利", "战败", "僵持"),
+    SanScenario: ("清醒", "临时疯狂", "不定性疯狂", "永久疯狂"),
+    ChaseScenario: ("逃脱", "被追上", "仍在追逐"),
+}
+
+
+def _counts(values) -> Dict[int, int]:
+    keys, counts = np.unique(values, return_counts=True)
+    return dict(zip(keys.tolist(), counts.tolist()))
+
+
+# ---------------------------------------------------------------------------
+# Fight
+# ---------------------------------------------------------------------------
+
+def _hits_np(attack: int, dodge: int, n: int, gen):
+    # The dodger wins ties, so an attack lands only with a strictly better level
+    a = skill_check_batch(np.full(n, attack), generator=gen).level_codes
+    d = skill_check_batch(np.full(n, dodge), generator=gen).level_codes
+    return (a >= LevelCode.REGULAR) & (a > d)
+
+
+def _damage_np(expression: str, n: int, gen):
+    return np.maximum(roll_dice_batch(expression, n, generator=gen), 0)
+
+
+def _fight_np(s: FightScenario, n: int, gen) -> ChunkResult:
+    inv, foe = s.investigator, s.foe
+    hp = np.full(n, inv.hp, dtype=np.int64)
+    foe_hp = np.full(n, foe.hp, dtype=np.int64)
+    rounds = np.zeros(n, dtype=np.int64)
+    active = np.arange(n)
+    for r in range(1, s.max_rounds + 1):
+        k = active.size
+        hit = _hits_np(inv.fighting, foe.dodge, k, gen)
+        foe_hp[active] -= np.where(hit, _damage_np(inv.damage, k, gen), 0)
+        # A foe that went down does not strike back
+        hit = _hits_np(foe.fighting, inv.dodge, k, gen) & (foe_hp[active] > 0)
+        hp[active] -= np.where(hit, _damage_np(foe.damage, k, gen), 0)
+        rounds[active] = r
+        active = active[(hp[active] > 0) & (foe_hp[active] > 0)]
+        if not active.size:
+            break
+
+    outcome = np.where(foe_hp <= 0, FIGHT_WIN, np.where(hp <= 0, FIGHT_LOSE, FIGHT_DRAW))
+    loss = inv.hp - np.maximum(hp, 0)
+    return ChunkResult(_counts(outcome), _counts(rounds), _counts(loss))
+
+
+def _hits(attack: SkillResult, dodge: SkillResult) -> bool:
+    return LevelCode.REGULAR <= attack.level_code and attack.level_code > dodge.level_code
+
+
+def _fight_py(s: FightScenario, n: int, rng) -> ChunkResult:
+    inv, foe = s.investigator, s.foe
+    outcomes, rounds, losses = Counter(), Counter(), Counter()
+    for _ in range(n):
+        hp, foe_hp, r = inv.hp, foe.hp, 0
+        while r < s.max_rounds and hp > 0 and foe_hp > 0:
+            r += 1
+            if _hits(fighting_check(inv.fighting, rng=rng), dodge_check(foe.dodge, rng=rng)):
+                foe_hp -= max(0, damage_roll(inv.damage, rng).damage)
+            if foe_hp > 0 and _hits(fighting_check(foe.fighting, rng=rng),
+                                    dodge_check(inv.dodge, rng=rng)):
+                hp -= max(0, damage_roll(foe.damage, rng).damage)
+        outcomes[FIGHT_WIN if foe_hp <= 0 else FIGHT_LOSE if hp <= 0 else FIGHT_DRAW] += 1
+        rounds[r] += 1
+        losses[inv.hp - max(hp, 0)] += 1
+    return ChunkResult(outcomes, rounds, losses)
+
+
+# ---------------------------------------------------------------------------
+# SAN
+# ---------------------------------------------------------------------------
+
+def _san_outcome(start: int, end: int, worst: int) -> int:
+    if end <= 0:
+        return SAN_PERMANENT
+    if start - end >= max(1, start // 5):
+        return SAN_INDEFINITE
+    if worst >= 5:
+        return SAN_TEMPORARY
+    return SAN_SANE
+
+
+def _san_np(s: SanScenario, n: int, gen) -> ChunkResult:
+    san = np.full(n, s.san, dtype=np.int64)
+    worst = np.zeros(n, dtype=np.int64)
+    for success_loss, fail_loss in s.losses:
+        passed = roll_d100_batch(n, generator=gen).totals <= san
+        loss = np.where(passed, _damage_np(success_loss, n, gen), _damage_np(fail_loss, n, gen))
+        np.maximum(worst, loss, out=worst)
+        san = np.maximum(san - loss, 0)
+
+    lost = s.san - san
+    outcome = np.where(
+        san <= 0, SAN_PERMANENT,
+        np.where(lost >= max(1, s.san // 5), SAN_INDEFINITE,
+                 np.where(worst >= 5, SAN_TEMPORARY, SAN_SANE)),
+    )
+    return ChunkResult(_counts(outcome), {len(s.losses): n}, _counts(lost))
+
+
+def _san_py(s: SanScenario, n: int, rng) -> ChunkResult:
+    outcomes, losses = Counter(), Counter()
+    for _ in range(n):
+        san, worst = s.san, 0
+        for success_loss, fail_loss in s.losses:
+            result = san_check(san, success_loss, fail_loss, rng=rng)
+            worst = max(worst, result.san_loss)
+            san = result.new_san
+        outcomes[_san_outcome(s.san, san, worst)] += 1
+        losses[s.san - san] += 1
+    return ChunkResult(outcomes, {len(s.losses): n}, losses)
+
+
+# ---------------------------------------------------------------------------
+# Chase
+# ---------------------------------------------------------------------------
+
+def _chase_np(s: ChaseScenario, n: int, gen) -> ChunkResult:
+    gap = np.full(n, s.lead, dtype=np.int64)
+    rounds = np.zeros(n, dtype=np.int64)
+    # As in _chase_py, a chase that starts caught or escaped plays no rounds
+    active = np.arange(n) if 0 < s.lead < s.escape else np.arange(0)
+    for r in range(1, s.max_rounds + 1):
+        if not active.size:
+            break
+        k = active.size
+        c1 = skill_check_batch(np.full(k, s.skill), generator=gen).level_codes
+        c2 = skill_check_batch(np.full(k, s.foe_skill), generator=gen).level_codes
+        # Same rules as opposed_roll: nobody gains when both fail
+        contested = (c1 > LevelCode.FAILURE) | (c2 > LevelCode.FAILURE)
+        win = (c1 > c2) | ((c1 == c2) & (s.skill >= s.foe_skill))
+        gap[active] += np.where(contested, np.where(win, 1, -1), 0)
+        rounds[active] = r
+        active = active[(gap[active] > 0) & (gap[active] < s.escape)]
+
+    outcome = np.where(gap >= s.escape, CHASE_ESCAPED,
+                       np.where(gap <= 0, CHASE_CAUGHT, CHASE_ONGOING))
+    return ChunkResult(_counts(outcome), _counts(rounds), {})
+
+
+def _chase_py(s: ChaseScenario, n: int, rng) -> ChunkResult:
+    outcomes, rounds = Counter(), Counter()
+    for _ in range(n):
+        gap, r = s.lead, 0
+        while r < s.max_rounds and 0 < gap < s.escape:
+            r += 1
+            winner = opposed_roll("调查员", s.skill, "追兵", s.foe_skill, rng=rng).winner
+            gap += 1 if winner == 1 else -1 if winner == 2 else 0
+        outcomes[CHASE_ESCAPED if gap >= s.escape
+                 else CHASE_CAUGHT if gap <= 0 else CHASE_ONGOING] += 1
+        rounds[r] += 1
+    return ChunkResult(outcomes, rounds, {})
+
+
+# ---------------------------------------------------------------------------
+# Running
+# ---------------------------------------------------------------------------
+
+Runner = Callable[..., ChunkResult]
+
+RUNNERS: Dict[type, Tuple[Runner, Runner]] = {
+    FightScenario: (_fight_np, _fight_py),
+    SanScenario: (_san_np, _san_py),
+    ChaseScenario: (_chase_np, _chase_py),
+}
+
+
+def _run_chunk(scenario: Scenario, n: int, seed: int) -> ChunkResult:
+    vectorized, scalar = RUNNERS[type(scenario)]
+    if np is not None:
+        return vectorized(scenario, n, np.random.default_rng(seed))
+    return scalar(scenario, n, SeededStream(seed))
+
+
+def _validate(scenario: Scenario):
+    """Raise DiceSyntaxError up front instead of inside a worker."""
+    if isinstance(scenario, FightScenario):
+        compile_dice(scenario.investigator.damage)
+        compile_dice(scenario.foe.damage)
+    elif isinstance(scenario, SanScenario):
+        for success_loss, fail_loss in scenario.losses:
+            compile_dice(success_loss)
+            compile_dice(fail_loss)
+
+
+def simulate(scenario: Scenario, trials: int = SIM_DEFAULT_TRIALS,
+             workers: int = 1, budget: Optional[float] = None,
+             seed: Optional[int] = None, chunk: int = SIM_CHUNK) -> SimReport:
+    """Run trials of a scenario and aggregate the outcomes.
+
+    Chunks are seeded from ``seed``, so a complete run gives the same
+    result for any number of workers. With ``budget`` (seconds) chunks
+    not finished in time are dropped and the report says how many ran.
+    """
+    _validate(scenario)
+    start = time.perf_counter()
+    seeder = random.Random(seed)
+    jobs = [(min(chunk, trials - i), seeder.getrandbits(63)) for i in range(0, trials, chunk)]
+
+    outcomes, rounds, loss = Counter(), Counter(), Counter()
+    done = 0
+
+    def merge(result: ChunkResult, size: int):
+        nonlocal done
+        outcomes.update(result.outcomes)
+        rounds.update(result.rounds)
+        loss.update(result.loss)
+        done += size
+
+    if workers <= 1 or len(jobs) <= 1:
+        for size, chunk_seed in jobs:
+            if budget is not None and time.perf_counter() - start >= budget:
+                break
+            merge(_run_chunk(scenario, size, chunk_seed), size)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = {pool.submit(_run_chunk, scenario, size, chunk_seed): size
+                       for size, chunk_seed in jobs}
+            try:
+                for future in as_completed(futures, timeout=budget):
+                    merge(future.result(), futures[future])
+            except concurrent.futures.TimeoutError:
+                pass
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return SimReport(scenario, trials, done, outcomes, rounds, loss,
+                     time.perf_counter() - start)
+
+
+# ---------------------------------------------------------------------------
+# Parsing and display
+# ---------------------------------------------------------------------------
+
+# Trial count last, with or without 次 (a chase's lone extra number is its lead)
+_TRIALS = r'(?:\s+(\d+)次?)?$'
+FIGHT_PATTERN = re.compile(
+    r'fight\s+(\d+)\s+(\d+)\s+(\S+)\s+(\d+)\s+vs\s+(\d+)\s+(\d+)\s+(\S+)\s+(\d+)' + _TRIALS,
+    re.IGNORECASE,
+)
+SAN_PATTERN = re.compile(r'san\s+(\d+)((?:\s+[^\s/]+/[^\s/]+)+)' + _TRIALS, re.IGNORECASE)
+CHASE_PATTERN = re.compile(r'chase\s+(\d+)\s+vs\s+(\d+)(?:\s+(\d+)(?!次))?' + _TRIALS,
+                           re.IGNORECASE)
+
+
+def _trials(text: Optional[str]) -> Optional[int]:
+    trials = int(text) if text else SIM_DEFAULT_TRIALS
+    return trials if trials >= 1 else None
+
+
+def parse_scenario(text: str) -> Optional[Tuple[Scenario, int]]:
+    """Parse ``.sim`` arguments into (scenario, trials), or None.
+
+    None also covers fewer than one trial and a chase lead outside
+    1..escape-1, which would make the chase over before it starts.
+    """
+    text = text.strip()
+    m = FIGHT_PATTERN.match(text)
+    if m:
+        g = m.groups()
+        scenario = FightScenario(
+            Combatant(int(g[0]), int(g[1]), g[2], int(g[3])),
+            Combatant(int(g[4]), int(g[5]), g[6], int(g[7])),
+        )
+        trials = _trials(g[8])
+        return (scenario, trials) if trials else None
+
+    m = SAN_PATTERN.match(text)
+    if m:
+        losses = tuple(tuple(pair.split("/")) for pair in m.group(2).split())
+        trials = _trials(m.group(3))
+        return (SanScenario(int(m.group(1)), losses), trials) if trials else None
+
+    m = CHASE_PATTERN.match(text)
+    if m:
+        scenario = ChaseScenario(int(m.group(1)), int(m.group(2)))
+        if m.group(3):
+            scenario = scenario._replace(lead=int(m.group(3)))
+        trials = _trials(m.group(4))
+        if not trials or not 0 < scenario.lead < scenario.escape:
+            return None
+        return scenario, trials
+    return None
+
+
+def _quantile(counts: Counter, q: float) -> int:
+    target = q * sum(counts.values())
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= target:
+            return value
+    return 0
+
+
+def _spread(counts: Counter) -> str:
+    total = sum(counts.values())
+    mean = sum(v * c for v, c in counts.items()) / total
+    return (f"平均 {mean:.2f} / 中位数 {_quantile(counts, 0.5)} / "
+            f"P90 {_quantile(counts, 0.9)} / 最大 {max(counts)}")
+
+
+def _title(s: Scenario) -> str:
+    if isinstance(s, FightScenario):
+        a, b = s.investigator, s.foe
+        return (f"⚔️ 战斗模拟 格斗{a.fighting} 闪避{a.dodge} {a.damage} HP{a.hp}"
+                f" vs 格斗{b.fighting} 闪避{b.dodge} {b.damage} HP{b.hp}")
+    if isinstance(s, SanScenario):
+        checks = " ".join(f"{ok}/{fail}" for ok, fail in s.losses)
+        return f"🧠 理智模拟 SAN{s.san} {checks}"
+    return f"🏃 追逐模拟 {s.skill} vs {s.foe_skill} 领先{s.lead} (≥{s.escape}逃脱)"
+
+
+def report_text(report: SimReport) -> str:
+    """Chat/CLI summary of a simulation report."""
+    lines = [_title(report.scenario)]
+    if not report.trials:
+        lines.append("⏱️ 时间预算内未能完成任何模拟")
+        return "\n".join(lines)
+
+    trials = f"模拟 {report.trials} 次"
+    if report.trials < report.requested:
+        trials += f" (时间预算内完成 {report.trials}/{report.requested})"
+    lines.append(f"{trials}，耗时 {report.elapsed:.2f}s")
+
+    names = OUTCOME_NAMES[type(report.scenario)]
+    lines.append("  ".join(f"{name}: {report.outcomes.get(code, 0) / report.trials:.1%}"
+                           for code, name in enumerate(names)))
+    if not isinstance(report.scenario, SanScenario):
+        lines.append(f"回合数: {_spread(report.rounds)}")
+    if report.loss:
+        label = "理智损失" if isinstance(report.scenario, SanScenario) else "HP损失"
+        lines.append(f"{label}: {_spread(report.loss)}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m dice.simulate")
+    parser.add_argument("scenario", nargs="+", help="same arguments as the .sim command")
+    parser.add_argument("-n", "--trials", type=int, help="number of trials")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--budget", type=float, help="stop after this many seconds")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    parsed = parse_scenario(" ".join(args.scenario))
+    if parsed is None:
+        parser.error("无法解析场景，格式同 .sim 指令 (.help sim)")
+    scenario, trials = parsed
+    report = simulate(scenario, args.trials or trials, workers=args.workers,
+                      budget=args.budget, seed=args.seed)
+    print(report_text(report))
+
+
+if __name__ == "__main__":
+    main()
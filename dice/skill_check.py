@@ -1,6 +1,11 @@
 """CoC 7.0 skill check logic."""
 
-from dice.roller import roll_d100
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from dice.probability import d100_distribution
+from dice.rng import BufferedRandom, default_provider
+from dice.roller import D100Result, numpy_module, roll_d100, roll_d100_batch
 
 
 class SuccessLevel:
@@ -21,62 +26,190 @@ class SuccessLevel:
         "大成功": 5,
     }
 
+    # Display name of each level code
+    NAMES = ("大失败", "失败", "成功", "困难成功", "极难成功", "大成功")
+
     @staticmethod
     def rank(level: str) -> int:
         return SuccessLevel.ORDER.get(level, -1)
 
 
-def determine_success(roll_value: int, skill_value: int) -> str:
-    """Determine success level for a CoC 7.0 skill check."""
+class LevelCode:
+    """Integer success levels, ordered so that higher is better."""
+    FUMBLE = 0
+    FAILURE = 1
+    REGULAR = 2
+    HARD = 3
+    EXTREME = 4
+    CRITICAL = 5
+
+
+class SkillResult(NamedTuple):
+    skill_name: str
+    skill_value: int
+    d100: D100Result
+    level_code: int
+
+    @property
+    def roll(self) -> int:
+        return self.d100.total
+
+    @property
+    def success_level(self) -> str:
+        return SuccessLevel.NAMES[self.level_code]
+
+
+class SkillBatch(NamedTuple):
+    rolls: Sequence[int]
+    level_codes: Sequence[int]
+
+
+def _compute_level_code(roll_value: int, skill_value: int) -> int:
     if roll_value == 1:
-        return SuccessLevel.CRITICAL
+        return LevelCode.CRITICAL
 
     # Fumble: 96-100 if skill < 50, 100 if skill >= 50
     if skill_value < 50 and roll_value >= 96:
-        return SuccessLevel.FUMBLE
+        return LevelCode.FUMBLE
     if roll_value == 100:
-        return SuccessLevel.FUMBLE
+        return LevelCode.FUMBLE
 
     extreme = skill_value // 5
     hard = skill_value // 2
 
     if roll_value <= extreme:
-        return SuccessLevel.EXTREME
+        return LevelCode.EXTREME
     if roll_value <= hard:
-        return SuccessLevel.HARD
+        return LevelCode.HARD
     if roll_value <= skill_value:
-        return SuccessLevel.REGULAR
+        return LevelCode.REGULAR
 
-    return SuccessLevel.FAILURE
+    return LevelCode.FAILURE
 
 
-def skill_check(skill_name: str, skill_value: int,
-                bonus: int = 0, penalty: int = 0) -> dict:
-    """Perform a skill check.
+# Level code for every (skill 0-200, roll 1-100); column 0 is unused
+MAX_TABLE_SKILL = 200
+LEVEL_TABLE = tuple(
+    bytes([0] + [_compute_level_code(r, skill) for r in range(1, 101)])
+    for skill in range(MAX_TABLE_SKILL + 1)
+)
+
+
+@lru_cache(maxsize=None)
+def _np_table():
+    np = numpy_module()
+    if np is None:
+        return None
+    return np.array([list(row) for row in LEVEL_TABLE], dtype=np.int8)
+
+
+def level_code(roll_value: int, skill_value: int) -> int:
+    """Integer success level of a d100 roll against a skill value."""
+    if 0 <= skill_value <= MAX_TABLE_SKILL and 1 <= roll_value <= 100:
+        return LEVEL_TABLE[skill_value][roll_value]
+    return _compute_level_code(roll_value, skill_value)
+
+
+def determine_success(roll_value: int, skill_value: int) -> str:
+    """Determine success level for a CoC 7.0 skill check."""
+    return SuccessLevel.NAMES[level_code(roll_value, skill_value)]
+
+
+def level_code_chances(skill_value: int, bonus: int = 0,
+                       penalty: int = 0) -> List[float]:
+    """Exact chance of each level code for a skill check."""
+    chances = [0.0] * len(SuccessLevel.NAMES)
+    for roll_value, p in enumerate(d100_distribution(bonus, penalty)):
+        if p:
+            chances[level_code(roll_value, skill_value)] += p
+    return chances
+
 
-    Returns dict with: roll, skill_name, skill_value, success_level, details
+def success_chances(skill_value: int, bonus: int = 0,
+                    penalty: int = 0) -> Dict[str, float]:
+    """Exact chance of each success level, from fumble up to critical."""
+    chances = level_code_chances(skill_value, bonus=bonus, penalty=penalty)
+    return dict(zip(SuccessLevel.NAMES, chances))
+
+
+def skill_check_batch(skill_values: Sequence[int], bonus: int = 0,
+                      penalty: int = 0, generator=None,
+                      rng: Optional[BufferedRandom] = None) -> SkillBatch:
+    """Resolve one check per skill value in a single batch of d100 rolls.
+
+    Returns the rolls and integer level codes, as NumPy arrays when
+    NumPy is installed and lists otherwise. Lists also come back when
+    drawing from a provider ``rng`` (see roll_d100_batch).
     """
-    result = roll_d100(bonus=bonus, penalty=penalty)
-    success = determine_success(result.total, skill_value)
+    rolls = roll_d100_batch(len(skill_values), bonus=bonus, penalty=penalty,
+                            generator=generator, rng=rng).totals
+    table = _np_table() if rng is None else None
+    if table is None:
+        codes = [level_code(r, s) for r, s in zip(rolls, skill_values)]
+        return SkillBatch(rolls, codes)
 
-    hard = skill_value // 2
-    extreme = skill_value // 5
+    np = numpy_module()
+    skills = np.asarray(skill_values, dtype=np.int64)
+    in_table = (skills >= 0) & (skills <= MAX_TABLE_SKILL)
+    codes = table[np.where(in_table, skills, 0), rolls]
+    for i in np.flatnonzero(~in_table):
+        codes[i] = _compute_level_code(int(rolls[i]), int(skills[i]))
+    return SkillBatch(rolls, codes)
 
-    details = (
-        f"🎲 {skill_name} 检定 (目标值: {skill_value})\n"
-        f"d100 = {result.total}"
-    )
-    if bonus > 0 or penalty > 0:
-        details += f"\n{result.details}"
-    details += (
-        f"\n困难: {hard} / 极难: {extreme}"
-        f"\n结果: 【{success}】"
-    )
-
-    return {
-        "roll": result.total,
-        "skill_name": skill_name,
-        "skill_value": skill_value,
-        "success_level": success,
-        "details": details,
-    }
+
+class GroupEntry(NamedTuple):
+    name: str
+    skill_value: int
+    roll: int
+    level_code: int
+
+
+def rank_entries(entries: Sequence[GroupEntry]) -> List[GroupEntry]:
+    """Best first: higher success level, then higher skill, then listed order.
+
+    The same order opposed_roll uses to pick its winner.
+    """
+    return sorted(entries, key=lambda e: (e.level_code, e.skill_value), reverse=True)
+
+
+def roll_group(parties: Sequence[Tuple[str, int]], bonus: int = 0, penalty: int = 0,
+               rng: Optional[BufferedRandom] = None, generator=None) -> List[GroupEntry]:
+    """One check per (name, skill value) from a single batch, ranked best first.
+
+    Chat rolls come from ``rng`` (or the default provider), so RNG_MODE and
+    room streams apply to them as to every other roll. Only an explicit
+    numpy.random.Generator, as simulations pass, draws the batch in NumPy.
+    """
+    skills = [skill for _, skill in parties]
+    if generator is not None:
+        batch = skill_check_batch(skills, bonus=bonus, penalty=penalty, generator=generator)
+    else:
+        batch = skill_check_batch(skills, bonus=bonus, penalty=penalty,
+                                  rng=rng or default_provider())
+    return rank_entries([GroupEntry(name, skill, int(roll), int(code))
+                         for (name, skill), roll, code
+                         in zip(parties, batch.rolls, batch.level_codes)])
+
+
+class GroupCheckResult(NamedTuple):
+    skill_name: str
+    entries: Tuple[GroupEntry, ...]  # ranked best first
+
+    @property
+    def passed(self) -> int:
+        return sum(e.level_code >= LevelCode.REGULAR for e in self.entries)
+
+
+def group_check(skill_name: str, parties: Sequence[Tuple[str, int]],
+                bonus: int = 0, penalty: int = 0,
+                rng: Optional[BufferedRandom] = None) -> GroupCheckResult:
+    """The same skill checked for every party, e.g. a party-wide 聆听."""
+    return GroupCheckResult(skill_name, tuple(roll_group(parties, bonus, penalty, rng)))
+
+
+def skill_check(skill_name: str, skill_value: int,
+                bonus: int = 0, penalty: int = 0,
+                rng: Optional[BufferedRandom] = None) -> SkillResult:
+    """Perform a skill check; utils.formatter renders the result."""
+    result = roll_d100(bonus=bonus, penalty=penalty, rng=rng)
+    return SkillResult(skill_name, skill_value, result, level_code(result.total, skill_value))
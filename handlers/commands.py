@@ -0,0 +1,58 @@
+"""Command registry and precompiled argument grammars."""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class Grammar:
+    """A compiled argument pattern plus a builder for typed arguments.
+
+    ``parse`` returns the builder's result for the stripped argument
+    text, or None when the text does not match.
+    """
+
+    __slots__ = ("pattern", "build")
+
+    def __init__(self, pattern: str, build: Callable[[re.Match], Any],
+                 flags: int = re.IGNORECASE):
+        self.pattern = re.compile(pattern, flags)
+        self.build = build
+
+    def parse(self, text: str) -> Optional[Any]:
+        match = self.pattern.match(text.strip())
+        if match is None:
+            return None
+        return self.build(match)
+
+
+class Command(NamedTuple):
+    handler: Callable[..., Optional[str]]
+    grammar: Optional[Grammar]
+    usage: str            # reply when the arguments do not parse
+    needs_player: bool    # whether the handler reads or writes player state
+    heavy: bool           # CPU-bound enough to run off the event loop
+    cost: Optional[Callable[[Any], int]]  # dice work of the parsed arguments
+
+
+COMMANDS: Dict[str, Command] = {}
+
+
+def command(*names: str, grammar: Optional[Grammar] = None, usage: str = "",
+            needs_player: bool = False, heavy: bool = False,
+            cost: Optional[Callable[[Any], int]] = None):
+    """Register a handler under one or more command names (with aliases).
+
+    The handler is called as ``handler(args, player, rng)`` where args is
+    the grammar's typed result (or the raw argument text without a
+    grammar) and player is None unless ``needs_player`` is set.
+    ``cost(args)`` estimates the dice the command rolls, in plain die
+    rolls, for the per-message budget; commands without one count as 1.
+    """
+    def decorator(fn):
+        entry = Command(fn, grammar, usage, needs_player, heavy, cost)
+        for name in names:
+            COMMANDS[name] = entry
+        return fn
+    return decorator
@@ -0,0 +1,122 @@
+"""Flood protection: token buckets per contact and per room.
+
+Every message draws tokens from its sender's bucket and its room's bucket
+for its command class. Heavy commands (.coc, .prob, .sim) have buckets of
+their own, so a loop of them is stopped long before it could crowd out
+ordinary rolls. A message costs one token per command plus one per
+``dice_per_token`` dice it would roll. Buckets live in an LRU of at most
+``max_keys`` entries, so memory stays bounded however many contacts
+write; an evicted bucket is recreated full, as for a new contact.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from config import (
+    FLOOD_CONTACT_BURST, FLOOD_CONTACT_RATE, FLOOD_DICE_PER_TOKEN,
+    FLOOD_HEAVY_CONTACT_BURST, FLOOD_HEAVY_CONTACT_RATE, FLOOD_HEAVY_ROOM_BURST,
+    FLOOD_HEAVY_ROOM_RATE, FLOOD_MAX_KEYS, FLOOD_ROOM_BURST, FLOOD_ROOM_RATE,
+    FLOOD_WARN_INTERVAL,
+)
+from utils.ratelimit import TokenBucket
+
+SCOPES = ("contact", "room")
+CLASSES = ("light", "heavy")
+
+WARNING = "⏳ 指令太频繁，请 {wait} 秒后再试"
+
+
+class Limit(NamedTuple):
+    rate: float   # tokens per second
+    burst: float  # bucket capacity
+
+
+class MessageCost(NamedTuple):
+    commands: int  # commands in the message
+    heavy: bool    # whether any of them is a heavy command
+    dice: int      # dice work, in plain die rolls
+
+
+class FloodGuard:
+    """Admits or rejects command messages before they are queued."""
+
+    def __init__(self, limits: Optional[Dict[Tuple[str, str], Limit]] = None,
+                 dice_per_token: int = FLOOD_DICE_PER_TOKEN,
+                 max_keys: int = FLOOD_MAX_KEYS,
+                 warn_interval: float = FLOOD_WARN_INTERVAL):
+        self.limits = limits or {
+            ("contact", "light"): Limit(FLOOD_CONTACT_RATE, FLOOD_CONTACT_BURST),
+            ("room", "light"): Limit(FLOOD_ROOM_RATE, FLOOD_ROOM_BURST),
+            ("contact", "heavy"): Limit(FLOOD_HEAVY_CONTACT_RATE, FLOOD_HEAVY_CONTACT_BURST),
+            ("room", "heavy"): Limit(FLOOD_HEAVY_ROOM_RATE, FLOOD_HEAVY_ROOM_BURST),
+        }
+        self.dice_per_token = dice_per_token
+        self.max_keys = max_keys
+        self.warn_interval = warn_interval
+        # (scope, id, class) -> bucket, least recently used first
+        self._buckets: "OrderedDict[Tuple[str, str, str], TokenBucket]" = OrderedDict()
+        # contact_id -> when it was last warned
+        self._warned: "OrderedDict[str, float]" = OrderedDict()
+        self.metrics = {"admitted": 0, "warnings": 0, "evicted": 0}
+        for scope in SCOPES:
+            for cls in CLASSES:
+                self.metrics[f"rejected_{scope}_{cls}"] = 0
+
+    def _bucket(self, scope: str, key: str, cls: str, now: float) -> TokenBucket:
+        lru_key = (scope, key, cls)
+        bucket = self._buckets.get(lru_key)
+        if bucket is not None:
+            self._buckets.move_to_end(lru_key)
+            return bucket
+        limit = self.limits[scope, cls]
+        bucket = self._buckets[lru_key] = TokenBucket(limit.rate, limit.burst, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.metrics["evicted"] += 1
+        return bucket
+
+    def admit(self, contact_id: str, room_id: str, cost: MessageCost,
+              now: Optional[float] = None) -> float:
+        """Take the message's tokens: 0.0 if admitted, else seconds to wait.
+
+        Tokens are taken from both buckets or from neither. A cost above a
+        bucket's burst waits for a full bucket instead of never running.
+        """
+        now = time.monotonic() if now is None else now
+        cls = "heavy" if cost.heavy else "light"
+        tokens = cost.commands + cost.dice // self.dice_per_token
+        taken = []
+        for scope, key in (("contact", contact_id), ("room", room_id)):
+            bucket = self._bucket(scope, key, cls, now)
+            need = min(tokens, bucket.capacity)
+            wait = bucket.wait_time(need, now)
+            if wait:
+                self.metrics[f"rejected_{scope}_{cls}"] += 1
+                return wait
+            taken.append((bucket, need))
+        for bucket, need in taken:
+            bucket.try_acquire(need, now)
+        self.metrics["admitted"] += 1
+        return 0.0
+
+    def warning(self, contact_id: str, wait: float,
+                now: Optional[float] = None) -> Optional[str]:
+        """Reply text for a rejected contact, at most once per warn_interval."""
+        now = time.monotonic() if now is None else now
+        last = self._warned.get(contact_id)
+        if last is not None and now - last < self.warn_interval:
+            return None
+        self._warned[contact_id] = now
+        self._warned.move_to_end(contact_id)
+        if len(self._warned) > self.max_keys:
+            self._warned.popitem(last=False)
+        self.metrics["warnings"] += 1
+        return WARNING.format(wait=math.ceil(wait))
+
+    @property
+    def tracked_keys(self) -> int:
+        return len(self._buckets)
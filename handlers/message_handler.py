@@ -2,20 +2,72 @@
 
 from __future__ import annotations
 
+import logging
 import re
-from typing import Optional, Tuple
-
-from dice.roller import roll_expression, roll_d100
-from dice.skill_check import skill_check
-from dice.san_check import san_check
-from dice.opposed import opposed_roll
-from dice.combat import fighting_check, firearms_check, dodge_check, damage_roll
-from dice.char_gen import generate_characters
-from dice.luck import spend_luck
-from storage.json_store import JsonStore
-from utils.formatter import format_reply, help_text
-
-store = JsonStore()
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from dice.roller import (
+    D100Result, DiceResult, RepeatedRoll, expression_cost, roll_expression, roll_d100,
+)
+from dice.skill_check import (
+    GroupCheckResult, LevelCode, SkillResult, group_check, level_code_chances, skill_check,
+)
+from dice.san_check import SanResult, san_check, expected_san_loss
+from dice.opposed import (
+    GroupOpposedResult, OpposedResult, opposed_group, opposed_roll, win_probability,
+)
+from dice.probability import (
+    CheckChances, DistributionReport, OpposedChances, SanChances, distribution,
+    distribution_cost,
+)
+from dice.rng import SeededStream, provider_for_room
+from dice.combat import DamageResult, fighting_check, firearms_check, dodge_check, damage_roll
+from dice.char_gen import (
+    DICE_PER_CHARACTER, MAX_CHARACTERS, generate_characters, parse_constraints,
+)
+from dice.luck import LuckResult, spend_luck
+from handlers.commands import COMMANDS, Grammar, command
+from handlers.flood import MessageCost
+from config import (
+    GROUP_MAX_PARTIES, HISTORY_SIZE, MESSAGE_MAX_COMMANDS, MESSAGE_MAX_DICE_COST, SIM_MAX_TRIALS,
+    SIM_TIME_BUDGET,
+)
+from models.history import (
+    HistoryLog, HistoryStats, combined_stats, merged_recent,
+)
+from models.player import FIELDS, Player
+from storage.base import Store, open_store
+from utils import metrics
+from utils.formatter import format_reply, help_text, render
+
+# Opened on first use, so importing this module does not read the player file
+store: Optional[Store] = None
+_store_lock = threading.Lock()
+rng_log = logging.getLogger("dice.rng")
+
+# Commands in one message go on separate lines or between semicolons
+COMMAND_SEPARATOR = re.compile(r"[\n;；]")
+
+
+def get_store() -> Store:
+    """The player store, opened on first call."""
+    global store
+    if store is None:
+        with _store_lock:
+            if store is None:
+                store = open_store()
+    return store
+
+
+def close_store():
+    """Flush and close the player store if it was ever opened."""
+    global store
+    with _store_lock:
+        if store is not None:
+            store.close()
+            store = None
 
 
 def parse_command(text: str) -> Tuple[str, str]:
@@ -33,178 +85,436 @@ def parse_command(text: str) -> Tuple[str, str]:
     return cmd, args
 
 
+def is_heavy(text: str) -> bool:
+    """Whether the command in text should run off the event loop."""
+    entry = COMMANDS.get(parse_command(text)[0])
+    return entry is not None and entry.heavy
+
+
+def split_commands(text: str) -> List[str]:
+    """The commands in a message, in order; other lines are ignored."""
+    parts = (part.strip() for part in COMMAND_SEPARATOR.split(text))
+    return [part for part in parts if part[:1] == "."]
+
+
+def message_cost(text: str) -> MessageCost:
+    """How much work the commands in a message would do, for flood limits.
+
+    Commands whose arguments do not parse still count, since they get a
+    usage reply; unknown commands are ignored.
+    """
+    commands = dice = 0
+    heavy = False
+    for part in split_commands(text):
+        cmd, args = parse_command(part)
+        entry = COMMANDS.get(cmd)
+        if entry is None:
+            continue
+        commands += 1
+        heavy = heavy or entry.heavy
+        parsed = entry.grammar.parse(args) if entry.grammar is not None else args
+        if parsed is not None:
+            dice += entry.cost(parsed) if entry.cost is not None else 1
+    return MessageCost(commands, heavy, dice)
+
+
 def handle_command(text: str, contact_id: str, room_id: str,
                    player_name: str) -> Optional[str]:
-    """Process a command and return the response text, or None if not a command."""
+    """Process a command and return the response text, or None if not a command.
+
+    A message holding several commands runs them all; see handle_commands.
+    """
+    # Cheapest possible reject for ordinary chat
+    if not text or text.lstrip()[:1] != ".":
+        return None
+    if COMMAND_SEPARATOR.search(text):
+        commands = split_commands(text)
+        if len(commands) > 1:
+            return handle_commands(commands, contact_id, room_id, player_name)
+        text = commands[0]
+    timed = metrics.ENABLED
+    if timed:
+        start = time.perf_counter()
     cmd, args = parse_command(text)
-    if not cmd:
+    entry = COMMANDS.get(cmd)
+    if entry is None:
         return None
 
-    player = store.get_player(contact_id, room_id, player_name)
-
-    result = _dispatch(cmd, args, player)
+    if entry.grammar is not None:
+        parsed = entry.grammar.parse(args)
+        if parsed is None:
+            return format_reply(player_name, entry.usage)
+    else:
+        parsed = args
+
+    if timed:
+        parsed_at = time.perf_counter()
+        metrics.stage_seconds.observe("parse", parsed_at - start)
+        metrics.commands_by_name.inc(cmd)
+        metrics.commands_by_room.inc(room_id)
+
+    player = None
+    if entry.needs_player:
+        player = get_store().get_player(contact_id, room_id, player_name)
+
+    rng = provider_for_room(room_id)
+    _log_rng(rng, room_id, contact_id, cmd, args)
+
+    if timed:
+        roll_start = time.perf_counter()
+        metrics.stage_seconds.observe("dispatch", roll_start - parsed_at)
+    result = entry.handler(parsed, player, rng)
+    if timed:
+        dispatched_at = time.perf_counter()
+        metrics.stage_seconds.observe("roll", dispatched_at - roll_start)
     if result is None:
         return None
 
-    store.update_player(player)
-    return format_reply(player_name, result)
-
-
-def _dispatch(cmd: str, args: str, player) -> Optional[str]:
-    """Route command to the appropriate handler."""
-
-    # Basic rolls
-    if cmd in (".r", ".rd", ".roll"):
-        return _handle_roll(args, player)
+    if player is not None:
+        get_store().update_player(player)
+        if timed:
+            metrics.stage_seconds.observe("persist", time.perf_counter() - dispatched_at)
 
-    # Skill check
-    if cmd == ".rc":
-        return _handle_skill_check(args, player)
+    # Dice results become text only here, once a reply is certain
+    if timed:
+        render_start = time.perf_counter()
+    text = render(result)
+    if timed:
+        metrics.stage_seconds.observe("render", time.perf_counter() - render_start)
+    return format_reply(player_name, text)
 
-    # SAN check
-    if cmd == ".san":
-        return _handle_san_check(args, player)
 
-    # Opposed roll
-    if cmd == ".rop":
-        return _handle_opposed(args)
+def handle_commands(commands: List[str], contact_id: str, room_id: str,
+                    player_name: str) -> Optional[str]:
+    """Run several commands from one message as a single transaction.
 
-    # Combat
-    if cmd == ".fight":
-        return _handle_combat("fight", args, player)
-    if cmd == ".fire":
-        return _handle_combat("fire", args, player)
-    if cmd == ".dodge":
-        return _handle_combat("dodge", args, player)
-    if cmd == ".dmg":
-        return _handle_damage(args)
+    Everything is parsed and checked against the per-message caps before
+    anything rolls. The commands then share one player load and one
+    persist, and their results form one reply. If a handler raises, the
+    player is restored to its state before the message.
+    """
+    if len(commands) > MESSAGE_MAX_COMMANDS:
+        return format_reply(player_name, f"❌ 一条消息最多 {MESSAGE_MAX_COMMANDS} 条指令")
+    timed = metrics.ENABLED
+    if timed:
+        start = time.perf_counter()
+
+    steps = []
+    cost = 0
+    for text in commands:
+        cmd, args = parse_command(text)
+        entry = COMMANDS.get(cmd)
+        if entry is None:
+            continue
+        if entry.heavy:
+            return format_reply(player_name, f"❌ {cmd} 需单独发送")
+        parsed = entry.grammar.parse(args) if entry.grammar is not None else args
+        if parsed is not None:
+            cost += entry.cost(parsed) if entry.cost is not None else 1
+        steps.append((cmd, args, entry, parsed))
+    if not steps:
+        return None
+    if cost > MESSAGE_MAX_DICE_COST:
+        return format_reply(player_name, "❌ 本条消息的骰子总量过大")
+
+    if timed:
+        parsed_at = time.perf_counter()
+        metrics.stage_seconds.observe("parse", parsed_at - start)
+        for cmd, _, _, _ in steps:
+            metrics.commands_by_name.inc(cmd)
+        metrics.commands_by_room.inc(room_id)
+
+    player = saved = None
+    if any(entry.needs_player for _, _, entry, _ in steps):
+        player = get_store().get_player(contact_id, room_id, player_name)
+        saved = Player.from_dict(player.to_dict())
+
+    rng = provider_for_room(room_id)
+    if timed:
+        roll_start = time.perf_counter()
+        metrics.stage_seconds.observe("dispatch", roll_start - parsed_at)
+    results = []
+    try:
+        for cmd, args, entry, parsed in steps:
+            if parsed is None:
+                results.append(entry.usage)
+                continue
+            _log_rng(rng, room_id, contact_id, cmd, args)
+            result = entry.handler(parsed, player if entry.needs_player else None, rng)
+            if result is not None:
+                results.append(result)
+    except Exception:
+        if player is not None:
+            for name in FIELDS:
+                setattr(player, name, getattr(saved, name))
+        raise
+    if timed:
+        dispatched_at = time.perf_counter()
+        metrics.stage_seconds.observe("roll", dispatched_at - roll_start)
+    if not results:
+        return None
 
-    # Character generation
-    if cmd == ".coc":
-        return _handle_coc(args)
+    if player is not None:
+        get_store().update_player(player)
+        if timed:
+            metrics.stage_seconds.observe("persist", time.perf_counter() - dispatched_at)
 
-    # Luck
-    if cmd == ".luck":
-        return _handle_luck(args, player)
+    if timed:
+        render_start = time.perf_counter()
+    text = "\n\n".join(render(result) for result in results)
+    if timed:
+        metrics.stage_seconds.observe("render", time.perf_counter() - render_start)
+    return format_reply(player_name, text)
 
-    # Help
-    if cmd == ".help":
-        return help_text(args)
 
-    return None
+def _log_rng(rng, room_id: str, contact_id: str, cmd: str, args: str):
+    if isinstance(rng, SeededStream):
+        # Enough to replay this command: SeededStream.replay(seed, offset)
+        rng_log.info("room=%s seed=%d offset=%d contact=%s cmd=%s %s",
+                     room_id, rng.seed, rng.offset, contact_id, cmd, args)
 
 
-def _handle_roll(args: str, player) -> str:
+def _dispatch(cmd: str, args: str, player, rng=None) -> Optional[str]:
+    """Route command to the appropriate handler."""
+    entry = COMMANDS.get(cmd)
+    if entry is None:
+        return None
+    if entry.grammar is None:
+        result = entry.handler(args, player, rng)
+    else:
+        parsed = entry.grammar.parse(args)
+        if parsed is None:
+            return entry.usage
+        result = entry.handler(parsed, player, rng)
+    return None if result is None else render(result)
+
+
+# ---------------------------------------------------------------------------
+# Argument grammars
+# ---------------------------------------------------------------------------
+
+class CheckArgs(NamedTuple):
+    skill_name: str
+    skill_value: int
+    bonus: int
+    penalty: int
+
+
+class SanArgs(NamedTuple):
+    san_value: int
+    success_loss: str
+    fail_loss: str
+
+
+class GroupArgs(NamedTuple):
+    label: str
+    parties: Tuple[Tuple[str, int], ...]  # (name, skill value)
+    bonus: int
+    penalty: int
+
+
+class OpposedArgs(NamedTuple):
+    name1: str
+    skill1: int
+    name2: str
+    skill2: int
+
+
+def _bonus_penalty(bp_type: Optional[str], bp_count: str) -> Tuple[int, int]:
+    count = int(bp_count) if bp_count else 1
+    bonus = count if bp_type and bp_type.lower() == 'b' else 0
+    penalty = count if bp_type and bp_type.lower() == 'p' else 0
+    return bonus, penalty
+
+
+SKILL_CHECK = Grammar(
+    r'(\S+)\s+(\d+)\s*(?:(b|p)(\d*))?',
+    lambda m: CheckArgs(m.group(1), int(m.group(2)),
+                        *_bonus_penalty(m.group(3), m.group(4))),
+)
+COMBAT_CHECK = Grammar(
+    r'(\d+)\s*(?:(b|p)(\d*))?',
+    lambda m: CheckArgs("", int(m.group(1)),
+                        *_bonus_penalty(m.group(2), m.group(3))),
+)
+SAN_CHECK = Grammar(
+    r'(\d+)\s+(\S+)/(\S+)',
+    lambda m: SanArgs(int(m.group(1)), m.group(2), m.group(3)),
+    flags=0,
+)
+OPPOSED = Grammar(
+    r'(\S+)\s+(\d+)\s+vs\s+(\S+)\s+(\d+)',
+    lambda m: OpposedArgs(m.group(1), int(m.group(2)),
+                          m.group(3), int(m.group(4))),
+)
+PARTY = re.compile(r'([^\s:：]+)[:：](\d+)')
+_PARTIES = r'((?:[^\s:：]+[:：]\d+\s*)+)'
+
+
+def _group_args(m: re.Match, bonus: int = 0, penalty: int = 0) -> GroupArgs:
+    parties = tuple((name, int(value)) for name, value in PARTY.findall(m.group(2)))
+    return GroupArgs(m.group(1) or "", parties, bonus, penalty)
+
+
+GROUP_CHECK = Grammar(
+    r'([^\s:：]+)\s+' + _PARTIES + r'(?:(b|p)(\d*))?$',
+    lambda m: _group_args(m, *_bonus_penalty(m.group(3), m.group(4))),
+)
+GROUP_OPPOSED = Grammar(r'(?:([^\s:：]+)\s+)?' + _PARTIES + r'$', _group_args)
+PROB_CHECK = Grammar(
+    r'(\d+)\s*(?:(b|p)(\d*))?$',
+    lambda m: CheckArgs("", int(m.group(1)),
+                        *_bonus_penalty(m.group(2), m.group(3))),
+)
+PROB_SAN = Grammar(
+    r'(\d+)\s+(\S+)/(\S+)$',
+    lambda m: SanArgs(int(m.group(1)), m.group(2), m.group(3)),
+    flags=0,
+)
+# A count, if given, must be at least 1
+HISTORY_ARGS = Grammar(
+    r'(room|群)?\s*(0*[1-9]\d*)?$',
+    lambda m: (m.group(1) is not None, int(m.group(2)) if m.group(2) else 10),
+)
+PROB_OPPOSED = Grammar(
+    r'(\d+)\s+vs\s+(\d+)$',
+    lambda m: (int(m.group(1)), int(m.group(2))),
+)
+
+
+# ---------------------------------------------------------------------------
+# Command handlers
+# ---------------------------------------------------------------------------
+
+@command(".r", ".rd", ".roll", needs_player=True, cost=expression_cost)
+def _handle_roll(args: str, player, rng=None) -> Union[D100Result, DiceResult, RepeatedRoll]:
     if not args:
-        r = roll_d100()
-        player.last_roll = r.total
-        return f"🎲 d100 = {r.total}"
-    result = roll_expression(args)
+        result = roll_d100(rng=rng)
+        player.record_roll(result.total)
+        return result
+    result = roll_expression(args, rng)
     player.last_roll = result.total
-    return f"🎲 {result.details}"
+    return result
 
 
-def _handle_skill_check(args: str, player) -> str:
+@command(".rc", grammar=SKILL_CHECK, needs_player=True,
+         usage="❌ 格式: .rc 技能名 目标值 [b/p[数量]]")
+def _handle_skill_check(args: CheckArgs, player, rng=None) -> SkillResult:
     """Parse: 技能名 目标值 [b[N]|p[N]]"""
-    match = re.match(
-        r'(\S+)\s+(\d+)\s*(?:(b|p)(\d*))?',
-        args.strip(), re.IGNORECASE,
-    )
-    if not match:
-        return "❌ 格式: .rc 技能名 目标值 [b/p[数量]]"
+    result = skill_check(args.skill_name, args.skill_value,
+                         bonus=args.bonus, penalty=args.penalty, rng=rng)
 
-    skill_name = match.group(1)
-    skill_value = int(match.group(2))
-    bp_type = match.group(3)
-    bp_count = int(match.group(4)) if match.group(4) else 1
+    player.record_roll(result.roll, args.skill_value, result.level_code,
+                       uniform=not result.d100.net_bonus)
+    player.last_skill_name = args.skill_name
+    player.last_skill_value = args.skill_value
 
-    bonus = bp_count if bp_type and bp_type.lower() == 'b' else 0
-    penalty = bp_count if bp_type and bp_type.lower() == 'p' else 0
+    return result
 
-    result = skill_check(skill_name, skill_value, bonus=bonus, penalty=penalty)
 
-    player.last_roll = result["roll"]
-    player.last_skill_name = skill_name
-    player.last_skill_value = skill_value
+@command(".san", grammar=SAN_CHECK, needs_player=True,
+         usage="❌ 格式: .san SAN值 成功损失/失败损失\n例: .san 55 1d3/1d10",
+         cost=lambda args: 1 + max(expression_cost(args.success_loss),
+                                   expression_cost(args.fail_loss)))
+def _handle_san_check(args: SanArgs, player, rng=None) -> SanResult:
+    """Parse: SAN值 成功损失/失败损失"""
+    result = san_check(args.san_value, args.success_loss, args.fail_loss, rng=rng)
 
-    return result["details"]
+    player.san = result.new_san
+    player.record_roll(result.roll, args.san_value,
+                       LevelCode.REGULAR if result.passed else LevelCode.FAILURE)
 
+    return result
 
-def _handle_san_check(args: str, player) -> str:
-    """Parse: SAN值 成功损失/失败损失"""
-    match = re.match(r'(\d+)\s+(\S+)/(\S+)', args.strip())
-    if not match:
-        return "❌ 格式: .san SAN值 成功损失/失败损失\n例: .san 55 1d3/1d10"
 
-    san_value = int(match.group(1))
-    success_loss = match.group(2)
-    fail_loss = match.group(3)
+@command(".rop", grammar=OPPOSED, usage="❌ 格式: .rop 技能1 值1 vs 技能2 值2")
+def _handle_opposed(args: OpposedArgs, player=None, rng=None) -> OpposedResult:
+    """Parse: 技能1 值1 vs 技能2 值2"""
+    return opposed_roll(args.name1, args.skill1, args.name2, args.skill2, rng=rng)
 
-    result = san_check(san_value, success_loss, fail_loss)
 
-    player.san = result["new_san"]
-    player.last_roll = result["roll"]
+@command(".rcg", grammar=GROUP_CHECK, cost=lambda args: len(args.parties),
+         usage="❌ 格式: .rcg 技能名 名字:目标值 ... [b/p[数量]]\n例: .rcg 聆听 A:60 B:45 C:70")
+def _handle_group_check(args: GroupArgs, player=None, rng=None) -> Union[GroupCheckResult, str]:
+    """Parse: 技能名 名字:目标值 ... [b/p[N]]"""
+    if len(args.parties) > GROUP_MAX_PARTIES:
+        return f"❌ 最多 {GROUP_MAX_PARTIES} 人同时检定"
+    return group_check(args.label, args.parties, bonus=args.bonus,
+                       penalty=args.penalty, rng=rng)
 
-    return result["details"]
 
+@command(".ropn", grammar=GROUP_OPPOSED, cost=lambda args: len(args.parties),
+         usage="❌ 格式: .ropn [技能名] 名字:技能值 名字:技能值 ...\n例: .ropn 潜行 A:60 B:45 C:70")
+def _handle_group_opposed(args: GroupArgs, player=None, rng=None) -> Union[GroupOpposedResult, str]:
+    """Parse: [技能名] 名字:技能值 ..."""
+    if not 2 <= len(args.parties) <= GROUP_MAX_PARTIES:
+        return f"❌ 多方对抗需要 2 到 {GROUP_MAX_PARTIES} 人"
+    return opposed_group(args.parties, args.label, rng=rng)
 
-def _handle_opposed(args: str) -> str:
-    """Parse: 技能1 值1 vs 技能2 值2"""
-    match = re.match(
-        r'(\S+)\s+(\d+)\s+vs\s+(\S+)\s+(\d+)',
-        args.strip(), re.IGNORECASE,
-    )
-    if not match:
-        return "❌ 格式: .rop 技能1 值1 vs 技能2 值2"
 
-    result = opposed_roll(
-        match.group(1), int(match.group(2)),
-        match.group(3), int(match.group(4)),
-    )
-    return result["details"]
+def _combat(check, args: CheckArgs, player, rng) -> SkillResult:
+    result = check(args.skill_value, bonus=args.bonus, penalty=args.penalty, rng=rng)
 
+    player.record_roll(result.roll, args.skill_value, result.level_code,
+                       uniform=not result.d100.net_bonus)
+    player.last_skill_name = result.skill_name
+    player.last_skill_value = args.skill_value
 
-def _handle_combat(kind: str, args: str, player) -> str:
-    match = re.match(r'(\d+)\s*(?:(b|p)(\d*))?', args.strip(), re.IGNORECASE)
-    if not match:
-        return f"❌ 格式: .{kind} 技能值 [b/p[数量]]"
+    return result
 
-    skill_value = int(match.group(1))
-    bp_type = match.group(2)
-    bp_count = int(match.group(3)) if match.group(3) else 1
 
-    bonus = bp_count if bp_type and bp_type.lower() == 'b' else 0
-    penalty = bp_count if bp_type and bp_type.lower() == 'p' else 0
+@command(".fight", grammar=COMBAT_CHECK, needs_player=True,
+         usage="❌ 格式: .fight 技能值 [b/p[数量]]")
+def _handle_fight(args: CheckArgs, player, rng=None) -> SkillResult:
+    return _combat(fighting_check, args, player, rng)
 
-    handlers = {
-        "fight": fighting_check,
-        "fire": firearms_check,
-        "dodge": dodge_check,
-    }
-    result = handlers[kind](skill_value, bonus=bonus, penalty=penalty)
 
-    player.last_roll = result["roll"]
-    player.last_skill_name = result["skill_name"]
-    player.last_skill_value = skill_value
+@command(".fire", grammar=COMBAT_CHECK, needs_player=True,
+         usage="❌ 格式: .fire 技能值 [b/p[数量]]")
+def _handle_fire(args: CheckArgs, player, rng=None) -> SkillResult:
+    return _combat(firearms_check, args, player, rng)
 
-    return result["details"]
 
+@command(".dodge", grammar=COMBAT_CHECK, needs_player=True,
+         usage="❌ 格式: .dodge 技能值 [b/p[数量]]")
+def _handle_dodge(args: CheckArgs, player, rng=None) -> SkillResult:
+    return _combat(dodge_check, args, player, rng)
 
-def _handle_damage(args: str) -> str:
+
+@command(".dmg", cost=expression_cost)
+def _handle_damage(args: str, player=None, rng=None) -> Union[DamageResult, str]:
     if not args.strip():
         return "❌ 格式: .dmg 表达式 (如 1d3+1d4)"
-    result = damage_roll(args.strip())
-    return result["details"]
+    return damage_roll(args.strip(), rng)
+
+
+def _coc_count(args: str) -> int:
+    first = args.split(None, 1)[:1]
+    return int(first[0]) if first and first[0].isdigit() else 1
+
+
+@command(".coc", heavy=True,
+         cost=lambda args: DICE_PER_CHARACTER * max(1, min(_coc_count(args), MAX_CHARACTERS)))
+def _handle_coc(args: str, player=None, rng=None) -> str:
+    """Parse: [数量] [条件...]，如 5 total>=500 EDU>=70"""
+    count = _coc_count(args)
+    parts = args.split(None, 1)
+    if parts and parts[0].isdigit():
+        parts = parts[1:]
+    try:
+        constraints = parse_constraints(parts[0]) if parts else None
+        return generate_characters(count, rng, constraints)
+    except ValueError as e:
+        return f"❌ {e}"
 
 
-def _handle_coc(args: str) -> str:
-    count = 1
-    if args.strip().isdigit():
-        count = int(args.strip())
-    return generate_characters(count)
+@command(".help")
+def _handle_help(args: str, player=None, rng=None) -> str:
+    return help_text(args)
 
 
-def _handle_luck(args: str, player) -> str:
+@command(".luck", needs_player=True)
+def _handle_luck(args: str, player, rng=None) -> Union[LuckResult, str]:
     """Parse: set 值 | spend 数量 技能名 技能值"""
     parts = args.strip().split()
     if not parts:
@@ -227,13 +537,121 @@ def _handle_luck(args: str, player) -> str:
         if player.last_roll is None:
             return "❌ 没有找到上次检定记录"
 
-        result = spend_luck(
-            player.luck, amount, skill_name,
-            player.last_roll, skill_value,
-        )
-        if result["success"]:
-            player.luck = result["new_luck"]
-            player.last_roll = result["new_roll"]
-        return result["details"]
+        try:
+            result = spend_luck(
+                player.luck, amount, skill_name,
+                player.last_roll, skill_value,
+            )
+        except ValueError as e:
+            return f"❌ {e}"
+        player.luck = result.new_luck
+        player.last_roll = result.new_roll
+        return result
 
     return "❌ 用法: .luck set 值 / .luck spend 数量 技能名 技能值"
+
+
+@command(".log", grammar=HISTORY_ARGS, needs_player=True,
+         usage=f"❌ 格式: .log [room] [条数 1-{HISTORY_SIZE}]")
+def _handle_log(args: Tuple[bool, int], player, rng=None) -> HistoryLog:
+    """Parse: [room|群] [条数]"""
+    room, count = args
+    count = min(count, HISTORY_SIZE)
+    if room:
+        players = get_store().players_in_room(player.room_id)
+        return HistoryLog(True, merged_recent(((p.name, p.history) for p in players), count))
+    history = player.history
+    return HistoryLog(False, [(player.name, e) for e in history.recent(count)] if history else [])
+
+
+@command(".stats", grammar=HISTORY_ARGS, needs_player=True, usage="❌ 格式: .stats [room]")
+def _handle_stats(args: Tuple[bool, int], player, rng=None) -> HistoryStats:
+    """Parse: [room|群]"""
+    if args[0]:
+        players = get_store().players_in_room(player.room_id)
+        return HistoryStats(True, combined_stats(p.history for p in players),
+                            sum(p.history is not None for p in players))
+    return HistoryStats(False, combined_stats((player.history,)), 1)
+
+
+def _prob_cost(args: str) -> int:
+    sub, _, rest = args.strip().partition(" ")
+    sub = sub.lower()
+    if sub == "san":
+        san = PROB_SAN.parse(rest)
+        if san is None:
+            return 1
+        return max(1, distribution_cost(san.success_loss) + distribution_cost(san.fail_loss))
+    if sub in ("rc", "rop"):
+        return 1  # small fixed tables
+    return max(1, distribution_cost(args))
+
+
+@command(".prob", heavy=True, cost=_prob_cost)
+def _handle_prob(args: str, player=None, rng=None
+                 ) -> Union[str, DistributionReport, CheckChances, SanChances, OpposedChances]:
+    """Parse: 表达式 | rc 目标值 [b/p[N]] | san SAN值 成功/失败 | rop 值1 vs 值2"""
+    args = args.strip()
+    usage = "❌ 格式: .prob 表达式 / .prob rc 目标值 [b/p] / .prob san SAN值 成功/失败 / .prob rop 值1 vs 值2"
+    if not args:
+        return usage
+
+    sub, _, rest = args.partition(" ")
+    sub = sub.lower()
+    try:
+        if sub == "rc":
+            check = PROB_CHECK.parse(rest)
+            if check is None:
+                return "❌ 格式: .prob rc 目标值 [b/p[数量]]"
+            chances = level_code_chances(check.skill_value,
+                                         bonus=check.bonus, penalty=check.penalty)
+            return CheckChances(check.skill_value, check.bonus, check.penalty, tuple(chances))
+
+        if sub == "san":
+            san = PROB_SAN.parse(rest)
+            if san is None:
+                return "❌ 格式: .prob san SAN值 成功损失/失败损失"
+            expected = expected_san_loss(san.san_value, san.success_loss, san.fail_loss)
+            return SanChances(san.san_value, min(san.san_value, 100) / 100, expected)
+
+        if sub == "rop":
+            skills = PROB_OPPOSED.parse(rest)
+            if skills is None:
+                return "❌ 格式: .prob rop 值1 vs 值2"
+            skill1, skill2 = skills
+            chances = win_probability(skill1, skill2)
+            return OpposedChances(skill1, skill2, chances["win1"], chances["win2"],
+                                  chances["neither"])
+
+        return DistributionReport(args, distribution(args))
+    except ValueError as e:
+        return f"❌ {e}"
+
+
+def _sim_cost(args: str) -> int:
+    from dice.simulate import parse_scenario, scenario_cost
+    parsed = parse_scenario(args)
+    if parsed is None:
+        return 1
+    scenario, trials = parsed
+    return scenario_cost(scenario, min(trials, SIM_MAX_TRIALS))
+
+
+@command(".sim", heavy=True, cost=_sim_cost,
+         usage="❌ 格式: .sim fight 格斗 闪避 伤害 HP vs 格斗 闪避 伤害 HP [次数]\n"
+               "  .sim san SAN值 成功/失败 ... [次数]\n"
+               "  .sim chase 技能 vs 技能 [领先距离1-4] [次数]\n"
+               "  次数至少为1；chase 只给次数时写 N次")
+def _handle_sim(args: str, player=None, rng=None) -> str:
+    """Parse: fight ... vs ... | san SAN值 成功/失败 ... | chase 值1 vs 值2 [领先]"""
+    # Pulls in concurrent.futures.process; only worth it once someone simulates
+    from dice.simulate import parse_scenario, report_text, simulate
+    parsed = parse_scenario(args)
+    if parsed is None:
+        return COMMANDS[".sim"].usage
+    scenario, trials = parsed
+    try:
+        report = simulate(scenario, min(trials, SIM_MAX_TRIALS), budget=SIM_TIME_BUDGET)
+    except ValueError as e:
+        return f"❌ {e}"
+    return report_text(report)
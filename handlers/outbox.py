@@ -0,0 +1,202 @@
+"""Outbound message scheduler: rate limiting, coalescing and retries."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from config import (
+    ROOM_IDLE_SECONDS, SEND_GLOBAL_BURST, SEND_GLOBAL_RATE, SEND_MAX_CHARS,
+    SEND_MAX_PENDING, SEND_MAX_RETRIES, SEND_RETRY_BACKOFF, SEND_ROOM_BURST,
+    SEND_ROOM_RATE,
+)
+from utils import metrics
+from utils.ratelimit import TokenBucket
+
+Say = Callable[[str], Awaitable[None]]
+
+# Separator between replies merged into one message
+MERGE_SEPARATOR = "\n\n"
+
+# gRPC statuses from the puppet service that a later attempt may get past
+TRANSIENT_GRPC_STATUSES = frozenset({
+    "UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "ABORTED",
+})
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed send is worth retrying.
+
+    Timeouts, dropped connections and the gRPC statuses above are;
+    anything else (an unknown room, a revoked login, a rejected payload)
+    would fail the same way again.
+    """
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # grpclib's GRPCError carries a Status enum; matched by name so that
+    # grpclib stays an optional dependency of this module
+    status = getattr(error, "status", None)
+    return getattr(status, "name", None) in TRANSIENT_GRPC_STATUSES
+
+
+class _RoomOutbox:
+    __slots__ = ("pending", "say", "bucket", "wakeup", "task")
+
+    def __init__(self, bucket: TokenBucket):
+        self.pending: Deque[Tuple[str, float]] = deque()  # (text, enqueued at)
+        self.say: Optional[Say] = None
+        self.bucket = bucket
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class Outbox:
+    """Sends replies through per-room and global token buckets.
+
+    Replies that pile up while a room is rate limited are merged into
+    one message of at most ``max_chars`` characters. Sends that fail with
+    a transient error (see is_transient) are retried with exponential
+    backoff and other failures are given up at once; ``say`` is whatever coroutine
+    delivers the text (``room.say`` in production, a fake in tests).
+    """
+
+    def __init__(self, room_rate: float = SEND_ROOM_RATE,
+                 room_burst: float = SEND_ROOM_BURST,
+                 global_rate: float = SEND_GLOBAL_RATE,
+                 global_burst: float = SEND_GLOBAL_BURST,
+                 max_chars: int = SEND_MAX_CHARS,
+                 max_pending: int = SEND_MAX_PENDING,
+                 max_retries: int = SEND_MAX_RETRIES,
+                 retry_backoff: float = SEND_RETRY_BACKOFF,
+                 idle_seconds: float = ROOM_IDLE_SECONDS):
+        self.room_rate = room_rate
+        self.room_burst = room_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_chars = max_chars
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_seconds = idle_seconds
+        self._rooms: Dict[str, _RoomOutbox] = {}
+        self.metrics = {
+            "queued": 0,
+            "sent": 0,
+            "merged": 0,
+            "dropped": 0,
+            "retries": 0,
+            "failed": 0,
+            "failed_permanent": 0,  # part of failed: not retried
+            "send_latency_total": 0.0,
+            "send_latency_max": 0.0,
+        }
+
+    def post(self, room_id: str, say: Say, text: str) -> bool:
+        """Queue a reply for a room. Returns False if the room's queue is full."""
+        room = self._rooms.get(room_id)
+        if room is None:
+            room = _RoomOutbox(TokenBucket(self.room_rate, self.room_burst))
+            room.task = asyncio.get_running_loop().create_task(
+                self._run(room_id, room),
+            )
+            self._rooms[room_id] = room
+
+        if len(room.pending) >= self.max_pending:
+            self.metrics["dropped"] += 1
+            return False
+        room.say = say
+        room.pending.append((text, time.monotonic()))
+        room.wakeup.set()
+        self.metrics["queued"] += 1
+        return True
+
+    def replier(self, room_id: str, say: Say) -> Say:
+        """A reply callable for RoomPipeline that goes through this outbox."""
+        async def reply(text: str):
+            self.post(room_id, say, text)
+        return reply
+
+    def _coalesce(self, room: _RoomOutbox) -> Tuple[str, float]:
+        text, enqueued = room.pending.popleft()
+        parts = [text]
+        size = len(text)
+        while room.pending:
+            nxt = room.pending[0][0]
+            if size + len(MERGE_SEPARATOR) + len(nxt) > self.max_chars:
+                break
+            room.pending.popleft()
+            parts.append(nxt)
+            size += len(MERGE_SEPARATOR) + len(nxt)
+        self.metrics["merged"] += len(parts) - 1
+        return MERGE_SEPARATOR.join(parts), enqueued
+
+    async def _run(self, room_id: str, room: _RoomOutbox):
+        while True:
+            if not room.pending:
+                room.wakeup.clear()
+                try:
+                    await asyncio.wait_for(room.wakeup.wait(), self.idle_seconds)
+                except asyncio.TimeoutError:
+                    if not room.pending:
+                        del self._rooms[room_id]
+                        return
+                continue
+
+            now = time.monotonic()
+            wait = max(room.bucket.wait_time(now=now),
+                       self.global_bucket.wait_time(now=now))
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            room.bucket.try_acquire(now=now)
+            self.global_bucket.try_acquire(now=now)
+
+            text, enqueued = self._coalesce(room)
+            await self._send(room.say, text, enqueued)
+
+    async def _send(self, say: Say, text: str, enqueued: float):
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                if metrics.ENABLED:
+                    started = time.perf_counter()
+                    await say(text)
+                    metrics.stage_seconds.observe("send", time.perf_counter() - started)
+                else:
+                    await say(text)
+            except Exception as e:
+                transient = is_transient(e)
+                if attempt == self.max_retries or not transient:
+                    self.metrics["failed"] += 1
+                    if not transient:
+                        self.metrics["failed_permanent"] += 1
+                    print(f"[发送失败] {e!r}")
+                    return
+                self.metrics["retries"] += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue
+
+            latency = time.monotonic() - enqueued
+            self.metrics["sent"] += 1
+            self.metrics["send_latency_total"] += latency
+            if latency > self.metrics["send_latency_max"]:
+                self.metrics["send_latency_max"] = latency
+            return
+
+    def pending_counts(self) -> Dict[str, int]:
+        """Replies still waiting to be sent, per room."""
+        return {room_id: len(r.pending) for room_id, r in self._rooms.items()}
+
+    async def close(self, timeout: float = 5.0):
+        """Give queued replies up to ``timeout`` seconds to go out, then stop."""
+        deadline = time.monotonic() + timeout
+        while any(r.pending for r in self._rooms.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for room in list(self._rooms.values()):
+            room.task.cancel()
+        await asyncio.gather(
+            *(r.task for r in self._rooms.values()), return_exceptions=True,
+        )
+        self._rooms.clear()
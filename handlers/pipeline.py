@@ -0,0 +1,128 @@
+"""Per-room command pipeline: ordered within a room, concurrent across rooms."""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import PIPELINE_THREADS, ROOM_IDLE_SECONDS, ROOM_QUEUE_SIZE
+from handlers.message_handler import handle_command, is_heavy
+
+
+Reply = Callable[[str], Awaitable[None]]
+
+
+class _RoomWorker:
+    __slots__ = ("queue", "task")
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.task: Optional[asyncio.Task] = None
+
+
+class RoomPipeline:
+    """One bounded queue and worker task per active room.
+
+    submit() never waits: when a room's queue is full the command is
+    dropped and counted, so one flooded room cannot stall the others.
+    Workers exit after ``idle_seconds`` without commands and are
+    recreated on demand.
+    """
+
+    def __init__(self, handler: Callable[..., Optional[str]] = handle_command,
+                 queue_size: int = ROOM_QUEUE_SIZE,
+                 idle_seconds: float = ROOM_IDLE_SECONDS,
+                 threads: int = PIPELINE_THREADS):
+        self.handler = handler
+        self.queue_size = queue_size
+        self.idle_seconds = idle_seconds
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="dice-cmd",
+        )
+        self._workers: Dict[str, _RoomWorker] = {}
+        self.metrics = {
+            "submitted": 0,
+            "processed": 0,
+            "dropped": 0,
+            "errors": 0,
+            "offloaded": 0,
+            "workers_started": 0,
+            "workers_reaped": 0,
+            "max_queue_depth": 0,
+        }
+
+    def submit(self, room_id: str, reply: Reply, text: str,
+               contact_id: str, player_name: str) -> bool:
+        """Queue a command for its room. Returns False if it was dropped."""
+        worker = self._workers.get(room_id)
+        if worker is None:
+            worker = _RoomWorker(self.queue_size)
+            worker.task = asyncio.get_running_loop().create_task(
+                self._run(room_id, worker),
+            )
+            self._workers[room_id] = worker
+            self.metrics["workers_started"] += 1
+
+        try:
+            worker.queue.put_nowait((reply, text, contact_id, player_name))
+        except asyncio.QueueFull:
+            self.metrics["dropped"] += 1
+            return False
+
+        self.metrics["submitted"] += 1
+        depth = worker.queue.qsize()
+        if depth > self.metrics["max_queue_depth"]:
+            self.metrics["max_queue_depth"] = depth
+        return True
+
+    async def _run(self, room_id: str, worker: _RoomWorker):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                job = await asyncio.wait_for(worker.queue.get(), self.idle_seconds)
+            except asyncio.TimeoutError:
+                # No await between here and removal, so no submit can sneak in
+                if worker.queue.empty():
+                    del self._workers[room_id]
+                    self.metrics["workers_reaped"] += 1
+                    return
+                continue
+
+            reply, text, contact_id, player_name = job
+            try:
+                if is_heavy(text):
+                    self.metrics["offloaded"] += 1
+                    response = await loop.run_in_executor(
+                        self.executor, self.handler,
+                        text, contact_id, room_id, player_name,
+                    )
+                else:
+                    response = self.handler(
+                        text=text, contact_id=contact_id,
+                        room_id=room_id, player_name=player_name,
+                    )
+                if response:
+                    await reply(response)
+                self.metrics["processed"] += 1
+            except Exception as e:
+                self.metrics["errors"] += 1
+                print(f"[指令处理失败] {room_id}: {e!r}")
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Current queue depth of every active room."""
+        return {room_id: w.queue.qsize() for room_id, w in self._workers.items()}
+
+    @property
+    def active_rooms(self) -> int:
+        return len(self._workers)
+
+    async def close(self):
+        """Cancel all room workers and shut down the thread pool."""
+        for worker in list(self._workers.values()):
+            worker.task.cancel()
+        await asyncio.gather(
+            *(w.task for w in self._workers.values()), return_exceptions=True,
+        )
+        self._workers.clear()
+        self.executor.shutdown(wait=True)
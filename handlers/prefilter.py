@@ -0,0 +1,130 @@
+"""Local message pre-filter that avoids puppet round-trips for chat.
+
+Wechaty's ``room.ready()``, ``msg.mention_self()`` and ``msg.mention_text()``
+may each be an RPC to the puppet service. Most group messages are plain
+chat, so the raw text (already in the message payload) is checked for the
+command prefix and an @mention of the bot before anything is awaited.
+Room readiness and the bot's names in each room (room alias, WeChat
+nickname and the configured BOT_NAME) are cached until a room event
+invalidates them. A message that @mentions someone but none of those names
+still gets the puppet's own mention check, so a name the bot does not know
+about locally never loses a command.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from config import BOT_NAME, COMMAND_PREFIX, ROOM_CACHE_SIZE
+
+# Puppet calls the unfiltered path made per message: ready, mention_self, mention_text
+BASELINE_CALLS = 3
+
+# Mentions of other people left in front of the command ("@Alice .r")
+LEADING_MENTIONS = re.compile(r"^(?:@\S+\s+)+")
+
+
+class MessageFilter:
+    """Turns a room message into command text, awaiting the puppet as little as possible."""
+
+    def __init__(self, bot_name: str = BOT_NAME, prefix: str = COMMAND_PREFIX,
+                 max_rooms: int = ROOM_CACHE_SIZE):
+        self.bot_name = bot_name
+        self.prefix = prefix
+        self.max_rooms = max_rooms
+        self._rooms: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self.metrics = {
+            "messages": 0,
+            "rejected_local": 0,    # no prefix/@, or the bot mentioned without a command
+            "rejected_mention": 0,  # looked like a command but mention_self() said no
+            "fallbacks": 0,         # @mention of no known name, checked by the puppet
+            "commands": 0,
+            "puppet_calls": 0,
+            "room_cache_hits": 0,
+            "room_cache_misses": 0,
+        }
+
+    async def command(self, msg, room, self_contact) -> Optional[str]:
+        """Command text of a message that @mentions the bot, else None."""
+        metrics = self.metrics
+        metrics["messages"] += 1
+        raw = msg.text()
+        if self.prefix not in raw or "@" not in raw:
+            metrics["rejected_local"] += 1
+            return None
+
+        names = await self._names(room, self_contact)
+        text = self.command_text(raw, names)
+        if text is None:
+            if any(f"@{name}" in raw for name in names):
+                metrics["rejected_local"] += 1  # mentions the bot, but no command
+                return None
+            return await self._puppet_command(msg)
+
+        # The text can be typed by hand, so the puppet still confirms the mention
+        metrics["puppet_calls"] += 1
+        if not await msg.mention_self():
+            metrics["rejected_mention"] += 1
+            return None
+        metrics["commands"] += 1
+        return text
+
+    async def _puppet_command(self, msg) -> Optional[str]:
+        """The unfiltered path, for mentions of a name not known locally."""
+        metrics = self.metrics
+        metrics["fallbacks"] += 1
+        metrics["puppet_calls"] += 1
+        if not await msg.mention_self():
+            metrics["rejected_mention"] += 1
+            return None
+        metrics["puppet_calls"] += 1
+        text = (await msg.mention_text()).strip()
+        if not text.startswith(self.prefix):
+            metrics["rejected_mention"] += 1
+            return None
+        metrics["commands"] += 1
+        return text
+
+    async def _names(self, room, self_contact) -> Tuple[str, ...]:
+        names = self._rooms.get(room.room_id)
+        if names is not None:
+            self._rooms.move_to_end(room.room_id)
+            self.metrics["room_cache_hits"] += 1
+            return names
+
+        self.metrics["room_cache_misses"] += 1
+        self.metrics["puppet_calls"] += 2
+        await room.ready()
+        alias = await room.alias(self_contact)
+        # Alias first: WeChat shows it instead of the nickname in that room
+        names = tuple(dict.fromkeys(
+            name for name in (alias, self_contact.name, self.bot_name)
+            if name
+        ))
+        self._rooms[room.room_id] = names
+        if len(self._rooms) > self.max_rooms:
+            self._rooms.popitem(last=False)
+        return names
+
+    def command_text(self, raw: str, names: Tuple[str, ...]) -> Optional[str]:
+        """Remove the bot's @mention from raw text; None unless a command remains."""
+        for name in names:
+            mention = f"@{name}"
+            if mention in raw:
+                text = LEADING_MENTIONS.sub("", raw.replace(mention, "").strip())
+                return text if text.startswith(self.prefix) else None
+        return None
+
+    def invalidate(self, room_id: str):
+        """Forget a room's readiness and names (join, leave and topic events)."""
+        self._rooms.pop(room_id, None)
+
+    @property
+    def calls_avoided(self) -> int:
+        return self.metrics["messages"] * BASELINE_CALLS - self.metrics["puppet_calls"]
+
+    @property
+    def cached_rooms(self) -> int:
+        return len(self._rooms)
@@ -1,27 +1,58 @@
 """Entry point — CoC 7.0 Dice Bot for WeChat using Wechaty."""
 
+from utils import startup  # first, so its clock covers the imports below
+
 import asyncio
 import os
 import sys
 
 from wechaty import Wechaty, Message, WechatyOptions
-from handlers.message_handler import handle_command
+from handlers.flood import FloodGuard
+from handlers.message_handler import close_store, get_store, message_cost
+from handlers.outbox import Outbox
+from handlers.pipeline import RoomPipeline
+from handlers.prefilter import MessageFilter
+from utils import metrics
+from utils.formatter import format_reply
 from config import (
     WECHATY_PUPPET_SERVICE_TOKEN,
     WECHATY_PUPPET,
     WECHATY_PUPPET_SERVICE_ENDPOINT,
     BOT_NAME,
+    METRICS_HOST,
+    METRICS_PORT,
 )
 
+startup.mark("imports")
+
 
 class CoCDiceBot(Wechaty):
 
+    def __init__(self, options: WechatyOptions = None):
+        super().__init__(options)
+        self.pipeline = RoomPipeline()
+        self.outbox = Outbox()
+        self.prefilter = MessageFilter()
+        self.flood = FloodGuard()
+
     async def on_login(self, contact):
         print(f"[登录成功] {contact}")
+        if startup.mark("login"):
+            print(startup.report())
 
     async def on_logout(self, contact):
         print(f"[已登出] {contact}")
 
+    # Membership or topic changes may change the bot's alias in the room
+    async def on_room_join(self, room, invitees, inviter, date):
+        self.prefilter.invalidate(room.room_id)
+
+    async def on_room_leave(self, room, leavers, remover, date):
+        self.prefilter.invalidate(room.room_id)
+
+    async def on_room_topic(self, room, new_topic, old_topic, changer, date):
+        self.prefilter.invalidate(room.room_id)
+
     async def on_message(self, msg: Message):
         # Ignore self messages
         if msg.is_self():
@@ -32,31 +63,39 @@ class CoCDiceBot(Wechaty):
         if room is None:
             return
 
-        await room.ready()
-        # Check if bot is mentioned
-        mention_self = await msg.mention_self()
-        if not mention_self:
-            return
-
-        # Extract text without @mention
-        text = await msg.mention_text()
-        text = text.strip()
-        if not text:
+        # Checks the raw text locally before any puppet round-trip
+        text = await self.prefilter.command(msg, room, self.user_self())
+        if text is None:
             return
 
         talker = msg.talker()
         contact_id = talker.contact_id
         player_name = talker.name
 
-        response = handle_command(
+        say = room.say
+        if "first_reply" not in startup.marks:
+            say = startup.first_reply(say)
+
+        # Over the limit: drop it before it takes a queue slot, warning rarely
+        wait = self.flood.admit(contact_id, room.room_id, message_cost(text))
+        if wait:
+            warning = self.flood.warning(contact_id, wait)
+            if warning is not None:
+                self.outbox.post(room.room_id, say, format_reply(player_name, warning))
+            return
+
+        # Runs in the room's worker, after earlier commands from that room
+        self.pipeline.submit(
+            room.room_id, self.outbox.replier(room.room_id, say),
             text=text,
             contact_id=contact_id,
-            room_id=room.room_id,
             player_name=player_name,
         )
 
-        if response:
-            await room.say(response)
+
+def _open_store():
+    get_store()
+    startup.mark("store")
 
 
 async def main():
@@ -69,7 +108,20 @@ async def main():
         os.environ.setdefault("WECHATY_PUPPET_SERVICE_ENDPOINT", WECHATY_PUPPET_SERVICE_ENDPOINT)
 
     bot = CoCDiceBot(WechatyOptions(name=BOT_NAME))
-    await bot.start()
+    # Index the player file while the puppet logs in, not on the first command
+    asyncio.get_running_loop().run_in_executor(None, _open_store)
+    if metrics.ENABLED:
+        metrics.register_runtime(get_store, bot.pipeline, bot.outbox, bot.prefilter,
+                                 bot.flood)
+        metrics.start_server()
+        print(f"[监控] http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    try:
+        await bot.start()
+    finally:
+        await bot.pipeline.close()
+        await bot.outbox.close()
+        # Write out anything the background flusher has not saved yet
+        close_store()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+"""Bounded roll history with streaming d100 statistics."""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from array import array
+from typing import Iterable, List, NamedTuple, Optional
+
+from config import HISTORY_SIZE
+
+NO_CHECK = -1  # level code of a plain d100 roll
+LEVELS = 6     # success level codes 0-5, as in dice.skill_check.LevelCode
+BINS = 10      # deciles for the chi-square fairness test
+MIN_FAIR_SAMPLE = 5 * BINS  # at least 5 expected rolls per bin
+
+
+_clock_lock = threading.Lock()
+_last_stamp = 0
+
+
+def _stamp() -> int:
+    """Unix milliseconds, strictly increasing within the process.
+
+    Room logs merge players' histories by this stamp, so rolls made in
+    the same millisecond still keep their order.
+    """
+    global _last_stamp
+    with _clock_lock:
+        _last_stamp = max(int(time.time() * 1000), _last_stamp + 1)
+        return _last_stamp
+
+
+class Entry(NamedTuple):
+    time: int     # unix milliseconds
+    roll: int     # d100 result, 1-100
+    target: int   # skill or SAN value, 0 for a plain roll
+    code: int     # success level code, NO_CHECK for a plain roll
+
+
+class RollStats(NamedTuple):
+    """Lifetime aggregates; adding two RollStats combines them."""
+    count: int
+    total: int
+    levels: tuple  # checks per success level code
+    bins: tuple    # unmodified d100 rolls per decile (1-10, 11-20, ...)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def fair_count(self) -> int:
+        return sum(self.bins)
+
+    @property
+    def chi_square(self) -> float:
+        n = self.fair_count
+        return BINS * sum(b * b for b in self.bins) / n - n if n else 0.0
+
+    @property
+    def p_value(self) -> Optional[float]:
+        """Chance of a chi-square at least this large from fair dice."""
+        if self.fair_count < MIN_FAIR_SAMPLE:
+            return None
+        return chi_square_sf(self.chi_square, BINS - 1)
+
+    def __add__(self, other: "RollStats") -> "RollStats":
+        return RollStats(self.count + other.count, self.total + other.total,
+                         tuple(map(sum, zip(self.levels, other.levels))),
+                         tuple(map(sum, zip(self.bins, other.bins))))
+
+
+EMPTY_STATS = RollStats(0, 0, (0,) * LEVELS, (0,) * BINS)
+
+
+def chi_square_sf(x: float, dof: int) -> float:
+    """Survival function of the chi-square distribution."""
+    if dof % 2 == 0:
+        # Q(x; k) = e^(-x/2) * sum_{j < k/2} (x/2)^j / j!
+        term = q = math.exp(-x / 2)
+        for j in range(1, dof // 2):
+            term *= x / (2 * j)
+            q += term
+        return min(max(q, 0.0), 1.0)
+    # Q(x; k) = erfc(sqrt(x/2)) + sqrt(2x/pi) e^(-x/2) * sum x^(j-1) / (2j-1)!!
+    term = math.sqrt(2 * x / math.pi) * math.exp(-x / 2)
+    q = math.erfc(math.sqrt(x / 2))
+    for j in range(1, (dof - 1) // 2 + 1):
+        q += term
+        term *= x / (2 * j + 1)
+    return min(max(q, 0.0), 1.0)
+
+
+class RollHistory:
+    """The last ``size`` rolls in fixed arrays, plus O(1) running stats.
+
+    Memory stays fixed however long a campaign runs: old entries are
+    overwritten in place and the statistics are plain counters. The
+    chi-square statistic is kept up to date through the running sum of
+    squared bin counts.
+    """
+
+    __slots__ = ("size", "filled", "head", "times", "rolls", "targets", "codes",
+                 "count", "total", "levels", "bins", "_squares")
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self.size = size
+        self.filled = 0
+        self.head = 0  # slot the next roll is written to
+        self.times = array("Q", [0]) * size  # unix milliseconds
+        self.rolls = array("B", [0]) * size
+        self.targets = array("H", [0]) * size
+        self.codes = array("b", [0]) * size
+        self.count = 0
+        self.total = 0
+        self.levels = array("Q", [0]) * LEVELS
+        self.bins = array("Q", [0]) * BINS
+        self._squares = 0  # sum of squared bin counts
+
+    def record(self, roll: int, target: int = 0, code: int = NO_CHECK,
+               uniform: bool = True, now: Optional[int] = None):
+        """Add a d100 roll; ``uniform`` is False with bonus or penalty dice."""
+        i = self.head
+        self.times[i] = _stamp() if now is None else now
+        self.rolls[i] = roll
+        self.targets[i] = min(target, 0xFFFF)
+        self.codes[i] = code
+        self.head = (i + 1) % self.size
+        if self.filled < self.size:
+            self.filled += 1
+
+        self.count += 1
+        self.total += roll
+        if code != NO_CHECK:
+            self.levels[code] += 1
+        if uniform:
+            b = (roll - 1) // 10
+            self._squares += 2 * self.bins[b] + 1
+            self.bins[b] += 1
+
+    def recent(self, n: int) -> List[Entry]:
+        """Up to n entries, newest first."""
+        n = min(n, self.filled)
+        return [self._entry((self.head - 1 - k) % self.size) for k in range(n)]
+
+    def _entry(self, i: int) -> Entry:
+        return Entry(self.times[i], self.rolls[i], self.targets[i], self.codes[i])
+
+    @property
+    def chi_square(self) -> float:
+        n = sum(self.bins)
+        return BINS * self._squares / n - n if n else 0.0
+
+    def stats(self) -> RollStats:
+        return RollStats(self.count, self.total, tuple(self.levels), tuple(self.bins))
+
+    def to_dict(self) -> dict:
+        return {
+            "log": [list(e) for e in reversed(self.recent(self.filled))],
+            "count": self.count,
+            "total": self.total,
+            "levels": list(self.levels),
+            "bins": list(self.bins),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, size: int = HISTORY_SIZE) -> "RollHistory":
+        history = cls(size)
+        for t, roll, target, code in data.get("log", ())[-size:]:
+            history.record(roll, target, code, uniform=False, now=t)
+        history.count = data.get("count", history.count)
+        history.total = data.get("total", history.total)
+        history.levels = array("Q", data.get("levels", (0,) * LEVELS))
+        history.bins = array("Q", data.get("bins", (0,) * BINS))
+        history._squares = sum(b * b for b in history.bins)
+        return history
+
+
+def combined_stats(histories: Iterable[Optional[RollHistory]]) -> RollStats:
+    """Statistics over several players' histories, e.g. a whole room."""
+    stats = EMPTY_STATS
+    for history in histories:
+        if history is not None:
+            stats = stats + history.stats()
+    return stats
+
+
+def merged_recent(histories: Iterable[tuple], n: int) -> List[tuple]:
+    """The n newest (name, Entry) pairs across several named histories.
+
+    Exact as long as n is at most the per-player history size.
+    """
+    entries = [(name, e) for name, history in histories if history is not None
+               for e in history.recent(n)]
+    entries.sort(key=lambda pair: pair[1].time, reverse=True)
+    return entries[:n]
+
+
+class HistoryLog(NamedTuple):
+    """Reply of .log: (player name, entry) pairs, newest first."""
+    room: bool
+    lines: List[tuple]
+
+
+class HistoryStats(NamedTuple):
+    """Reply of .stats for a player or a whole room."""
+    room: bool
+    stats: RollStats
+    players: int
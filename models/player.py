@@ -2,11 +2,26 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass, field, asdict
-from typing import Optional
+from dataclasses import dataclass, field
+from sys import intern
+from typing import Optional, Tuple
 
+from models.history import NO_CHECK, RollHistory
 
-@dataclass
+# In-memory player key: (contact_id, room_id), both interned
+Key = Tuple[str, str]
+
+# Persisted fields, in column order
+FIELDS = ("contact_id", "room_id", "name", "luck", "san",
+          "last_roll", "last_skill_name", "last_skill_value", "history")
+
+
+def storage_key(key: Key) -> str:
+    """The "contact_id:room_id" form used in files and databases."""
+    return f"{key[0]}:{key[1]}"
+
+
+@dataclass(slots=True)
 class Player:
     contact_id: str
     room_id: str
@@ -16,14 +31,46 @@ class Player:
     last_roll: Optional[int] = None
     last_skill_name: str = ""
     last_skill_value: int = 0
+    # Created by the first recorded roll, so players who never roll stay small
+    history: Optional[RollHistory] = field(default=None, repr=False, compare=False)
+    key: Key = field(init=False, repr=False, compare=False)
 
-    @property
-    def key(self) -> str:
-        return f"{self.contact_id}:{self.room_id}"
+    def __post_init__(self):
+        # A contact plays in many rooms and a room holds many players, so
+        # interning shares one copy of each id (and of the usual names and
+        # skill names) across the whole roster
+        self.contact_id = intern(self.contact_id)
+        self.room_id = intern(self.room_id)
+        self.name = intern(self.name)
+        self.last_skill_name = intern(self.last_skill_name)
+        self.key = (self.contact_id, self.room_id)
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {
+            "contact_id": self.contact_id,
+            "room_id": self.room_id,
+            "name": self.name,
+            "luck": self.luck,
+            "san": self.san,
+            "last_roll": self.last_roll,
+            "last_skill_name": self.last_skill_name,
+            "last_skill_value": self.last_skill_value,
+            "history": self.history.to_dict() if self.history is not None else None,
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> "Player":
-        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+        get = data.get
+        history = get("history")
+        return cls(data["contact_id"], data["room_id"], get("name", ""),
+                   get("luck", 0), get("san", 0), get("last_roll"),
+                   get("last_skill_name", ""), get("last_skill_value", 0),
+                   RollHistory.from_dict(history) if history else None)
+
+    def record_roll(self, roll: int, target: int = 0, code: int = NO_CHECK,
+                    uniform: bool = True):
+        """Remember a d100 roll in this player's history."""
+        self.last_roll = roll
+        if self.history is None:
+            self.history = RollHistory()
+        self.history.record(roll, target, code, uniform)
@@ -0,0 +1,206 @@
+"""Store interface shared by the player persistence backends."""
+
+from __future__ import annotations
+
+import atexit
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Set
+
+from models.player import Key, Player, storage_key
+from config import STORE_BACKEND, STORE_FLUSH_INTERVAL, STORE_MAX_DIRTY
+
+
+class Store(Protocol):
+    """What the message handler needs from a player store."""
+
+    def load(self) -> None: ...
+
+    def save(self) -> None: ...
+
+    def get_player(self, contact_id: str, room_id: str, name: str = "") -> Player: ...
+
+    def update_player(self, player: Player) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class WriteBehindStore:
+    """Dirty-key tracking, a debounced background flusher and lazy players.
+
+    Subclasses implement ``_collect(keys)``, called under the store lock
+    to snapshot the dirty players, and ``_write(payload)``, called outside
+    it to persist the snapshot and return the number of bytes written.
+
+    Players are held under their (contact_id, room_id) key; backends
+    persist them under ``storage_key(key)``. Backends that load everything
+    up front only index the stored keys at startup (``_index(keys)``) and
+    return a stored player's fields from ``_record(stored_key)``; Player
+    objects are then built one room at a time, on the first access to
+    that room.
+    """
+
+    def __init__(self, flush_interval: float = STORE_FLUSH_INTERVAL,
+                 max_dirty: int = STORE_MAX_DIRTY):
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self._players: Dict[Key, Player] = {}
+        self._unbuilt: Dict[str, List[str]] = {}  # room_id -> stored keys not built yet
+        self._dirty: Set[Key] = set()
+        self._lock = threading.Lock()        # guards players/dirty
+        self._write_lock = threading.Lock()  # serializes flushes
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = None
+        self.metrics = {
+            "flushes": 0,
+            "last_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+            "last_bytes": 0,
+            "bytes_written": 0,
+            "load_seconds": 0.0,
+            "indexed_players": 0,
+            "built_players": 0,
+        }
+        atexit.register(self.close)
+
+    def _collect(self, keys: Set[Key]) -> Any:
+        raise NotImplementedError
+
+    def _write(self, payload: Any) -> int:
+        raise NotImplementedError
+
+    def _record(self, stored_key: str) -> Optional[dict]:
+        """Stored fields of a player that has no Player object yet."""
+        return None
+
+    def _index(self, keys: Iterable[str]):
+        """Group stored keys by room so rooms can be built on demand."""
+        rooms: Dict[str, List[str]] = {}
+        for key in keys:
+            rooms.setdefault(key.rpartition(":")[2], []).append(key)
+        self._unbuilt = rooms
+        self.metrics["indexed_players"] = sum(len(keys) for keys in rooms.values())
+
+    def _build_room(self, room_id: str):
+        # Called under self._lock
+        keys = self._unbuilt.pop(room_id, None)
+        if not keys:
+            return
+        for stored_key in keys:
+            contact_id = stored_key.rpartition(":")[0]
+            if (contact_id, room_id) not in self._players:
+                data = self._record(stored_key)
+                if data is not None:
+                    player = Player.from_dict(data)
+                    self._players[player.key] = player
+        self.metrics["built_players"] += len(keys)
+
+    def get_player(self, contact_id: str, room_id: str, name: str = "") -> Player:
+        key = (contact_id, room_id)
+        with self._lock:
+            player = self._players.get(key)
+            if player is None:
+                self._build_room(room_id)
+                player = self._players.get(key)
+            if player is None:
+                data = self._record(storage_key(key))
+                player = (Player.from_dict(data) if data is not None
+                          else Player(contact_id=contact_id, room_id=room_id, name=name))
+                self._players[player.key] = player
+        if name and player.name != name:
+            player.name = name
+        return player
+
+    def players_in_room(self, room_id: str) -> List[Player]:
+        with self._lock:
+            self._build_room(room_id)
+            return [p for p in self._players.values() if p.room_id == room_id]
+
+    def save(self):
+        """Write all pending changes now."""
+        self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                start = time.perf_counter()
+                dirty, self._dirty = self._dirty, set()
+                payload = self._collect(dirty)
+            try:
+                written = self._write(payload)
+            except Exception:
+                # Keep the players dirty so the next flush retries them
+                with self._lock:
+                    self._dirty.update(dirty)
+                raise
+
+            elapsed = time.perf_counter() - start
+            self.metrics["flushes"] += 1
+            self.metrics["last_flush_seconds"] = elapsed
+            self.metrics["total_flush_seconds"] += elapsed
+            self.metrics["last_bytes"] = written
+            self.metrics["bytes_written"] += written
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[存储] 写入失败: {e}")
+
+    def _ensure_flusher(self):
+        if self._flusher is None and not self._closed:
+            self._flusher = threading.Thread(
+                target=self._flush_loop,
+                name=f"{type(self).__name__}-flush", daemon=True,
+            )
+            self._flusher.start()
+
+    def close(self):
+        """Stop the background flusher and write any pending changes."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def _mark_dirty(self, keys: Iterable[Key]):
+        with self._lock:
+            self._dirty.update(keys)
+            dirty = len(self._dirty)
+        if self._closed:
+            self.flush()
+            return
+        self._ensure_flusher()
+        if dirty >= self.max_dirty:
+            self._wakeup.set()
+
+    def update_player(self, player: Player):
+        with self._lock:
+            self._players[player.key] = player
+        self._mark_dirty((player.key,))
+
+
+def open_store(backend: str = STORE_BACKEND, **kwargs) -> Store:
+    """Create the configured store backend ("json", "sqlite" or "journal")."""
+    if backend == "journal":
+        from storage.journal_store import JournalStore
+        return JournalStore(**kwargs)
+    if backend == "sqlite":
+        from storage.sqlite_store import SqliteStore
+        return SqliteStore(**kwargs)
+    if backend == "json":
+        from storage.json_store import JsonStore
+        return JsonStore(**kwargs)
+    raise ValueError(f"未知的存储后端: {backend}")
@@ -0,0 +1,150 @@
+"""Log-structured persistence: a snapshot plus an append-only journal."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from models.player import Key, storage_key
+from config import (
+    JOURNAL_FILE, JOURNAL_MAX_BYTES, SNAPSHOT_FILE,
+    STORE_FLUSH_INTERVAL, STORE_MAX_DIRTY,
+)
+from storage.base import WriteBehindStore
+
+
+class JournalStore(WriteBehindStore):
+    """Player store that appends one record per changed player.
+
+    Each flush appends ``{"k": key, <changed fields>}`` lines to the
+    journal and fsyncs it, so its cost depends only on the players that
+    changed. Startup loads the snapshot and replays the journal; a torn
+    final record from a crash is dropped. Once the journal grows past
+    ``max_journal_bytes`` the flusher folds it into a new snapshot.
+    """
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_FILE,
+                 journal_path: str = JOURNAL_FILE,
+                 max_journal_bytes: int = JOURNAL_MAX_BYTES,
+                 flush_interval: float = STORE_FLUSH_INTERVAL,
+                 max_dirty: int = STORE_MAX_DIRTY):
+        super().__init__(flush_interval=flush_interval, max_dirty=max_dirty)
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.max_journal_bytes = max_journal_bytes
+        # Last persisted field values, used to diff and to compact
+        self._persisted: Dict[str, dict] = {}
+        self._journal = None
+        self.metrics["compactions"] = 0
+        self.metrics["torn_records"] = 0
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        self.load()
+
+    def load(self):
+        start = time.perf_counter()
+        state: Dict[str, dict] = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+
+        good_offset = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("torn record")
+                        record = json.loads(line)
+                        if not (isinstance(record, dict)
+                                and isinstance(record.get("k"), str)):
+                            raise ValueError("malformed record")
+                    except ValueError:
+                        # Torn or malformed record: everything from here on is discarded
+                        self.metrics["torn_records"] += 1
+                        break
+                    key = record.pop("k")
+                    state.setdefault(key, {}).update(record)
+                    good_offset += len(line)
+            if good_offset != os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good_offset)
+
+        self._persisted = state
+        self._players = {}
+        self._index(state)
+        self._dirty = set()
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "ab")
+        self.metrics["load_seconds"] = time.perf_counter() - start
+
+    def _record(self, stored_key: str) -> Optional[dict]:
+        return self._persisted.get(stored_key)
+
+    def _collect(self, keys: Set[Key]) -> List[Tuple[str, dict, bytes]]:
+        records = []
+        for key in keys:
+            player = self._players.get(key)
+            if player is None:
+                continue
+            data = player.to_dict()
+            stored_key = storage_key(key)
+            old = self._persisted.get(stored_key)
+            if old is None:
+                changed = data
+            else:
+                changed = {f: v for f, v in data.items() if old.get(f) != v}
+            if not changed:
+                continue
+            record = {"k": stored_key, **changed}
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+            records.append((stored_key, data, line.encode("utf-8") + b"\n"))
+        return records
+
+    def _write(self, records: List[Tuple[str, dict, bytes]]) -> int:
+        data = b"".join(line for _, _, line in records)
+        if data:
+            self._journal.write(data)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        # Only now are these values durable enough to diff against
+        with self._lock:
+            for key, fields, _ in records:
+                self._persisted[key] = fields
+        if self._journal.tell() > self.max_journal_bytes:
+            self._compact()
+        return len(data)
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and truncate the journal.
+
+        Records hold absolute field values, so replaying a journal that a
+        crash left behind over the new snapshot is harmless.
+        """
+        self.flush()
+        with self._write_lock:
+            self._compact()
+
+    def _compact(self):
+        with self._lock:
+            data = json.dumps(self._persisted, ensure_ascii=False).encode("utf-8")
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        self._journal.seek(0)
+        self._journal.truncate(0)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.metrics["compactions"] += 1
+
+    def close(self):
+        super().close()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
@@ -4,16 +4,30 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Dict
+import time
+from typing import Dict, Optional, Set
 
-from models.player import Player
-from config import PLAYER_DATA_FILE, DATA_DIR
+from models.player import Key, storage_key
+from config import PLAYER_DATA_FILE, DATA_DIR, STORE_FLUSH_INTERVAL, STORE_MAX_DIRTY
+from storage.base import WriteBehindStore
 
 
-class JsonStore:
-    def __init__(self, filepath: str = PLAYER_DATA_FILE):
+class JsonStore(WriteBehindStore):
+    """Player store backed by a single JSON file.
+
+    update_player() only marks the player dirty; a background thread
+    writes the file at most every ``flush_interval`` seconds, or sooner
+    once ``max_dirty`` players are waiting. Each player's JSON fragment is
+    cached, so a flush re-encodes only the dirty players. Startup only
+    splits the file into fragments; players are parsed per room on demand.
+    """
+
+    def __init__(self, filepath: str = PLAYER_DATA_FILE,
+                 flush_interval: float = STORE_FLUSH_INTERVAL,
+                 max_dirty: int = STORE_MAX_DIRTY):
+        super().__init__(flush_interval=flush_interval, max_dirty=max_dirty)
         self.filepath = filepath
-        self._players: Dict[str, Player] = {}
+        self._encoded: Dict[str, str] = {}
         self._ensure_dir()
         self.load()
 
@@ -21,33 +35,64 @@ class JsonStore:
         os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
 
     def load(self):
+        start = time.perf_counter()
+        self._players = {}
+        self._encoded = {}
         if os.path.exists(self.filepath):
             try:
-                with open(self.filepath, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                for key, pdata in data.items():
-                    self._players[key] = Player.from_dict(pdata)
+                self._encoded = self._read_fragments()
             except (json.JSONDecodeError, KeyError):
-                self._players = {}
-
-    def save(self):
-        with open(self.filepath, "w", encoding="utf-8") as f:
-            json.dump(
-                {k: p.to_dict() for k, p in self._players.items()},
-                f, ensure_ascii=False, indent=2,
-            )
-
-    def get_player(self, contact_id: str, room_id: str, name: str = "") -> Player:
-        key = f"{contact_id}:{room_id}"
-        if key not in self._players:
-            self._players[key] = Player(
-                contact_id=contact_id, room_id=room_id, name=name,
-            )
-        player = self._players[key]
-        if name and player.name != name:
-            player.name = name
-        return player
-
-    def update_player(self, player: Player):
-        self._players[player.key] = player
-        self.save()
+                self._encoded = {}
+        self._index(self._encoded)
+        self._dirty = set()
+        self.metrics["load_seconds"] = time.perf_counter() - start
+
+    def _read_fragments(self) -> Dict[str, str]:
+        with open(self.filepath, "r", encoding="utf-8") as f:
+            text = f.read()
+        # Files this store wrote hold one player per line, so they can be
+        # indexed without parsing any player; anything else is parsed once
+        lines = text.splitlines()
+        if len(lines) > 2 and lines[0] == "{" and lines[-1] == "}":
+            fragments = {}
+            for line in lines[1:-1]:
+                # '  "key": {...},'
+                key, sep, fragment = line.partition('": {')
+                if not sep or not key.startswith('  "') or key.endswith("\\"):
+                    break
+                fragment = "{" + fragment.rstrip(",")
+                if not fragment.endswith("}"):
+                    break
+                key = key[3:]
+                fragments[json.loads(f'"{key}"') if "\\" in key else key] = fragment
+            else:
+                return fragments
+        return {key: json.dumps(pdata, ensure_ascii=False)
+                for key, pdata in json.loads(text).items()}
+
+    def _record(self, stored_key: str) -> Optional[dict]:
+        fragment = self._encoded.get(stored_key)
+        return json.loads(fragment) if fragment is not None else None
+
+    def _collect(self, keys: Set[Key]) -> bytes:
+        for key in keys:
+            player = self._players.get(key)
+            if player is None:
+                self._encoded.pop(storage_key(key), None)
+            else:
+                self._encoded[storage_key(key)] = json.dumps(player.to_dict(), ensure_ascii=False)
+        body = ",\n".join(
+            f"  {json.dumps(key, ensure_ascii=False)}: {fragment}"
+            for key, fragment in self._encoded.items()
+        )
+        return ("{\n" + body + "\n}\n").encode("utf-8")
+
+    def _write(self, data: bytes) -> int:
+        # Write to a temp file, fsync, then atomically replace the old file
+        tmp_path = self.filepath + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.filepath)
+        return len(data)
@@ -0,0 +1,38 @@
+"""One-shot migration of data/players.json into the SQLite store.
+
+Usage: python -m storage.migrate [players.json] [players.db]
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+
+from models.player import Player
+from config import PLAYER_DATA_FILE, SQLITE_DATA_FILE
+from storage.sqlite_store import SqliteStore
+
+
+def migrate_json_to_sqlite(json_path: str = PLAYER_DATA_FILE,
+                           db_path: str = SQLITE_DATA_FILE) -> int:
+    """Copy every player from the JSON file into the database.
+
+    Existing rows with the same key are replaced. Returns the number of
+    players migrated.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    players = [Player.from_dict(pdata) for pdata in data.values()]
+
+    store = SqliteStore(db_path)
+    try:
+        store.import_players(players)
+    finally:
+        store.close()
+    return len(players)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    count = migrate_json_to_sqlite(*args[:2])
+    print(f"已迁移 {count} 名玩家")
@@ -0,0 +1,124 @@
+"""SQLite (WAL mode) persistence for player data."""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Set
+
+from models.player import FIELDS, Key, Player, storage_key
+from config import SQLITE_DATA_FILE, STORE_FLUSH_INTERVAL, STORE_MAX_DIRTY
+from storage.base import WriteBehindStore
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS players (
+    key TEXT PRIMARY KEY,
+    {", ".join(FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS players_room_id ON players (room_id);
+"""
+_SELECT_ONE = f"SELECT {', '.join(FIELDS)} FROM players WHERE key = ?"
+_SELECT_ROOM = f"SELECT {', '.join(FIELDS)} FROM players WHERE room_id = ?"
+_UPSERT = (
+    f"INSERT OR REPLACE INTO players (key, {', '.join(FIELDS)}) "
+    f"VALUES (?, {', '.join('?' for _ in FIELDS)})"
+)
+
+
+def _row(player: Player) -> tuple:
+    data = player.to_dict()
+    if data["history"] is not None:
+        data["history"] = json.dumps(data["history"], separators=(",", ":"))
+    return (storage_key(player.key),) + tuple(data[f] for f in FIELDS)
+
+
+def _player(row: tuple) -> Player:
+    data = dict(zip(FIELDS, row))
+    if data["history"] is not None:
+        data["history"] = json.loads(data["history"])
+    return Player.from_dict(data)
+
+
+class SqliteStore(WriteBehindStore):
+    """Player store with one row per player key in a WAL-mode database.
+
+    Players are read on first access and cached; dirty players are
+    written back in one transaction per flush.
+    """
+
+    def __init__(self, filepath: str = SQLITE_DATA_FILE,
+                 flush_interval: float = STORE_FLUSH_INTERVAL,
+                 max_dirty: int = STORE_MAX_DIRTY):
+        super().__init__(flush_interval=flush_interval, max_dirty=max_dirty)
+        self.filepath = filepath
+        self._db_lock = threading.Lock()
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.load()
+
+    def load(self):
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            # Databases created before a field existed get its column added
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(players)")}
+            for field in FIELDS:
+                if field not in columns:
+                    self._conn.execute(f"ALTER TABLE players ADD COLUMN {field}")
+        self._players = {}
+
+    def _collect(self, keys: Set[Key]) -> list:
+        rows = []
+        for key in keys:
+            player = self._players.get(key)
+            if player is not None:
+                rows.append(_row(player))
+        return rows
+
+    def _write(self, rows: list) -> int:
+        with self._db_lock, self._conn:
+            self._conn.executemany(_UPSERT, rows)
+        return 0  # SQLite does not report bytes written per transaction
+
+    def close(self):
+        super().close()
+        with self._db_lock:
+            self._conn.close()
+
+    def get_player(self, contact_id: str, room_id: str, name: str = "") -> Player:
+        key = (contact_id, room_id)
+        with self._lock:
+            player = self._players.get(key)
+        if player is None:
+            with self._db_lock:
+                row = self._conn.execute(_SELECT_ONE, (storage_key(key),)).fetchone()
+            if row is not None:
+                player = _player(row)
+            else:
+                player = Player(contact_id=contact_id, room_id=room_id, name=name)
+            with self._lock:
+                player = self._players.setdefault(player.key, player)
+        if name and player.name != name:
+            player.name = name
+        return player
+
+    def players_in_room(self, room_id: str) -> List[Player]:
+        """All players of a room, using the room_id index."""
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(_SELECT_ROOM, (room_id,)).fetchall()
+        players = []
+        with self._lock:
+            for row in rows:
+                player = _player(row)
+                players.append(self._players.setdefault(player.key, player))
+        return players
+
+    def import_players(self, players: List[Player]):
+        """Bulk insert players in a single transaction."""
+        rows = [_row(p) for p in players]
+        with self._db_lock, self._conn:
+            self._conn.executemany(_UPSERT, rows)
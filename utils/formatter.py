@@ -1,4 +1,285 @@
-"""Format dice results for WeChat display."""
+"""Format dice results for WeChat display.
+
+Dice functions return structured results; a Renderer turns them into
+reply text only once a reply is sent. Another language or format is a
+different set of templates: ``formatter.renderer = Renderer(templates)``.
+"""
+
+import time
+from typing import Callable, Dict, List, Sequence
+
+from dice.combat import DamageResult
+from dice.luck import LuckResult
+from dice.opposed import GroupOpposedResult, OpposedResult
+from dice.probability import (
+    CheckChances, DistributionReport, OpposedChances, SanChances, percentile, summarize,
+)
+from dice.roller import D100Result, DiceResult, RepeatedRoll
+from dice.san_check import SanResult
+from dice.skill_check import GroupCheckResult, LevelCode, SkillResult, SuccessLevel
+from models.history import BINS, MIN_FAIR_SAMPLE, NO_CHECK, HistoryLog, HistoryStats
+
+TEMPLATES = {
+    "roll": "🎲 {details}",
+    "repeat": "🎲 {notation} ×{times}",
+    "repeat_line": "#{index} {details}",
+    "d100": "🎲 d100 = {total}",
+    "d100_detail": "十位: {tens}{extra} 选择: {chosen} 个位: {units} = {total}",
+    "bonus_dice": " (奖励骰x{count})",
+    "penalty_dice": " (惩罚骰x{count})",
+    "skill": "🎲 {name} 检定 (目标值: {value})\nd100 = {roll}{dice}\n"
+             "困难: {hard} / 极难: {extreme}\n结果: 【{level}】",
+    "san": "🧠 SAN 检定 (当前SAN: {san})\nd100 = {roll} / 目标值: {san}\n"
+           "结果: 【{level}】\n理智损失: {expr} = {loss}\n剩余SAN: {new_san}",
+    "san_temporary": "⚠️ 单次理智损失≥5点，可能陷入临时性疯狂！",
+    "san_permanent": "☠️ 理智值降至0，调查员永久疯狂！",
+    "opposed": "⚔️ 对抗检定\n{name1} ({skill1}): d100 = {roll1} 【{level1}】\n"
+               "{name2} ({skill2}): d100 = {roll2} 【{level2}】\n{outcome}",
+    "opposed_win": "🏆 {winner} 胜出！",
+    "opposed_fumble": "双方大失败，均未成功！",
+    "opposed_none": "双方均未成功",
+    "group": "🎲 {skill} 群体检定 ({count}人)",
+    "group_row": "{rank}. {name} ({value}) d100 = {roll} 【{level}】",
+    "group_summary": "成功 {passed}/{count}",
+    "group_opposed": "⚔️ {skill}多方对抗 ({count}人)",
+    "group_opposed_none": "无人成功",
+    "luck": "🍀 幸运消耗\n{name} 检定\n原始骰值: {original} → 新骰值: {new}\n"
+            "消耗幸运: {spent}\n剩余幸运: {luck}\n新结果: 【{level}】",
+    "damage": "💥 伤害骰: {details}",
+    "prob_dist": "📊 {notation} 概率分布\n范围: {min} ~ {max}\n"
+                 "期望: {mean:.2f} / 标准差: {stdev:.2f}",
+    "prob_value": "  {value}: {p:.2%} {bar}",
+    "prob_quantiles": "分位: {quantiles}",
+    "prob_quantile": "{q}%≤{value}",
+    "prob_check": "📊 检定概率 (目标值: {value}){dice}",
+    "prob_check_dice": " 奖励骰{bonus}/惩罚骰{penalty}",
+    "prob_level": "  {level}: {p:.2%}",
+    "prob_san": "📊 SAN 检定 (当前SAN: {san})\n成功率: {success:.0%}\n期望理智损失: {expected:.2f}",
+    "prob_opposed": "📊 对抗检定 ({skill1} vs {skill2})\n  {skill1} 胜出: {win1:.2%}\n"
+                    "  {skill2} 胜出: {win2:.2%}\n  双方均未成功: {neither:.2%}",
+    "log": "📜 {scope}最近 {count} 次掷骰",
+    "log_empty": "📜 {scope}暂无掷骰记录",
+    "log_roll": "{time} {name}d100 = {roll}",
+    "log_check": "{time} {name}{target} → {roll} 【{level}】",
+    "log_name": "{name}: ",
+    "scope_player": "你的",
+    "scope_room": "本群",
+    "stats": "📈 {scope}掷骰统计{players}\n共 {count} 次 d100，平均 {mean:.1f} (期望 50.5)",
+    "stats_players": " ({count} 名玩家)",
+    "stats_levels": "检定结果: {levels}",
+    "stats_level": "{name}×{count}",
+    "stats_fair": "公平性: χ² = {chi2:.2f} (自由度 {dof})，p = {p:.3f}，{verdict}",
+    "stats_unsure": "公平性: 样本不足 (无奖惩骰的 d100 满 {need} 次才检验，当前 {count} 次)",
+    "fair_ok": "未见异常",
+    "fair_watch": "略有偏离，可继续观察",
+    "fair_bad": "明显偏离均匀分布",
+    "time": "%m-%d %H:%M",
+}
+
+# .prob lists every total of a distribution up to this many, else quantiles
+PROB_LISTED_VALUES = 20
+PROB_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class Renderer:
+    """Reply text for dice results, from a dict of str.format templates.
+
+    Each template's bound ``format`` is looked up once here, not per reply.
+    """
+
+    def __init__(self, templates: Dict[str, str] = TEMPLATES,
+                 level_names: Sequence[str] = SuccessLevel.NAMES):
+        self.t = {name: text.format for name, text in templates.items()}
+        self.level_names = level_names
+        self._by_type: Dict[type, Callable] = {
+            str: str,
+            DiceResult: self.roll,
+            RepeatedRoll: self.repeat,
+            D100Result: self.d100,
+            SkillResult: self.skill,
+            SanResult: self.san,
+            OpposedResult: self.opposed,
+            GroupCheckResult: self.group,
+            GroupOpposedResult: self.group_opposed,
+            LuckResult: self.luck,
+            DamageResult: self.damage,
+            DistributionReport: self.distribution,
+            CheckChances: self.check_chances,
+            SanChances: self.san_chances,
+            OpposedChances: self.opposed_chances,
+            HistoryLog: self.log,
+            HistoryStats: self.stats,
+        }
+        self.time_format = templates["time"]
+
+    def render(self, result) -> str:
+        return self._by_type[type(result)](result)
+
+    def roll(self, r: DiceResult) -> str:
+        return self.t["roll"](details=r.details)
+
+    def repeat(self, r: RepeatedRoll) -> str:
+        lines = [self.t["repeat"](notation=r.notation, times=len(r.results))]
+        lines += [self.t["repeat_line"](index=i, details=result.details)
+                  for i, result in enumerate(r.results, 1)]
+        return "\n".join(lines)
+
+    def d100(self, r: D100Result) -> str:
+        return self.t["d100"](total=r.total)
+
+    def d100_detail(self, r: D100Result) -> str:
+        extra = ""
+        if r.net_bonus:
+            kind = "bonus_dice" if r.net_bonus > 0 else "penalty_dice"
+            extra = self.t[kind](count=abs(r.net_bonus))
+        return self.t["d100_detail"](
+            tens=[t * 10 for t in r.tens_options], extra=extra,
+            chosen=r.chosen_tens * 10, units=r.units, total=r.total,
+        )
+
+    def skill(self, r: SkillResult) -> str:
+        return self.t["skill"](
+            name=r.skill_name, value=r.skill_value, roll=r.roll,
+            dice="\n" + self.d100_detail(r.d100) if r.d100.net_bonus else "",
+            hard=r.skill_value // 2, extreme=r.skill_value // 5,
+            level=self.level_names[r.level_code],
+        )
+
+    def san(self, r: SanResult) -> str:
+        text = self.t["san"](
+            san=r.san_value, roll=r.roll,
+            level=self.level_names[LevelCode.REGULAR if r.passed else LevelCode.FAILURE],
+            expr=r.loss_expr, loss=r.san_loss, new_san=r.new_san,
+        )
+        if r.temporary_insanity:
+            text += "\n" + self.t["san_temporary"]()
+        if r.permanent_insanity:
+            text += "\n" + self.t["san_permanent"]()
+        return text
+
+    def opposed(self, r: OpposedResult) -> str:
+        if r.winner:
+            outcome = self.t["opposed_win"](winner=r.name1 if r.winner == 1 else r.name2)
+        elif r.level_code1 == r.level_code2 == LevelCode.FUMBLE:
+            outcome = self.t["opposed_fumble"]()
+        else:
+            outcome = self.t["opposed_none"]()
+        return self.t["opposed"](
+            name1=r.name1, skill1=r.skill1, roll1=r.roll1,
+            level1=self.level_names[r.level_code1],
+            name2=r.name2, skill2=r.skill2, roll2=r.roll2,
+            level2=self.level_names[r.level_code2], outcome=outcome,
+        )
+
+    def _group_rows(self, entries) -> List[str]:
+        row, names = self.t["group_row"], self.level_names
+        return [row(rank=i, name=e.name, value=e.skill_value, roll=e.roll,
+                    level=names[e.level_code])
+                for i, e in enumerate(entries, 1)]
+
+    def group(self, r: GroupCheckResult) -> str:
+        lines = [self.t["group"](skill=r.skill_name, count=len(r.entries))]
+        lines += self._group_rows(r.entries)
+        lines.append(self.t["group_summary"](passed=r.passed, count=len(r.entries)))
+        return "\n".join(lines)
+
+    def group_opposed(self, r: GroupOpposedResult) -> str:
+        lines = [self.t["group_opposed"](skill=r.label, count=len(r.entries))]
+        lines += self._group_rows(r.entries)
+        if r.winner is not None:
+            lines.append(self.t["opposed_win"](winner=r.winner.name))
+        else:
+            lines.append(self.t["group_opposed_none"]())
+        return "\n".join(lines)
+
+    def luck(self, r: LuckResult) -> str:
+        return self.t["luck"](
+            name=r.skill_name, original=r.original_roll, new=r.new_roll,
+            spent=r.spent, luck=r.new_luck, level=self.level_names[r.level_code],
+        )
+
+    def damage(self, r: DamageResult) -> str:
+        return self.t["damage"](details=r.dice.details)
+
+    def distribution(self, r: DistributionReport) -> str:
+        dist = r.dist
+        stats = summarize(dist)
+        lines = [self.t["prob_dist"](notation=r.notation.strip(), **stats)]
+        if len(dist) <= PROB_LISTED_VALUES:
+            peak = max(dist.values())
+            lines += [self.t["prob_value"](value=v, p=dist[v],
+                                           bar="█" * max(1, round(dist[v] / peak * 10)))
+                      for v in sorted(dist)]
+        else:
+            quantiles = [self.t["prob_quantile"](q=int(q * 100), value=percentile(dist, q))
+                         for q in PROB_QUANTILES]
+            lines.append(self.t["prob_quantiles"](quantiles=" / ".join(quantiles)))
+        return "\n".join(lines)
+
+    def check_chances(self, r: CheckChances) -> str:
+        dice = ""
+        if r.bonus or r.penalty:
+            dice = self.t["prob_check_dice"](bonus=r.bonus, penalty=r.penalty)
+        lines = [self.t["prob_check"](value=r.skill_value, dice=dice)]
+        lines += [self.t["prob_level"](level=self.level_names[code], p=p)
+                  for code, p in reversed(list(enumerate(r.chances)))]
+        return "\n".join(lines)
+
+    def san_chances(self, r: SanChances) -> str:
+        return self.t["prob_san"](san=r.san_value, success=r.success,
+                                  expected=r.expected_loss)
+
+    def opposed_chances(self, r: OpposedChances) -> str:
+        return self.t["prob_opposed"](skill1=r.skill1, skill2=r.skill2,
+                                      win1=r.win1, win2=r.win2, neither=r.neither)
+
+    def log(self, r: HistoryLog) -> str:
+        scope = self.t["scope_room" if r.room else "scope_player"]()
+        if not r.lines:
+            return self.t["log_empty"](scope=scope)
+        lines = [self.t["log"](scope=scope, count=len(r.lines))]
+        for name, e in r.lines:
+            fields = {
+                "time": time.strftime(self.time_format, time.localtime(e.time / 1000)),
+                "name": self.t["log_name"](name=name) if r.room else "",
+                "roll": e.roll,
+            }
+            if e.code == NO_CHECK:
+                lines.append(self.t["log_roll"](**fields))
+            else:
+                lines.append(self.t["log_check"](
+                    target=e.target, level=self.level_names[e.code], **fields))
+        return "\n".join(lines)
+
+    def stats(self, r: HistoryStats) -> str:
+        s = r.stats
+        scope = self.t["scope_room" if r.room else "scope_player"]()
+        if not s.count:
+            return self.t["log_empty"](scope=scope)
+        lines = [self.t["stats"](
+            scope=scope, count=s.count, mean=s.mean,
+            players=self.t["stats_players"](count=r.players) if r.room else "",
+        )]
+        if any(s.levels):
+            levels = " ".join(self.t["stats_level"](name=self.level_names[code], count=n)
+                              for code, n in reversed(list(enumerate(s.levels))) if n)
+            lines.append(self.t["stats_levels"](levels=levels))
+        p = s.p_value
+        if p is None:
+            lines.append(self.t["stats_unsure"](need=MIN_FAIR_SAMPLE, count=s.fair_count))
+        else:
+            verdict = self.t["fair_bad" if p < 0.01 else "fair_watch" if p < 0.05 else "fair_ok"]()
+            lines.append(self.t["stats_fair"](chi2=s.chi_square, dof=BINS - 1, p=p,
+                                              verdict=verdict))
+        return "\n".join(lines)
+
+
+renderer = Renderer()
+
+
+def render(result) -> str:
+    """Reply text for a handler result (a dice result or a plain string)."""
+    return renderer.render(result)
 
 
 def format_reply(player_name: str, content: str) -> str:
@@ -16,10 +297,13 @@ def help_text(topic: str = "") -> str:
             ".r 1d100 — 掷1个100面骰\n"
             ".r 3d6 — 掷3个6面骰\n"
             ".r 1d8+2 — 掷1d8并加2\n"
+            ".r 4d6kh3 — 掷4d6取最高3个 (kl 取最低)\n"
+            ".r 3d6! — 爆炸骰，掷出最大面再掷一次并累加\n"
+            ".r 5#3d6 — 重复掷5次3d6\n"
             ".r / .rd — 快速掷1d100"
         )
 
-    if topic == "rc":
+    if topic in ("rc", "rcg"):
         return (
             "🎲 技能检定 .rc\n"
             ".rc 技能名 目标值 — 进行技能检定\n"
@@ -28,6 +312,7 @@ def help_text(topic: str = "") -> str:
             ".rc 侦查 60 b2 — 2个奖励骰\n"
             ".rc 侦查 60 p — 1个惩罚骰\n"
             ".rc 侦查 60 p2 — 2个惩罚骰\n"
+            ".rcg 聆听 A:60 B:45 C:70 — 多人同时检定，按结果排名\n"
             "\n成功等级:\n"
             "  大成功: 01\n"
             "  极难成功: ≤技能值/5\n"
@@ -44,18 +329,49 @@ def help_text(topic: str = "") -> str:
             ".san 55 1d3/1d10 — SAN55检定，成功失1d3，失败失1d10"
         )
 
-    if topic == "rop":
+    if topic in ("rop", "ropn"):
         return (
             "⚔️ 对抗检定 .rop\n"
             ".rop 技能1 值1 vs 技能2 值2\n"
-            ".rop 力量 60 vs 力量 45"
+            ".rop 力量 60 vs 力量 45\n"
+            ".ropn [技能名] A:60 B:45 C:70 — 多方对抗，按结果排名"
         )
 
     if topic == "coc":
         return (
             "📋 生成角色 .coc\n"
             ".coc — 生成1组调查员属性\n"
-            ".coc 5 — 生成5组供选择"
+            ".coc 5 — 生成5组供选择\n"
+            ".coc 5 total>=500 EDU>=70 幸运>=50 — 只生成满足条件的属性\n"
+            "条件可用 属性名/中文名/total(不含幸运的总计) 与 >= <= > < ="
+        )
+
+    if topic == "prob":
+        return (
+            "📊 概率计算 .prob\n"
+            ".prob 2d6+1d4+2 — 表达式的精确分布\n"
+            ".prob rc 60 b — 各成功等级的概率\n"
+            ".prob san 55 1d3/1d10 — 期望理智损失\n"
+            ".prob rop 60 vs 45 — 对抗检定胜率"
+        )
+
+    if topic == "sim":
+        return (
+            "🎰 模拟 .sim\n"
+            ".sim fight 50 40 1d3+1d4 12 vs 45 20 1d6 10 — 战斗: 格斗 闪避 伤害 HP\n"
+            ".sim san 60 1/1d6 1d3/1d10 — 依次进行的理智检定\n"
+            ".sim chase 60 vs 50 2 — 追逐: 对抗检定，领先2步，领先5步逃脱\n"
+            "末尾加次数指定模拟次数，如 20000 或 20000次\n"
+            "(chase 只多一个数时是领先距离 1-4，次数写在它后面或加 次)"
+        )
+
+    if topic in ("log", "stats"):
+        return (
+            "📜 掷骰记录 .log / .stats\n"
+            ".log [条数] — 你最近的 d100 掷骰\n"
+            ".log room [条数] — 本群最近的掷骰\n"
+            ".stats — 你的掷骰统计与公平性检验 (χ²)\n"
+            ".stats room — 本群的掷骰统计"
         )
 
     if topic == "luck":
@@ -69,18 +385,24 @@ def help_text(topic: str = "") -> str:
     return (
         "🎲 CoC 7.0 骰娘 指令列表\n"
         "━━━━━━━━━━━━━━━━\n"
-        ".r [表达式] — 掷骰 (如 1d100, 3d6+2)\n"
+        ".r [表达式] — 掷骰 (如 1d100, 3d6+2, 4d6kh3, 5#3d6)\n"
         ".rd — 快速d100\n"
         ".rc 技能 目标值 [b/p] — 技能检定\n"
+        ".rcg 技能 名:值 ... — 群体检定\n"
         ".san SAN值 成功/失败 — 理智检定\n"
         ".rop 名1 值1 vs 名2 值2 — 对抗检定\n"
+        ".ropn [技能] 名:值 ... — 多方对抗\n"
         ".fight 值 — 格斗检定\n"
         ".fire 值 — 射击检定\n"
         ".dodge 值 — 闪避检定\n"
         ".dmg 表达式 — 伤害骰\n"
         ".coc [数量] — 生成调查员属性\n"
         ".luck set/spend — 幸运管理\n"
+        ".prob 表达式 — 概率计算\n"
+        ".sim fight/san/chase — 模拟遭遇\n"
+        ".log / .stats [room] — 掷骰记录与统计\n"
         ".help [指令] — 查看帮助\n"
         "━━━━━━━━━━━━━━━━\n"
+        "一条消息可发多条指令，换行或用 ; 分隔\n"
         "使用 .help 指令名 查看详细说明"
     )
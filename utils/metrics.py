@@ -0,0 +1,282 @@
+"""Prometheus-style metrics for the bot's hot paths.
+
+Counters and histograms are plain integer slots updated without locks
+(CPython's GIL keeps single increments consistent enough for metrics)
+and histograms use fixed buckets, so an observation allocates nothing.
+Callers check ``ENABLED`` before timing anything, which makes disabled
+instrumentation cost one global lookup. Values that already live
+elsewhere (store, pipeline, caches) are read by callbacks at scrape time.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_MAX_ROOMS, METRICS_PORT
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+ENABLED = METRICS_ENABLED
+
+# Seconds; covers sub-millisecond parsing up to slow puppet sends
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Label value shared by everything past a CounterVec's max_keys
+OTHER = "other"
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Union[float, Dict[Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+
+class CounterVec:
+    """Counters keyed by one label value.
+
+    With ``max_keys`` set, the first ``max_keys`` values get their own
+    series and later ones are counted under ``"other"``, which bounds the
+    number of series (and memory) for open-ended labels such as rooms.
+    """
+
+    __slots__ = ("label", "values", "max_keys")
+
+    def __init__(self, label: str, max_keys: Optional[int] = None):
+        self.label = label
+        self.values: Dict[str, int] = {}
+        self.max_keys = max_keys
+
+    def inc(self, key: str, n: int = 1):
+        values = self.values
+        if key not in values and self.max_keys is not None and len(values) >= self.max_keys:
+            key = OTHER
+        values[key] = values.get(key, 0) + n
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class HistogramVec:
+    """Fixed set of histograms, one per label value, created up front."""
+
+    __slots__ = ("label", "children")
+
+    def __init__(self, label: str, keys: Tuple[str, ...],
+                 bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.label = label
+        self.children = {key: Histogram(bounds) for key in keys}
+
+    def observe(self, key: str, value: float):
+        self.children[key].observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[tuple] = []  # (name, help, kind, metric)
+        self._lock = threading.Lock()
+
+    def _add(self, name: str, help_text: str, kind: str, metric):
+        with self._lock:
+            self._metrics.append((name, help_text, kind, metric))
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._add(name, help_text, "counter", Counter())
+
+    def counter_vec(self, name: str, help_text: str, label: str,
+                    max_keys: Optional[int] = None) -> CounterVec:
+        return self._add(name, help_text, "counter", CounterVec(label, max_keys))
+
+    def histogram_vec(self, name: str, help_text: str, label: str,
+                      keys: Tuple[str, ...]) -> HistogramVec:
+        return self._add(name, help_text, "histogram", HistogramVec(label, keys))
+
+    def callback(self, name: str, help_text: str, kind: str,
+                 fn: Callable[[], Sample]):
+        """A gauge or counter whose value is read from ``fn`` at scrape time."""
+        self._add(name, help_text, kind, fn)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for name, help_text, kind, metric in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if isinstance(metric, Counter):
+                lines.append(f"{name} {metric.value}")
+            elif isinstance(metric, CounterVec):
+                for key, value in list(metric.values.items()):
+                    lines.append(f"{name}{_format_labels(((metric.label, key),))} {value}")
+            elif isinstance(metric, HistogramVec):
+                for key, hist in metric.children.items():
+                    lines.extend(_render_histogram(name, ((metric.label, key),), hist))
+            else:
+                try:
+                    sample = metric()
+                except Exception:
+                    continue
+                if isinstance(sample, dict):
+                    for labels, value in sample.items():
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                else:
+                    lines.append(f"{name} {sample}")
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(name: str, labels: Labels, hist: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(hist.bounds, hist.counts):
+        cumulative += count
+        bucket = _format_labels(labels + (("le", repr(bound)),))
+        lines.append(f"{name}_bucket{bucket} {cumulative}")
+    cumulative += hist.counts[-1]
+    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {hist.sum}")
+    lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+    return lines
+
+
+registry = Registry()
+
+# Hot-path metrics, updated only when ENABLED
+STAGES = ("parse", "dispatch", "roll", "persist", "render", "send")
+stage_seconds = registry.histogram_vec(
+    "dice_stage_seconds", "Time spent per command processing stage.",
+    "stage", STAGES,
+)
+commands_by_name = registry.counter_vec(
+    "dice_commands_total", "Commands handled, by command.", "command",
+)
+commands_by_room = registry.counter_vec(
+    "dice_room_commands_total",
+    f"Commands handled, by room (the first {METRICS_MAX_ROOMS} rooms seen; the rest as other).",
+    "room", max_keys=METRICS_MAX_ROOMS,
+)
+
+
+def register_runtime(get_store: Callable[[], object], pipeline=None, outbox=None,
+                     prefilter=None, flood=None):
+    """Expose store, pipeline, outbox, pre-filter, flood and cache statistics at scrape time.
+
+    ``get_store`` is called at scrape time rather than here, so that
+    registering does not open (and index) the store on the event loop.
+    """
+    from dice.probability import distribution_cache_info
+    from dice.roller import expression_cache_info
+
+    for key, name, kind, help_text in (
+        ("flushes", "flushes_total", "counter", "Player store flushes."),
+        ("total_flush_seconds", "flush_seconds_total", "counter", "Time spent flushing."),
+        ("bytes_written", "written_bytes_total", "counter", "Bytes written by flushes."),
+        ("last_flush_seconds", "last_flush_seconds", "gauge", "Duration of the last flush."),
+        ("last_bytes", "last_flush_bytes", "gauge", "Size written by the last flush."),
+        ("load_seconds", "load_seconds", "gauge", "Time spent indexing the store at startup."),
+        ("indexed_players", "indexed_players", "gauge", "Players found in storage at startup."),
+        ("built_players", "built_players_total", "counter",
+         "Stored players turned into Player objects on first access."),
+    ):
+        # A missing key raises, and render() skips the sample
+        registry.callback(f"dice_store_{name}", help_text, kind,
+                          lambda key=key: get_store().metrics[key])
+    registry.callback("dice_store_dirty_players", "Players waiting to be flushed.",
+                      "gauge", lambda: getattr(get_store(), "dirty_count", 0))
+
+    def cache_samples(info) -> Dict[Labels, float]:
+        return {(("result", "hit"),): info.hits, (("result", "miss"),): info.misses}
+
+    registry.callback("dice_expression_cache_total", "Compiled dice expression cache lookups.",
+                      "counter", lambda: cache_samples(expression_cache_info()))
+    registry.callback("dice_distribution_cache_total", "Probability distribution cache lookups.",
+                      "counter", lambda: cache_samples(distribution_cache_info()))
+
+    if pipeline is not None:
+        registry.callback("dice_pipeline_queue_depth", "Commands queued across all rooms.",
+                          "gauge", lambda: sum(pipeline.queue_depths().values()))
+        registry.callback("dice_pipeline_active_rooms", "Rooms with a live worker.",
+                          "gauge", lambda: pipeline.active_rooms)
+        registry.callback("dice_pipeline_events_total", "Room pipeline events.", "counter",
+                          lambda: {(("event", k),): v for k, v in pipeline.metrics.items()
+                                   if k != "max_queue_depth"})
+    if outbox is not None:
+        registry.callback("dice_outbox_pending", "Replies waiting to be sent.",
+                          "gauge", lambda: sum(outbox.pending_counts().values()))
+        registry.callback("dice_outbox_events_total", "Outbound message events.", "counter",
+                          lambda: {(("event", k),): v for k, v in outbox.metrics.items()
+                                   if not k.startswith("send_latency")})
+    if prefilter is not None:
+        registry.callback("dice_prefilter_events_total", "Room messages by pre-filter outcome.",
+                          "counter", lambda: {(("event", k),): v
+                                              for k, v in prefilter.metrics.items()})
+        registry.callback("dice_puppet_calls_avoided_total",
+                          "Puppet round-trips skipped by the pre-filter.",
+                          "counter", lambda: prefilter.calls_avoided)
+        registry.callback("dice_prefilter_cached_rooms", "Rooms with cached readiness and alias.",
+                          "gauge", lambda: prefilter.cached_rooms)
+    if flood is not None:
+        registry.callback("dice_flood_events_total",
+                          "Command messages admitted or rejected by flood limits.",
+                          "counter", lambda: {(("event", k),): v
+                                              for k, v in flood.metrics.items()})
+        registry.callback("dice_flood_tracked_buckets", "Token buckets held by the flood guard.",
+                          "gauge", lambda: flood.tracked_keys)
+
+
+def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread."""
+    # Imported here: http.server is slow to import and most runs never serve
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes would otherwise flood stdout
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
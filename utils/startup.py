@@ -0,0 +1,36 @@
+"""Startup timeline: seconds from process start to each milestone.
+
+main.py imports this module before anything else, so the clock starts
+before the heavy imports. Stages are recorded once; the first reply
+prints the whole timeline.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Awaitable, Callable, Dict
+
+_T0 = time.perf_counter()
+marks: Dict[str, float] = {}  # stage -> seconds since _T0, in order reached
+
+
+def mark(stage: str) -> bool:
+    """Record the first time a stage is reached; False if already recorded."""
+    if stage in marks:
+        return False
+    marks[stage] = time.perf_counter() - _T0
+    return True
+
+
+def report() -> str:
+    stages = " · ".join(f"{stage} {seconds:.2f}s" for stage, seconds in marks.items())
+    return f"[启动] {stages}"
+
+
+def first_reply(say: Callable[[str], Awaitable]) -> Callable[[str], Awaitable]:
+    """Wrap a room's say so that sending the first reply prints the timeline."""
+    async def wrapped(text: str):
+        await say(text)
+        if mark("first_reply"):
+            print(report())
+    return wrapped